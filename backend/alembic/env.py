@@ -4,6 +4,7 @@ from sqlalchemy import create_engine, engine_from_config
 from sqlalchemy import pool
 from app import models
 from app.database import Base, SQLALCHEMY_DATABASE_URL
+from app.search import FTS_TABLE
 from alembic import context
 
 # this is the Alembic Config object, which provides
@@ -27,6 +28,13 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # FTS5-таблица поиска и её служебные таблицы не описаны в моделях
+    if type_ == "table" and name.startswith(FTS_TABLE):
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -45,6 +53,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -74,6 +83,7 @@ def run_migrations_online():
             target_metadata=target_metadata,
             compare_type=True,
             render_as_batch=True,  
+            include_object=include_object,
         )
 
         with context.begin_transaction():
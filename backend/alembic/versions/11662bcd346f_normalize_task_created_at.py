@@ -0,0 +1,38 @@
+"""normalize task created_at
+
+Revision ID: 11662bcd346f
+Revises: f2c145f2f348
+Create Date: 2026-10-18 11:05:27.350579
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11662bcd346f'
+down_revision: Union[str, None] = 'f2c145f2f348'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name != "sqlite":
+        return
+    # Доли секунды (импорт) отбрасываются: created_at сравнивается строкой
+    # с курсором, а строки CURRENT_TIMESTAMP их не содержат
+    connection.execute(
+        sa.text(
+            "UPDATE tasks SET created_at = datetime(created_at) "
+            "WHERE created_at LIKE '%.%'"
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
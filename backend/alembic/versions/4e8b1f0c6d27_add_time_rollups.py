@@ -0,0 +1,67 @@
+"""add time rollups
+
+Revision ID: 4e8b1f0c6d27
+Revises: 9c41d2e7a5b3
+Create Date: 2026-10-18 10:20:41.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8b1f0c6d27'
+down_revision: Union[str, None] = '9c41d2e7a5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('time_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=True),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('seconds', sa.Float(), nullable=False),
+    sa.Column('earnings', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('time_rollups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_time_rollups_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_time_rollups_project_id'), ['project_id'], unique=False)
+        batch_op.create_index('ix_time_rollups_user_id_day', ['user_id', 'day', 'project_id'], unique=False)
+
+    # То же, что python -m app.rollups backfill: total_time старых задач целиком
+    # на день завершения (или создания), ставка проекта, если > 0, иначе владельца
+    op.get_bind().execute(
+        sa.text(
+            "INSERT INTO time_rollups (user_id, project_id, day, seconds, earnings) "
+            "SELECT tasks.owner_id, tasks.project_id, "
+            "DATE(COALESCE(tasks.completed_at, tasks.created_at)), "
+            "SUM(tasks.total_time), "
+            "SUM(tasks.total_time) * COALESCE(CASE WHEN projects.hourly_rate > 0 "
+            "THEN projects.hourly_rate ELSE users.default_hourly_rate END, 0) / 3600 "
+            "FROM tasks "
+            "LEFT JOIN projects ON projects.id = tasks.project_id "
+            "LEFT JOIN users ON users.id = projects.owner_id "
+            "WHERE tasks.total_time > 0 "
+            "GROUP BY tasks.owner_id, tasks.project_id, "
+            "DATE(COALESCE(tasks.completed_at, tasks.created_at)), "
+            "projects.hourly_rate, users.default_hourly_rate"
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('time_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_rollups_user_id_day')
+        batch_op.drop_index(batch_op.f('ix_time_rollups_project_id'))
+        batch_op.drop_index(batch_op.f('ix_time_rollups_id'))
+
+    op.drop_table('time_rollups')
@@ -0,0 +1,34 @@
+"""task sort indexes for id and due_date
+
+Revision ID: 5b9e2d7c4a13
+Revises: 945c6b19adbe
+Create Date: 2026-10-18 19:05:12.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2d7c4a13'
+down_revision: Union[str, None] = '945c6b19adbe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_tasks_owner_id_due_date')
+        batch_op.create_index('ix_tasks_owner_id_id', ['owner_id', 'id'], unique=False)
+        batch_op.create_index('ix_tasks_owner_id_due_date_nulls_last', ['owner_id', sa.text('(due_date IS NULL)'), 'due_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_tasks_owner_id_due_date_nulls_last')
+        batch_op.drop_index('ix_tasks_owner_id_id')
+        batch_op.create_index('ix_tasks_owner_id_due_date', ['owner_id', 'due_date'], unique=False)
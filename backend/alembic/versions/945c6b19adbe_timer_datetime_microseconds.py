@@ -0,0 +1,51 @@
+"""timer datetime microseconds
+
+Revision ID: 945c6b19adbe
+Revises: 11662bcd346f
+Create Date: 2026-10-18 11:11:39.984576
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# (таблица, колонка, nullable)
+TIMER_COLUMNS = (
+    ("tasks", "last_start_time", True),
+    ("daily_work_sessions", "last_start_time", True),
+    ("time_entries", "start_time", False),
+    ("time_entries", "end_time", True),
+)
+
+# revision identifiers, used by Alembic.
+revision: str = '945c6b19adbe'
+down_revision: Union[str, None] = '11662bcd346f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _alter(type_, existing_type) -> None:
+    # SQLite хранит доли секунды и так
+    if op.get_bind().dialect.name != "mysql":
+        return
+    for table, column, nullable in TIMER_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=type_,
+            existing_type=existing_type,
+            existing_nullable=nullable,
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _alter(mysql.DATETIME(fsp=6), mysql.DATETIME())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _alter(mysql.DATETIME(), mysql.DATETIME(fsp=6))
@@ -0,0 +1,92 @@
+"""add lookup indexes
+
+Revision ID: 9c41d2e7a5b3
+Revises: 583777f1438a
+Create Date: 2026-10-18 10:05:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41d2e7a5b3'
+down_revision: Union[str, None] = '583777f1438a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def merge_duplicate_daily_sessions() -> None:
+    """Склеить дубли (user_id, date) перед созданием уникального индекса.
+
+    Время дублей суммируется в строку с минимальным id, остальные удаляются.
+    """
+    connection = op.get_bind()
+    duplicates = connection.execute(
+        sa.text(
+            "SELECT user_id, date, MIN(id), SUM(total_time) "
+            "FROM daily_work_sessions GROUP BY user_id, date HAVING COUNT(*) > 1"
+        )
+    ).fetchall()
+    for user_id, day, keep_id, total_time in duplicates:
+        connection.execute(
+            sa.text("UPDATE daily_work_sessions SET total_time = :total WHERE id = :id"),
+            {"total": total_time, "id": keep_id},
+        )
+        connection.execute(
+            sa.text(
+                "DELETE FROM daily_work_sessions "
+                "WHERE user_id = :user_id AND date = :day AND id != :id"
+            ),
+            {"user_id": user_id, "day": day, "id": keep_id},
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    merge_duplicate_daily_sessions()
+
+    with op.batch_alter_table('daily_work_sessions', schema=None) as batch_op:
+        batch_op.create_index('ix_daily_work_sessions_user_id_date', ['user_id', 'date'], unique=True)
+
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_projects_owner_id'), ['owner_id'], unique=False)
+
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.create_index('ix_tasks_owner_id_is_timer_running', ['owner_id', 'is_timer_running'], unique=False)
+        batch_op.create_index('ix_tasks_is_timer_running_last_start_time', ['is_timer_running', 'last_start_time'], unique=False)
+        batch_op.create_index(batch_op.f('ix_tasks_project_id'), ['project_id'], unique=False)
+
+    with op.batch_alter_table('sub_tasks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sub_tasks_task_id'), ['task_id'], unique=False)
+
+    with op.batch_alter_table('task_comments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_task_comments_task_id'), ['task_id'], unique=False)
+
+    with op.batch_alter_table('sub_task_comments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sub_task_comments_sub_task_id'), ['sub_task_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('sub_task_comments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sub_task_comments_sub_task_id'))
+
+    with op.batch_alter_table('task_comments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_task_comments_task_id'))
+
+    with op.batch_alter_table('sub_tasks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sub_tasks_task_id'))
+
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tasks_project_id'))
+        batch_op.drop_index('ix_tasks_is_timer_running_last_start_time')
+        batch_op.drop_index('ix_tasks_owner_id_is_timer_running')
+
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_projects_owner_id'))
+
+    with op.batch_alter_table('daily_work_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_daily_work_sessions_user_id_date')
@@ -0,0 +1,44 @@
+"""add search index
+
+Revision ID: a8e2c4f6b1d3
+Revises: f3c1a7e5d8b2
+Create Date: 2026-10-18 14:07:45.318265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import drop_fts_schema, fts_schema, rebuild_statements
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8e2c4f6b1d3'
+down_revision: Union[str, None] = 'f3c1a7e5d8b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _fts5_available() -> bool:
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return False
+    return bool(bind.execute(sa.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Только SQLite с FTS5; в остальных БД поиск работает через LIKE
+    if not _fts5_available():
+        return
+    for statement in fts_schema() + rebuild_statements():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in drop_fts_schema():
+        op.execute(statement)
@@ -0,0 +1,56 @@
+"""add time entries
+
+Revision ID: b7d3e9a1c0f4
+Revises: 4e8b1f0c6d27
+Create Date: 2026-10-18 10:41:03.552870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e9a1c0f4'
+down_revision: Union[str, None] = '4e8b1f0c6d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('time_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('time_entries', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_time_entries_id'), ['id'], unique=False)
+        batch_op.create_index('ix_time_entries_owner_id_start_time', ['owner_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_time_entries_task_id_end_time', ['task_id', 'end_time'], unique=False)
+
+    # Открытые интервалы для таймеров, которые запущены прямо сейчас
+    op.get_bind().execute(
+        sa.text(
+            "INSERT INTO time_entries (task_id, owner_id, start_time) "
+            "SELECT id, owner_id, last_start_time FROM tasks "
+            "WHERE is_timer_running = :running AND last_start_time IS NOT NULL"
+        ),
+        {"running": True},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('time_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_entries_task_id_end_time')
+        batch_op.drop_index('ix_time_entries_owner_id_start_time')
+        batch_op.drop_index(batch_op.f('ix_time_entries_id'))
+
+    op.drop_table('time_entries')
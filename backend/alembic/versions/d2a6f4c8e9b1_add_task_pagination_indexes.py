@@ -0,0 +1,34 @@
+"""add task pagination indexes
+
+Revision ID: d2a6f4c8e9b1
+Revises: b7d3e9a1c0f4
+Create Date: 2026-10-18 11:32:47.104215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6f4c8e9b1'
+down_revision: Union[str, None] = 'b7d3e9a1c0f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.create_index('ix_tasks_owner_id_created_at', ['owner_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_tasks_owner_id_priority', ['owner_id', 'priority'], unique=False)
+        batch_op.create_index('ix_tasks_owner_id_due_date', ['owner_id', 'due_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index('ix_tasks_owner_id_due_date')
+        batch_op.drop_index('ix_tasks_owner_id_priority')
+        batch_op.drop_index('ix_tasks_owner_id_created_at')
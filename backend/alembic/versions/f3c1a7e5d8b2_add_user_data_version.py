@@ -0,0 +1,30 @@
+"""add user data version
+
+Revision ID: f3c1a7e5d8b2
+Revises: d2a6f4c8e9b1
+Create Date: 2026-10-18 11:58:21.640937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c1a7e5d8b2'
+down_revision: Union[str, None] = 'd2a6f4c8e9b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
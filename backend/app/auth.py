@@ -1,28 +1,74 @@
+import asyncio
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-# from passlib.context import CryptContext
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from jose import jwt
 
 SECRET_KEY = "simple-secret-key-for-development-change-in-production"  # Для продакшена нужно использовать безопасный ключ
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 24 * 60  # 24 часа
 
-# pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Стоимость Argon2id: время хеша растёт с TIME_COST и MEMORY_KIB
+PASSWORD_HASH_TIME_COST = int(os.getenv("PASSWORD_HASH_TIME_COST", "3"))
+PASSWORD_HASH_MEMORY_KIB = int(os.getenv("PASSWORD_HASH_MEMORY_KIB", "65536"))
+PASSWORD_HASH_PARALLELISM = int(os.getenv("PASSWORD_HASH_PARALLELISM", "1"))
+# Сколько хешей считается одновременно; каждый держит MEMORY_KIB памяти
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))
+)
 
+pwd_hasher = PasswordHasher(
+    time_cost=PASSWORD_HASH_TIME_COST,
+    memory_cost=PASSWORD_HASH_MEMORY_KIB,
+    parallelism=PASSWORD_HASH_PARALLELISM,
+)
 
-# def verify_password(plain_password, hashed_password):
-#     return pwd_context.verify(plain_password, hashed_password)
+# argon2 отпускает GIL, так что потоки считают хеши параллельно, а event loop
+# и потоки sync-эндпоинтов не ждут их во время наплыва логинов
+_hash_pool = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
 
 
-# def get_password_hash(password):
-#     return pwd_context.hash(password)
+def is_password_hash(value):
+    return value.startswith("$argon2")
 
 
 def verify_password(plain_password, hashed_password):
-    return plain_password == hashed_password
+    if not is_password_hash(hashed_password):
+        # Старые строки хранят пароль как есть, при входе он заменяется хешем
+        return hmac.compare_digest(plain_password.encode(), hashed_password.encode())
+    try:
+        return pwd_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
 
 
 def get_password_hash(password):
-    return password
+    return pwd_hasher.hash(password)
+
+
+def needs_rehash(hashed_password):
+    """Пароль без хеша или хеш с другой стоимостью."""
+    return not is_password_hash(hashed_password) or pwd_hasher.check_needs_rehash(
+        hashed_password
+    )
+
+
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _hash_pool, verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_pool, get_password_hash, password)
 
 
 def create_access_token(data: dict):
@@ -1,6 +1,267 @@
-from sqlalchemy.orm import Session
+from collections import defaultdict
+
+from sqlalchemy import (
+    and_,
+    bindparam,
+    case,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, timedelta, date
-from . import models, schemas
+from . import models, pagination, schemas
+
+
+def _elapsed_seconds(db: Session, start_column, now: datetime):
+    """SQL-выражение: секунды от start_column до now (зависит от диалекта)."""
+    dialect = db.get_bind().dialect.name
+    now_param = literal(now, type_=start_column.type)
+    if dialect == "sqlite":
+        return (func.julianday(now_param) - func.julianday(start_column)) * 86400.0
+    if dialect in ("mysql", "mariadb"):
+        microseconds = func.timestampdiff(
+            literal_column("MICROSECOND"), start_column, now_param
+        )
+        return microseconds / 1000000.0
+    return func.extract("epoch", now_param - start_column)
+
+
+def _live_task_seconds(db: Session, now: datetime):
+    """SQL-выражение: total_time задачи плюс текущая сессия запущенного таймера."""
+    running_delta = case(
+        (
+            and_(
+                models.Task.is_timer_running == True,
+                models.Task.last_start_time.isnot(None),
+            ),
+            _elapsed_seconds(db, models.Task.last_start_time, now),
+        ),
+        else_=0.0,
+    )
+    return func.coalesce(models.Task.total_time, 0.0) + running_delta
+
+
+# ------------------------------------------------------------
+# Time rollups
+# ------------------------------------------------------------
+def _split_by_day(start: datetime, end: datetime):
+    """Разбить интервал на части по календарным дням: [(day, seconds), ...]."""
+    parts = []
+    while start < end:
+        next_midnight = datetime.combine(
+            start.date() + timedelta(days=1), datetime.min.time()
+        )
+        part_end = min(end, next_midnight)
+        parts.append((start.date(), (part_end - start).total_seconds()))
+        start = part_end
+    return parts
+
+
+def _effective_rates(db: Session, project_ids):
+    """Ставки проектов: ставка проекта, если она > 0, иначе ставка владельца."""
+    project_ids = {project_id for project_id in project_ids if project_id is not None}
+    if not project_ids:
+        return {}
+    rows = (
+        db.query(
+            models.Project.id,
+            models.Project.hourly_rate,
+            models.User.default_hourly_rate,
+        )
+        .join(models.User, models.User.id == models.Project.owner_id)
+        .filter(models.Project.id.in_(project_ids))
+        .all()
+    )
+    return {
+        project_id: project_rate if project_rate > 0 else (default_rate or 0.0)
+        for project_id, project_rate, default_rate in rows
+    }
+
+
+def _effective_rate(db: Session, project_id):
+    """Ставка для учёта времени задачи. Без проекта — 0."""
+    return _effective_rates(db, [project_id]).get(project_id, 0.0)
+
+
+def _add_to_rollup(
+    db: Session, user_id: int, project_id, day: date, seconds: float, rate: float
+):
+    earnings = seconds * rate / 3600
+    updated = (
+        db.query(models.TimeRollup)
+        .filter(
+            models.TimeRollup.user_id == user_id,
+            models.TimeRollup.project_id == project_id,  # None -> IS NULL
+            models.TimeRollup.day == day,
+        )
+        .update(
+            {
+                models.TimeRollup.seconds: models.TimeRollup.seconds + seconds,
+                models.TimeRollup.earnings: models.TimeRollup.earnings + earnings,
+            },
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        db.add(
+            models.TimeRollup(
+                user_id=user_id,
+                project_id=project_id,
+                day=day,
+                seconds=seconds,
+                earnings=earnings,
+            )
+        )
+        db.flush()
+
+
+def record_intervals(db: Session, intervals):
+    """Учесть закрытые интервалы [(user_id, project_id, start, end), ...] (без commit).
+
+    Интервалы сначала суммируются по ключу (пользователь, проект, день), так
+    что на пачку уходит по одному запросу на ключ, а не на интервал.
+    """
+    rates = _effective_rates(db, [project_id for _, project_id, _, _ in intervals])
+    totals = defaultdict(float)
+    for user_id, project_id, start, end in intervals:
+        for day, seconds in _split_by_day(start, end):
+            totals[(user_id, project_id, day)] += seconds
+    for (user_id, project_id, day), seconds in totals.items():
+        rate = rates.get(project_id, 0.0)
+        _add_to_rollup(db, user_id, project_id, day, seconds, rate)
+
+
+def _task_rate(task: models.Task) -> float:
+    """Ставка задачи, как в _effective_rates, по task.project и task.owner.
+
+    get_owned_task загружает проект вместе с задачей, а владелец — текущий
+    пользователь в той же сессии. Ставки владельца нет в кэше пользователей:
+    она читается из БД, только если у проекта нет своей.
+    """
+    if task.project is None:
+        return 0.0
+    if task.project.hourly_rate > 0:
+        return task.project.hourly_rate
+    return task.owner.default_hourly_rate or 0.0
+
+
+def record_task_interval(
+    db: Session, task: models.Task, start: datetime, end: datetime
+):
+    """Учесть закрытый интервал таймера задачи в time_rollups (без commit)."""
+    rate = _task_rate(task)
+    for day, seconds in _split_by_day(start, end):
+        _add_to_rollup(db, task.owner_id, task.project_id, day, seconds, rate)
+
+
+def record_task_adjustment(db: Session, user_id: int, project_id, seconds: float):
+    """Ручное изменение total_time без интервалов.
+
+    Прибавка относится на сегодняшний день, убавка снимается с последних дней
+    проекта, где время ещё есть (_withdraw_from_rollups).
+    """
+    if seconds > 0:
+        rate = _effective_rate(db, project_id)
+        _add_to_rollup(db, user_id, project_id, date.today(), seconds, rate)
+    elif seconds < 0:
+        _withdraw_from_rollups(db, user_id, project_id, -seconds)
+
+
+def _task_entry_days(db: Session, task_id: int) -> dict:
+    """Секунды закрытых интервалов задачи по дням."""
+    days = defaultdict(float)
+    entries = db.query(models.TimeEntry.start_time, models.TimeEntry.end_time).filter(
+        models.TimeEntry.task_id == task_id, models.TimeEntry.end_time.isnot(None)
+    )
+    for start, end in entries:
+        for day, seconds in _split_by_day(start, end):
+            days[day] += seconds
+    return days
+
+
+def _withdraw_from_rollups(
+    db: Session, user_id: int, project_id, seconds: float, days: dict = None
+) -> dict:
+    """Снять seconds времени проекта из time_rollups, не уводя дни в минус.
+
+    Сначала время снимается с дней из days (день -> секунды интервалов
+    задачи), остаток — с последних дней, где оно ещё есть: туда попали
+    ручные правки и время задач до time_entries. Заработок снимается в той
+    же доле, в какой был начислен. Возвращает день -> снятые секунды.
+    """
+    if seconds <= 0:
+        return {}
+    rows = (
+        db.query(
+            models.TimeRollup.day,
+            func.sum(models.TimeRollup.seconds),
+            func.sum(models.TimeRollup.earnings),
+        )
+        .filter(
+            models.TimeRollup.user_id == user_id,
+            models.TimeRollup.project_id == project_id,  # None -> IS NULL
+        )
+        .group_by(models.TimeRollup.day)
+        .all()
+    )
+    # день -> [оставшиеся секунды, ставка, по которой время начислено]
+    balances = {
+        day: [total, earnings * 3600 / total if total > 0 else 0.0]
+        for day, total, earnings in rows
+    }
+    taken = defaultdict(float)
+    remaining = seconds
+
+    def take(day, wanted: float):
+        nonlocal remaining
+        balance = balances.get(day)
+        if balance is None or balance[0] <= 0 or wanted <= 0:
+            return
+        amount = min(wanted, balance[0])
+        balance[0] -= amount
+        taken[day] += amount
+        remaining -= amount
+
+    for day, day_seconds in sorted((days or {}).items()):
+        take(day, min(day_seconds, remaining))
+    for day in sorted(balances, reverse=True):
+        take(day, remaining)
+    for day, amount in taken.items():
+        _add_to_rollup(db, user_id, project_id, day, -amount, balances[day][1])
+    return taken
+
+
+def get_rollups(
+    db: Session,
+    user_id: int,
+    start: date,
+    end: date,
+    project_id: int = None,
+):
+    """Время и заработок по проектам и дням за период (без текущих сессий)."""
+    query = db.query(
+        models.TimeRollup.day,
+        models.TimeRollup.project_id,
+        func.sum(models.TimeRollup.seconds).label("seconds"),
+        func.sum(models.TimeRollup.earnings).label("earnings"),
+    ).filter(
+        models.TimeRollup.user_id == user_id,
+        models.TimeRollup.day >= start,
+        models.TimeRollup.day <= end,
+    )
+    if project_id is not None:
+        query = query.filter(models.TimeRollup.project_id == project_id)
+    return (
+        query.group_by(models.TimeRollup.day, models.TimeRollup.project_id)
+        .order_by(models.TimeRollup.day, models.TimeRollup.project_id)
+        .all()
+    )
 
 
 # ------------------------------------------------------------
@@ -10,36 +271,71 @@ def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    db_user = models.User(username=user.username, password=user.password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+# ------------------------------------------------------------
+# Data version (ETag списков)
+# ------------------------------------------------------------
+def _bump_data_versions(db: Session, condition):
+    db.execute(
+        update(models.User)
+        .where(condition)
+        .values(data_version=models.User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bump_data_version(db: Session, user_id):
+    """Отметить, что данные пользователя изменились, в текущей транзакции."""
+    _bump_data_versions(db, models.User.id == user_id)
+
+
+def data_version_query(user_id: int):
+    """Версия данных пользователя и есть ли у него запущенные таймеры."""
+    running_task = (
+        select(models.Task.id)
+        .where(models.Task.owner_id == user_id, models.Task.is_timer_running == True)
+        .exists()
+    )
+    running_session = (
+        select(models.DailyWorkSession.id)
+        .where(
+            models.DailyWorkSession.user_id == user_id,
+            models.DailyWorkSession.is_timer_running == True,
+        )
+        .exists()
+    )
+    return select(models.User.data_version, or_(running_task, running_session)).where(
+        models.User.id == user_id
+    )
+
+
+def get_data_version(db: Session, user_id: int):
+    return db.execute(data_version_query(user_id)).first()
 
 
 # ------------------------------------------------------------
 # Projects
 # ------------------------------------------------------------
-def get_projects_by_owner(db: Session, owner_id: int, skip: int = 0, limit: int = 100):
-    projects = (
-        db.query(models.Project)
+def get_projects_by_owner(
+    db: Session, owner_id: int, skip: int = 0, limit: int = 100, after_id: int = None
+):
+    # Один агрегирующий запрос вместо ленивой загрузки задач каждого проекта
+    total_time = func.coalesce(func.sum(_live_task_seconds(db, datetime.now())), 0.0)
+    query = (
+        db.query(models.Project, total_time)
+        .outerjoin(models.Task, models.Task.project_id == models.Project.id)
         .filter(models.Project.owner_id == owner_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
     )
-    for project in projects:
-        total_time = 0
-        for task in project.tasks:
-            total_time += task.total_time or 0
-            if task.is_timer_running and task.last_start_time:
-                current_session_time = (
-                    datetime.now() - task.last_start_time
-                ).total_seconds()
-                total_time += current_session_time
-        project.total_time = total_time
-        project.earned_amount = total_time * project.hourly_rate / 3600
+    if after_id is not None:
+        query = query.filter(models.Project.id > after_id)
+    query = query.group_by(models.Project.id).order_by(models.Project.id)
+    if after_id is None:
+        query = query.offset(skip)
+    rows = query.limit(limit).all()
+    projects = []
+    for project, project_time in rows:
+        project.total_time = project_time
+        project.earned_amount = project_time * project.hourly_rate / 3600
+        projects.append(project)
     return projects
 
 
@@ -54,35 +350,39 @@ def create_project(db: Session, project: schemas.ProjectCreate, owner_id: int):
         name=project.name, owner_id=owner_id, hourly_rate=hourly_rate
     )
     db.add(db_project)
+    bump_data_version(db, owner_id)
     db.commit()
     db.refresh(db_project)
     return db_project
 
 
-def update_project(db: Session, project_id: int, project_update: schemas.ProjectUpdate):
-    db_project = (
-        db.query(models.Project).filter(models.Project.id == project_id).first()
-    )
-    if not db_project:
-        return None
+def update_project(
+    db: Session, db_project: models.Project, project_update: schemas.ProjectUpdate
+):
     update_data = project_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_project, field, value)
+    bump_data_version(db, db_project.owner_id)
     db.commit()
     db.refresh(db_project)
     return db_project
 
 
-def delete_project(db: Session, project_id: int):
-    db_project = (
-        db.query(models.Project).filter(models.Project.id == project_id).first()
+def delete_project(db: Session, db_project: models.Project):
+    project_id = db_project.id
+    db.query(models.TimeRollup).filter(
+        models.TimeRollup.project_id == project_id
+    ).delete()
+    project_task_ids = db.query(models.Task.id).filter(
+        models.Task.project_id == project_id
     )
-    if db_project:
-        db.query(models.Task).filter(models.Task.project_id == project_id).delete()
-        db.delete(db_project)
-        db.commit()
-        return True
-    return False
+    db.query(models.TimeEntry).filter(
+        models.TimeEntry.task_id.in_(project_task_ids.scalar_subquery())
+    ).delete(synchronize_session=False)
+    db.query(models.Task).filter(models.Task.project_id == project_id).delete()
+    db.delete(db_project)
+    bump_data_version(db, db_project.owner_id)
+    db.commit()
 
 
 # ------------------------------------------------------------
@@ -99,32 +399,147 @@ def create_task(db: Session, task: schemas.TaskCreate, user_id: int):
         due_date=task.due_date,
     )
     db.add(db_task)
+    bump_data_version(db, user_id)
     db.commit()
     db.refresh(db_task)
     return db_task
 
 
-def get_tasks_by_owner(db: Session, owner_id: int, skip: int = 0, limit: int = 100):
-    tasks = (
+def _add_running_time(tasks):
+    now = datetime.now()
+    for task in tasks:
+        if task.is_timer_running and task.last_start_time:
+            current_session_time = (now - task.last_start_time).total_seconds()
+            task.total_time = (task.total_time or 0) + current_session_time
+    return tasks
+
+
+def _paginate(query, keys, skip: int, limit: int, after: list = None):
+    """Страница по ключам сортировки: после курсора или, по-старому, со смещения."""
+    query = query.order_by(*pagination.order_by(keys))
+    if after is not None:
+        return query.filter(pagination.after_cursor(keys, after)).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+def get_tasks_by_owner(
+    db: Session,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    sort: str = "id",
+    after: list = None,
+):
+    query = db.query(models.Task).filter(models.Task.owner_id == owner_id)
+    keys = pagination.TASK_SORTS[sort]
+    tasks = _paginate(query, keys, skip, limit, after).all()
+    return _add_running_time(tasks)
+
+
+def get_tasks_with_details(
+    db: Session,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    sort: str = "id",
+    after: list = None,
+):
+    """Задачи с комментариями и подзадачами (с их комментариями).
+
+    Связи загружаются через selectinload: всего 4 запроса на страницу
+    (задачи, комментарии, подзадачи, комментарии подзадач) независимо от
+    количества задач. Бюджет проверяет tests/test_query_budgets.py.
+    """
+    query = (
         db.query(models.Task)
+        .options(
+            selectinload(models.Task.comments),
+            selectinload(models.Task.sub_tasks).selectinload(models.SubTask.comments),
+        )
         .filter(models.Task.owner_id == owner_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
     )
+    keys = pagination.TASK_SORTS[sort]
+    tasks = _paginate(query, keys, skip, limit, after).all()
+    return _add_running_time(tasks)
+
+
+# Поля ответа — из схем, чтобы выборка без ORM не разошлась с response_model
+_NESTED = ("comments", "sub_tasks")
+_TASK_FIELDS = [name for name in schemas.Task.model_fields if name not in _NESTED]
+_SUB_TASK_FIELDS = [
+    name for name in schemas.SubTask.model_fields if name not in _NESTED
+]
+# Столько id в одном IN, как у selectinload
+_IN_BATCH_SIZE = 500
+
+
+def _child_dicts(db: Session, model, fields: list, parent_key: str, parent_ids):
+    """Строки model по родителям: parent_id -> [dict, ...] в порядке id."""
+    grouped = defaultdict(list)
+    parent_column = getattr(model, parent_key)
+    columns = [getattr(model, name) for name in fields]
+    parent_ids = list(parent_ids)
+    for i in range(0, len(parent_ids), _IN_BATCH_SIZE):
+        batch = parent_ids[i : i + _IN_BATCH_SIZE]
+        rows = db.execute(
+            select(*columns).where(parent_column.in_(batch)).order_by(model.id)
+        ).mappings()
+        for row in rows:
+            grouped[row[parent_key]].append(dict(row))
+    return grouped
+
+
+def get_task_dicts(
+    db: Session,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    sort: str = "id",
+    after: list = None,
+):
+    """То же, что get_tasks_with_details, но словарями в форме schemas.Task.
+
+    Колонки выбираются без ORM-объектов и без валидации схемами: для больших
+    списков это основная часть CPU ответа. Запросов столько же — по одному
+    на задачи, комментарии, подзадачи и комментарии подзадач.
+    """
+    query = db.query(*(getattr(models.Task, name) for name in _TASK_FIELDS)).filter(
+        models.Task.owner_id == owner_id
+    )
+    keys = pagination.TASK_SORTS[sort]
+    tasks = [row._asdict() for row in _paginate(query, keys, skip, limit, after)]
+
+    task_ids = [task["id"] for task in tasks]
+    comments = _child_dicts(
+        db,
+        models.TaskComment,
+        list(schemas.TaskComment.model_fields),
+        "task_id",
+        task_ids,
+    )
+    sub_tasks = _child_dicts(db, models.SubTask, _SUB_TASK_FIELDS, "task_id", task_ids)
+    sub_task_comments = _child_dicts(
+        db,
+        models.SubTaskComment,
+        list(schemas.SubTaskComment.model_fields),
+        "sub_task_id",
+        [sub_task["id"] for items in sub_tasks.values() for sub_task in items],
+    )
+
+    now = datetime.now()
     for task in tasks:
-        if task.is_timer_running and task.last_start_time:
-            current_session_time = (
-                datetime.now() - task.last_start_time
-            ).total_seconds()
-            task.total_time = (task.total_time or 0) + current_session_time
+        if task["is_timer_running"] and task["last_start_time"]:
+            current_session_time = (now - task["last_start_time"]).total_seconds()
+            task["total_time"] = (task["total_time"] or 0) + current_session_time
+        task["comments"] = comments.get(task["id"], [])
+        task["sub_tasks"] = sub_tasks.get(task["id"], [])
+        for sub_task in task["sub_tasks"]:
+            sub_task["comments"] = sub_task_comments.get(sub_task["id"], [])
     return tasks
 
 
-def update_task(db: Session, task_id: int, task_update: schemas.TaskUpdate):
-    db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not db_task:
-        return None
+def update_task(db: Session, db_task: models.Task, task_update: schemas.TaskUpdate):
+    old_total, old_project_id = db_task.total_time or 0.0, db_task.project_id
     update_data = task_update.dict(exclude_unset=True)
     if update_data.get("is_completed") and not db_task.is_completed:
         update_data["completed_at"] = datetime.now()
@@ -132,127 +547,541 @@ def update_task(db: Session, task_id: int, task_update: schemas.TaskUpdate):
         update_data["completed_at"] = None
     for field, value in update_data.items():
         setattr(db_task, field, value)
+    new_total = db_task.total_time or 0.0
+    if db_task.project_id != old_project_id:
+        # Время переезжает в новый проект по тем же дням, в которые записано
+        moved = _withdraw_from_rollups(
+            db,
+            db_task.owner_id,
+            old_project_id,
+            old_total,
+            _task_entry_days(db, db_task.id),
+        )
+        rate = _effective_rate(db, db_task.project_id)
+        for day, seconds in moved.items():
+            _add_to_rollup(db, db_task.owner_id, db_task.project_id, day, seconds, rate)
+        old_total = sum(moved.values())
+    record_task_adjustment(
+        db, db_task.owner_id, db_task.project_id, new_total - old_total
+    )
+    bump_data_version(db, db_task.owner_id)
     db.commit()
     db.refresh(db_task)
     return db_task
 
 
-def delete_task(db: Session, task_id: int):
-    db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if db_task:
-        db.delete(db_task)
-        db.commit()
-        return True
-    return False
+def delete_task(db: Session, db_task: models.Task):
+    if db_task.total_time:
+        # Время задачи снимается с тех дней, на которые оно записано
+        _withdraw_from_rollups(
+            db,
+            db_task.owner_id,
+            db_task.project_id,
+            db_task.total_time,
+            _task_entry_days(db, db_task.id),
+        )
+    db.query(models.TimeEntry).filter(models.TimeEntry.task_id == db_task.id).delete()
+    db.delete(db_task)
+    bump_data_version(db, db_task.owner_id)
+    db.commit()
 
 
 # ------------------------------------------------------------
 # Timer (Tasks)
 # ------------------------------------------------------------
-def start_timer(db: Session, task_id: int):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task:
+def _open_task_interval(db: Session, task: models.Task, start: datetime) -> bool:
+    """Запустить таймер задачи: UPDATE с условием + INSERT открытого интервала.
+
+    Возвращает False, если таймер уже запущен (например, параллельным запросом).
+    data_version повышает вызывающий, один раз на транзакцию.
+    """
+    started = (
+        db.query(models.Task)
+        .filter(models.Task.id == task.id, models.Task.is_timer_running == False)
+        .update(
+            {
+                models.Task.is_timer_running: True,
+                models.Task.last_start_time: start,
+            },
+            synchronize_session=False,
+        )
+    )
+    if started:
+        db.add(
+            models.TimeEntry(task_id=task.id, owner_id=task.owner_id, start_time=start)
+        )
+    return bool(started)
+
+
+def _close_task_interval(
+    db: Session, task: models.Task, start: datetime, end: datetime, record=True
+) -> bool:
+    """Остановить таймер задачи, запущенный в start, зафиксировав интервал до end.
+
+    total_time увеличивается в самом UPDATE, а не через чтение-изменение-запись,
+    поэтому из нескольких одновременных пауз (пользователь и планировщик)
+    срабатывает ровно одна. Возвращает False, если таймер уже остановлен.
+    """
+    stopped = (
+        db.query(models.Task)
+        .filter(
+            models.Task.id == task.id,
+            models.Task.is_timer_running == True,
+            models.Task.last_start_time == start,
+        )
+        .update(
+            {
+                models.Task.total_time: func.coalesce(models.Task.total_time, 0.0)
+                + (end - start).total_seconds(),
+                models.Task.is_timer_running: False,
+                models.Task.last_start_time: None,
+            },
+            synchronize_session=False,
+        )
+    )
+    if not stopped:
+        return False
+    closed = (
+        db.query(models.TimeEntry)
+        .filter(
+            models.TimeEntry.task_id == task.id, models.TimeEntry.end_time.is_(None)
+        )
+        .update({models.TimeEntry.end_time: end}, synchronize_session=False)
+    )
+    if not closed:
+        # Таймер был запущен до появления time_entries
+        db.add(
+            models.TimeEntry(
+                task_id=task.id, owner_id=task.owner_id, start_time=start, end_time=end
+            )
+        )
+    if record:
+        record_task_interval(db, task, start, end)
+    return True
+
+
+def _session_snapshot(session):
+    """Сессия для ответа, снятая до commit: после него объект пришлось бы перечитать."""
+    if session is None:
         return None
+    return schemas.DailyWorkSession.model_validate(session)
+
+
+def start_timer(db: Session, task: models.Task):
+    """Запустить таймер задачи и ежедневный таймер одним commit.
+
+    Возвращает сегодняшнюю сессию (schemas.DailyWorkSession).
+    """
+    now = datetime.now()
+    user_id = task.owner_id
     if task.is_timer_running and task.last_start_time:
-        current_session_time = (datetime.now() - task.last_start_time).total_seconds()
-        task.total_time = (task.total_time or 0) + current_session_time
-    task.is_timer_running = True
-    task.last_start_time = datetime.now()
+        # Повторный старт: закрываем текущий интервал и открываем новый
+        _close_task_interval(db, task, task.last_start_time, now)
+    _open_task_interval(db, task, now)
+    session = start_daily_timer(db, user_id, now)
+    bump_data_version(db, user_id)
+    db.flush()
+    snapshot = _session_snapshot(session)
     db.commit()
-    db.refresh(task)
-    return task
+    return snapshot
 
 
-def pause_timer(db: Session, task_id: int):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or not task.is_timer_running:
-        return None
-    if task.last_start_time:
-        current_session_time = (datetime.now() - task.last_start_time).total_seconds()
-        task.total_time = (task.total_time or 0) + current_session_time
-    task.is_timer_running = False
-    task.last_start_time = None
+def pause_timer(db: Session, task: models.Task):
+    """Остановить таймер задачи, а если других не осталось — и ежедневный.
+
+    Всё одним commit. Возвращает сегодняшнюю сессию (schemas.DailyWorkSession).
+    """
+    now = datetime.now()
+    user_id = task.owner_id
+    if task.is_timer_running:
+        if task.last_start_time:
+            # False — таймер уже остановил параллельный запрос
+            _close_task_interval(db, task, task.last_start_time, now)
+        else:
+            task.is_timer_running = False
+        db.flush()
+    # Сессия дня и «идут ли другие задачи» — одним запросом
+    other_running = (
+        select(models.Task.id)
+        .where(models.Task.owner_id == user_id, models.Task.is_timer_running == True)
+        .exists()
+    )
+    row = db.execute(today_daily_session_query(user_id).add_columns(other_running))
+    session, tasks_running = row.first() or (None, False)
+    if not tasks_running:
+        _stop_daily_session(session, now)
+    bump_data_version(db, user_id)
+    db.flush()
+    snapshot = _session_snapshot(session)
     db.commit()
-    db.refresh(task)
-    return task
+    return snapshot
+
+
+def _open_task_batch(db: Session, user_id: int, task_ids: list, now: datetime):
+    """Запустить таймеры задач одним UPDATE и вставить открытые интервалы.
+
+    Возвращает id задач, которые запустил именно этот вызов.
+    """
+    if not task_ids:
+        return []
+    started = db.execute(
+        update(models.Task)
+        .where(
+            models.Task.id.in_(task_ids),
+            models.Task.owner_id == user_id,
+            models.Task.is_timer_running == False,
+        )
+        .values(is_timer_running=True, last_start_time=now)
+        .execution_options(synchronize_session=False)
+    )
+    if started.rowcount != len(task_ids):
+        # Часть задач запустили параллельно; наши — с нашим временем старта
+        task_ids = db.scalars(
+            select(models.Task.id).where(
+                models.Task.id.in_(task_ids),
+                models.Task.is_timer_running == True,
+                models.Task.last_start_time == now,
+            )
+        ).all()
+    if task_ids:
+        db.execute(
+            insert(models.TimeEntry),
+            [
+                {"task_id": task_id, "owner_id": user_id, "start_time": now}
+                for task_id in task_ids
+            ],
+        )
+    return list(task_ids)
 
 
-def auto_pause_old_timers(db: Session, max_duration_hours: int = 1):
-    cutoff_time = datetime.now() - timedelta(hours=max_duration_hours)
-    old_tasks = (
-        db.query(models.Task)
+def apply_timer_batch(
+    db: Session, user_id: int, start_ids=(), pause_ids=(), pause_others=False
+):
+    """Запустить и остановить таймеры задач пользователя за один commit.
+
+    Останавливаются запущенные задачи из pause_ids, а при pause_others — все
+    запущенные, кроме start_ids (переключение на другие задачи). Задачи из
+    start_ids, которые ещё не идут, запускаются. Ежедневный таймер идёт, пока
+    идёт хотя бы одна задача. Владение задачами проверяет вызывающий.
+
+    Возвращает {"started": [...], "paused": [...], "daily_session": ...}.
+    """
+    start_ids, pause_ids = set(start_ids), set(pause_ids)
+    now = datetime.now()
+    running = (
+        db.query(
+            models.Task.id,
+            models.Task.owner_id,
+            models.Task.project_id,
+            models.Task.last_start_time,
+        )
+        .filter(models.Task.owner_id == user_id, models.Task.is_timer_running == True)
+        .all()
+    )
+    to_close = [
+        row
+        for row in running
+        if row.id in pause_ids or (pause_others and row.id not in start_ids)
+    ]
+    paused = [task_id for task_id, *_ in _close_task_batch(db, to_close, end=now)]
+    still_running = {row.id for row in running} - {row.id for row in to_close}
+    started = _open_task_batch(db, user_id, sorted(start_ids - still_running), now)
+
+    if started or still_running:
+        session = start_daily_timer(db, user_id, now)
+    else:
+        session = pause_daily_timer(db, user_id, now)
+    bump_data_version(db, user_id)
+    db.commit()
+    if session is not None:
+        db.refresh(session)
+    return {"started": started, "paused": paused, "daily_session": session}
+
+
+def _close_task_batch(db: Session, rows, end: datetime = None, max_duration=None):
+    """Остановить пачку таймеров: один UPDATE на tasks и один на time_entries.
+
+    rows — (id, owner_id, project_id, last_start_time) запущенных задач.
+    Интервал закрывается в end или, если он не задан, через max_duration
+    после старта. Массовый UPDATE идёт в SAVEPOINT: если часть таймеров
+    успели остановить параллельно, откатывается только он, и пачка
+    разбирается поштучно — остальная работа транзакции вызывающего
+    сохраняется. Таймеры без last_start_time останавливаются без учёта
+    времени, как в pause_timer.
+
+    Возвращает [(task_id, owner_id, project_id, start, end), ...] остановленных;
+    у остановленных без времени start равен None.
+    """
+    unstarted = [row for row in rows if row[3] is None]
+    rows = [row for row in rows if row[3] is not None]
+    closed = [
+        (task_id, owner_id, project_id, start, end or start + max_duration)
+        for task_id, owner_id, project_id, start in rows
+    ]
+    tasks = models.Task.__table__
+    entries = models.TimeEntry.__table__
+    params = [
+        {
+            "b_id": task_id,
+            "b_start": start,
+            "b_end": stop,
+            "b_seconds": (stop - start).total_seconds(),
+        }
+        for task_id, _, _, start, stop in closed
+    ]
+    if params:
+        savepoint = db.begin_nested()
+        stopped = db.execute(
+            update(tasks)
+            .where(
+                tasks.c.id == bindparam("b_id"),
+                tasks.c.is_timer_running == True,
+                tasks.c.last_start_time == bindparam("b_start"),
+            )
+            .values(
+                total_time=func.coalesce(tasks.c.total_time, 0.0)
+                + bindparam("b_seconds"),
+                is_timer_running=False,
+                last_start_time=None,
+            ),
+            params,
+        )
+        if stopped.rowcount != len(rows):
+            # Часть таймеров успели остановить параллельно — пачку разбираем поштучно
+            savepoint.rollback()
+            candidates, closed = closed, []
+            for row, interval in zip(rows, candidates):
+                _, _, _, start, stop = interval
+                if _close_task_interval(db, row, start, stop, record=False):
+                    closed.append(interval)
+        else:
+            db.execute(
+                update(entries)
+                .where(
+                    entries.c.task_id == bindparam("b_id"),
+                    entries.c.start_time == bindparam("b_start"),
+                    entries.c.end_time.is_(None),
+                )
+                .values(end_time=bindparam("b_end")),
+                params,
+            )
+            savepoint.commit()
+    record_intervals(db, [interval[1:] for interval in closed])
+    if unstarted:
+        stopped_ids = set(
+            db.scalars(
+                update(tasks)
+                .where(
+                    tasks.c.id.in_([row[0] for row in unstarted]),
+                    tasks.c.is_timer_running == True,
+                    tasks.c.last_start_time.is_(None),
+                )
+                .values(is_timer_running=False)
+                .returning(tasks.c.id)
+            )
+        )
+        closed += [
+            (task_id, owner_id, project_id, None, end)
+            for task_id, owner_id, project_id, _ in unstarted
+            if task_id in stopped_ids
+        ]
+    if closed:
+        _bump_data_versions(
+            db, models.User.id.in_({interval[1] for interval in closed})
+        )
+    return closed
+
+
+def _auto_pause_daily_sessions(
+    db: Session, user_ends: dict, cutoff: datetime, max_duration: timedelta
+):
+    """Остановить ежедневные таймеры пользователей, у которых не осталось задач.
+
+    Сессия закрывается моментом автоостановки последней задачи пользователя,
+    а если такой нет (например, задачу удалили) — через max_duration после старта.
+    Возвращает id пользователей, чьи сессии остановлены.
+    """
+    users_with_tasks = (
+        db.query(models.Task.owner_id)
+        .filter(models.Task.is_timer_running == True)
+        .distinct()
+    )
+    sessions = (
+        db.query(
+            models.DailyWorkSession.id,
+            models.DailyWorkSession.user_id,
+            models.DailyWorkSession.last_start_time,
+        )
         .filter(
-            models.Task.is_timer_running == True,
-            models.Task.last_start_time < cutoff_time,
+            models.DailyWorkSession.is_timer_running == True,
+            models.DailyWorkSession.last_start_time.isnot(None),
+            or_(
+                models.DailyWorkSession.user_id.in_(list(user_ends)),
+                models.DailyWorkSession.last_start_time < cutoff,
+            ),
+            models.DailyWorkSession.user_id.notin_(users_with_tasks.scalar_subquery()),
         )
         .all()
     )
-    for task in old_tasks:
-        if task.last_start_time:
-            max_duration = timedelta(hours=max_duration_hours)
-            elapsed_time = datetime.now() - task.last_start_time
-            if elapsed_time > max_duration:
-                task.total_time = (task.total_time or 0) + max_duration.total_seconds()
-                task.is_timer_running = False
-                task.last_start_time = None
+    if not sessions:
+        return set()
+    now = datetime.now()
+    params = []
+    for session_id, user_id, start in sessions:
+        end = user_ends.get(user_id, start + max_duration)
+        end = max(start, min(end, now))
+        params.append(
+            {
+                "b_id": session_id,
+                "b_start": start,
+                "b_seconds": (end - start).total_seconds(),
+            }
+        )
+    daily = models.DailyWorkSession.__table__
+    db.execute(
+        update(daily)
+        .where(
+            daily.c.id == bindparam("b_id"),
+            daily.c.is_timer_running == True,
+            daily.c.last_start_time == bindparam("b_start"),
+        )
+        .values(
+            total_time=func.coalesce(daily.c.total_time, 0.0) + bindparam("b_seconds"),
+            is_timer_running=False,
+            last_start_time=None,
+            updated_at=now,
+        ),
+        params,
+    )
+    user_ids = {user_id for _, user_id, _ in sessions}
+    _bump_data_versions(db, models.User.id.in_(user_ids))
+    return user_ids
+
+
+def auto_pause_old_timers(
+    db: Session, max_duration_hours: float = 1, batch_size: int = 500
+):
+    """Остановить таймеры, которые работают дольше max_duration_hours.
+
+    Задачи обрабатываются пачками по batch_size с commit после каждой, чтобы
+    не держать блокировку записи долго. Задаче засчитывается ровно
+    max_duration_hours. Затем закрываются ежедневные таймеры пользователей,
+    у которых не осталось запущенных задач.
+
+    Возвращает число затронутых строк и id пользователей.
+    """
+    max_duration = timedelta(hours=max_duration_hours)
+    cutoff_time = datetime.now() - max_duration
+    user_ends = {}
+    paused_tasks = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(
+                models.Task.id,
+                models.Task.owner_id,
+                models.Task.project_id,
+                models.Task.last_start_time,
+            )
+            .filter(
+                models.Task.is_timer_running == True,
+                models.Task.last_start_time < cutoff_time,
+                models.Task.id > last_id,
+            )
+            .order_by(models.Task.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for _, owner_id, _, _, end in _close_task_batch(
+            db, rows, max_duration=max_duration
+        ):
+            user_ends[owner_id] = max(end, user_ends.get(owner_id, end))
+            paused_tasks += 1
+        db.commit()
+
+    session_users = _auto_pause_daily_sessions(db, user_ends, cutoff_time, max_duration)
     db.commit()
-    return len(old_tasks)
+    return {
+        "tasks": paused_tasks,
+        "daily_sessions": len(session_users),
+        "user_ids": sorted(set(user_ends) | session_users),
+    }
+
+
+def get_time_entries(
+    db: Session, owner_id: int, start: datetime, end: datetime, task_id: int = None
+):
+    """Интервалы, пересекающиеся с [start, end); открытые — тоже."""
+    query = db.query(models.TimeEntry).filter(
+        models.TimeEntry.owner_id == owner_id,
+        models.TimeEntry.start_time < end,
+        or_(models.TimeEntry.end_time.is_(None), models.TimeEntry.end_time > start),
+    )
+    if task_id is not None:
+        query = query.filter(models.TimeEntry.task_id == task_id)
+    return query.order_by(models.TimeEntry.start_time).all()
 
 
 # ------------------------------------------------------------
 # Task Comments
 # ------------------------------------------------------------
-def create_task_comment(db: Session, comment: schemas.TaskCommentCreate, task_id: int):
-    db_comment = models.TaskComment(content=comment.content, task_id=task_id)
+def create_task_comment(
+    db: Session, comment: schemas.TaskCommentCreate, task: models.Task
+):
+    db_comment = models.TaskComment(content=comment.content, task_id=task.id)
     db.add(db_comment)
+    bump_data_version(db, task.owner_id)
     db.commit()
     db.refresh(db_comment)
     return db_comment
 
 
-def get_task_comments(db: Session, task_id: int):
-    return (
-        db.query(models.TaskComment).filter(models.TaskComment.task_id == task_id).all()
-    )
+def get_task_comments(
+    db: Session, task_id: int, limit: int = None, after_id: int = None
+):
+    query = db.query(models.TaskComment).filter(models.TaskComment.task_id == task_id)
+    if after_id is not None:
+        query = query.filter(models.TaskComment.id > after_id)
+    return query.order_by(models.TaskComment.id).limit(limit).all()
 
 
-def delete_task_comment(db: Session, comment_id: int):
-    db_comment = (
-        db.query(models.TaskComment).filter(models.TaskComment.id == comment_id).first()
-    )
-    if db_comment:
-        db.delete(db_comment)
-        db.commit()
-        return True
-    return False
+def delete_task_comment(db: Session, db_comment: models.TaskComment):
+    """db_comment — с загруженной comment.task (deps.get_owned_task_comment)."""
+    db.delete(db_comment)
+    bump_data_version(db, db_comment.task.owner_id)
+    db.commit()
 
 
 # ------------------------------------------------------------
 # SubTasks
 # ------------------------------------------------------------
-def create_sub_task(db: Session, sub_task: schemas.SubTaskCreate, task_id: int):
-    db_sub_task = models.SubTask(title=sub_task.title, task_id=task_id)
+def create_sub_task(db: Session, sub_task: schemas.SubTaskCreate, task: models.Task):
+    db_sub_task = models.SubTask(title=sub_task.title, task_id=task.id)
     db.add(db_sub_task)
+    bump_data_version(db, task.owner_id)
     db.commit()
     db.refresh(db_sub_task)
     return db_sub_task
 
 
-def get_sub_tasks(db: Session, task_id: int):
-    sub_tasks = db.query(models.SubTask).filter(models.SubTask.task_id == task_id).all()
-    for sub in sub_tasks:
-        sub.comments = get_sub_task_comments(db, sub.id)
-    return sub_tasks
+def get_sub_tasks(db: Session, task_id: int, limit: int = None, after_id: int = None):
+    query = (
+        db.query(models.SubTask)
+        .options(selectinload(models.SubTask.comments))
+        .filter(models.SubTask.task_id == task_id)
+    )
+    if after_id is not None:
+        query = query.filter(models.SubTask.id > after_id)
+    return query.order_by(models.SubTask.id).limit(limit).all()
 
 
 def update_sub_task(
-    db: Session, sub_task_id: int, sub_task_update: schemas.SubTaskUpdate
+    db: Session, db_sub_task: models.SubTask, sub_task_update: schemas.SubTaskUpdate
 ):
-    db_sub_task = (
-        db.query(models.SubTask).filter(models.SubTask.id == sub_task_id).first()
-    )
-    if not db_sub_task:
-        return None
+    """db_sub_task — с загруженной sub_task.task (deps.get_owned_sub_task)."""
     update_data = sub_task_update.dict(exclude_unset=True)
     if update_data.get("is_completed") and not db_sub_task.is_completed:
         update_data["completed_at"] = datetime.now()
@@ -260,74 +1089,70 @@ def update_sub_task(
         update_data["completed_at"] = None
     for field, value in update_data.items():
         setattr(db_sub_task, field, value)
+    bump_data_version(db, db_sub_task.task.owner_id)
     db.commit()
     db.refresh(db_sub_task)
     return db_sub_task
 
 
-def delete_sub_task(db: Session, sub_task_id: int):
-    db_sub_task = (
-        db.query(models.SubTask).filter(models.SubTask.id == sub_task_id).first()
-    )
-    if db_sub_task:
-        db.delete(db_sub_task)
-        db.commit()
-        return True
-    return False
+def delete_sub_task(db: Session, db_sub_task: models.SubTask):
+    db.delete(db_sub_task)
+    bump_data_version(db, db_sub_task.task.owner_id)
+    db.commit()
 
 
 # ------------------------------------------------------------
 # SubTask Comments
 # ------------------------------------------------------------
 def create_sub_task_comment(
-    db: Session, comment: schemas.SubTaskCommentCreate, sub_task_id: int
+    db: Session, comment: schemas.SubTaskCommentCreate, sub_task: models.SubTask
 ):
-    db_comment = models.SubTaskComment(content=comment.content, sub_task_id=sub_task_id)
+    db_comment = models.SubTaskComment(content=comment.content, sub_task_id=sub_task.id)
     db.add(db_comment)
+    bump_data_version(db, sub_task.task.owner_id)
     db.commit()
     db.refresh(db_comment)
     return db_comment
 
 
-def get_sub_task_comments(db: Session, sub_task_id: int):
-    return (
-        db.query(models.SubTaskComment)
-        .filter(models.SubTaskComment.sub_task_id == sub_task_id)
-        .all()
+def get_sub_task_comments(
+    db: Session, sub_task_id: int, limit: int = None, after_id: int = None
+):
+    query = db.query(models.SubTaskComment).filter(
+        models.SubTaskComment.sub_task_id == sub_task_id
     )
+    if after_id is not None:
+        query = query.filter(models.SubTaskComment.id > after_id)
+    return query.order_by(models.SubTaskComment.id).limit(limit).all()
 
 
-def delete_sub_task_comment(db: Session, comment_id: int):
-    db_comment = (
-        db.query(models.SubTaskComment)
-        .filter(models.SubTaskComment.id == comment_id)
-        .first()
-    )
-    if db_comment:
-        db.delete(db_comment)
-        db.commit()
-        return True
-    return False
+def delete_sub_task_comment(db: Session, db_comment: models.SubTaskComment):
+    """db_comment — с загруженными comment.sub_task.task."""
+    db.delete(db_comment)
+    bump_data_version(db, db_comment.sub_task.task.owner_id)
+    db.commit()
 
 
 # ------------------------------------------------------------
 # Daily Work Sessions
 # ------------------------------------------------------------
 def get_or_create_daily_session(db: Session, user_id: int, for_date: datetime = None):
-    """Получить или создать сессию для указанной даты."""
+    """Получить или создать сессию для указанной даты (без commit).
+
+    Вставка идёт в SAVEPOINT: если сессию за этот день успела создать
+    параллельная транзакция, откатывается только она, а не вся транзакция
+    вызывающего.
+    """
     if for_date is None:
         for_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     else:
         for_date = for_date.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    session = (
-        db.query(models.DailyWorkSession)
-        .filter(
-            models.DailyWorkSession.user_id == user_id,
-            models.DailyWorkSession.date == for_date,
-        )
-        .first()
+    query = db.query(models.DailyWorkSession).filter(
+        models.DailyWorkSession.user_id == user_id,
+        models.DailyWorkSession.date == for_date,
     )
+    session = query.first()
 
     if not session:
         session = models.DailyWorkSession(
@@ -337,94 +1162,130 @@ def get_or_create_daily_session(db: Session, user_id: int, for_date: datetime =
             is_timer_running=False,
             last_start_time=None,
         )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
+        try:
+            with db.begin_nested():
+                db.add(session)
+        except IntegrityError:
+            # Блокирующее чтение видит строку и при REPEATABLE READ (MySQL)
+            return query.with_for_update().one()
     return session
 
 
-def start_daily_timer(db: Session, user_id: int):
-    """Запустить ежедневный таймер, если ещё не запущен."""
-    session = get_or_create_daily_session(db, user_id)
+def start_daily_timer(db: Session, user_id: int, now: datetime = None):
+    """Запустить ежедневный таймер, если ещё не запущен (без commit)."""
+    now = now or datetime.now()
+    session = get_or_create_daily_session(db, user_id, now)
     if not session.is_timer_running:
         # Если таймер не запущен, но есть last_start_time (остаток от предыдущего дня?) – обнулим
-        session.last_start_time = datetime.now()
+        session.last_start_time = now
         session.is_timer_running = True
-        db.commit()
-        db.refresh(session)
+        session.updated_at = now
     return session
 
 
-def pause_daily_timer(db: Session, user_id: int):
-    """Остановить ежедневный таймер, добавив время текущей сессии."""
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    session = (
-        db.query(models.DailyWorkSession)
-        .filter(
-            models.DailyWorkSession.user_id == user_id,
-            models.DailyWorkSession.date == today_start,
-        )
-        .first()
-    )
+def pause_daily_timer(db: Session, user_id: int, now: datetime = None):
+    """Остановить ежедневный таймер, добавив время текущей сессии (без commit)."""
+    now = now or datetime.now()
+    session = db.scalars(today_daily_session_query(user_id)).first()
+    _stop_daily_session(session, now)
+    return session
+
 
+def _stop_daily_session(session, now: datetime):
     if session and session.is_timer_running and session.last_start_time:
-        elapsed = (datetime.now() - session.last_start_time).total_seconds()
+        elapsed = (now - session.last_start_time).total_seconds()
         session.total_time += elapsed
         session.is_timer_running = False
         session.last_start_time = None
-        db.commit()
-        db.refresh(session)
-    return session
+        session.updated_at = now
+
+
+def daily_sessions_query(user_id: int, start: date, end: date):
+    """SELECT сессий пользователя за период [start, end] (общий для sync и async)."""
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    return select(
+        models.DailyWorkSession.date,
+        models.DailyWorkSession.total_time,
+        models.DailyWorkSession.is_timer_running,
+        models.DailyWorkSession.last_start_time,
+    ).where(
+        models.DailyWorkSession.user_id == user_id,
+        models.DailyWorkSession.date >= range_start,
+        models.DailyWorkSession.date < range_end,
+    )
 
 
-def get_daily_stats(db: Session, user_id: int, days: int = 30):
-    """Получить статистику за последние N дней."""
-    end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    start_date = end_date - timedelta(days=days - 1)
+def fill_daily_totals(start: date, end: date, sessions):
+    """Плотный массив секунд по дням: элемент i соответствует start + i дней.
 
-    sessions = (
-        db.query(models.DailyWorkSession)
-        .filter(
-            models.DailyWorkSession.user_id == user_id,
-            models.DailyWorkSession.date >= start_date,
-        )
-        .order_by(models.DailyWorkSession.date)
-        .all()
-    )
+    Один проход по сессиям диапазона, без поиска по списку для каждого дня.
+    """
+    totals = [0.0] * ((end - start).days + 1)
+    now = datetime.now()
+    for day, total, is_running, last_start_time in sessions:
+        total = total or 0.0
+        if is_running and last_start_time:
+            total += (now - last_start_time).total_seconds()
+        totals[(day.date() - start).days] += total
+    return totals
 
-    # Преобразуем в список словарей для удобства
-    stats = []
-    for sess in sessions:
-        total = sess.total_time
-        if sess.is_timer_running and sess.last_start_time:
-            total += (datetime.now() - sess.last_start_time).total_seconds()
-        stats.append({"date": sess.date.strftime("%Y-%m-%d"), "total_seconds": total})
 
-    # Заполним отсутствующие дни нулями
-    existing_dates = {s["date"] for s in stats}
+def get_daily_totals(db: Session, user_id: int, start: date, end: date):
+    sessions = db.execute(daily_sessions_query(user_id, start, end))
+    return fill_daily_totals(start, end, sessions)
+
+
+def rollup_daily_totals(start: date, totals: list, group: str = "day"):
+    """Свернуть плотный массив по дням в периоды: day, week (с понедельника), month.
+
+    Возвращает список пар (дата начала периода, секунды).
+    """
+    if group == "day":
+        return [(start + timedelta(days=i), total) for i, total in enumerate(totals)]
     result = []
-    for i in range(days):
-        day = (start_date + timedelta(days=i)).date()
-        day_str = day.strftime("%Y-%m-%d")
-        if day_str in existing_dates:
-            result.append(next(s for s in stats if s["date"] == day_str))
+    current_key = None
+    for i, total in enumerate(totals):
+        day = start + timedelta(days=i)
+        if group == "week":
+            key = day - timedelta(days=day.weekday())
+        elif group == "month":
+            key = day.replace(day=1)
         else:
-            result.append({"date": day_str, "total_seconds": 0.0})
-    return result
+            raise ValueError(f"Unknown group: {group}")
+        if key != current_key:
+            result.append([key, 0.0])
+            current_key = key
+        result[-1][1] += total
+    return [(key, total) for key, total in result]
 
 
-def get_today_daily_session(db: Session, user_id: int):
-    """Получить сегодняшнюю сессию из БД (без учёта текущего времени)."""
+def daily_stats_items(start: date, totals: list):
+    return [
+        {"date": day.strftime("%Y-%m-%d"), "total_seconds": total}
+        for day, total in rollup_daily_totals(start, totals)
+    ]
+
+
+def get_daily_stats(db: Session, user_id: int, days: int = 30):
+    """Получить статистику за последние N дней."""
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    totals = get_daily_totals(db, user_id, start_date, end_date)
+    return daily_stats_items(start_date, totals)
+
+
+def today_daily_session_query(user_id: int):
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    session = (
-        db.query(models.DailyWorkSession)
-        .filter(
-            models.DailyWorkSession.user_id == user_id,
-            models.DailyWorkSession.date == today_start,
-        )
-        .first()
+    return select(models.DailyWorkSession).where(
+        models.DailyWorkSession.user_id == user_id,
+        models.DailyWorkSession.date == today_start,
     )
-    return session
+
+
+def get_today_daily_session(db: Session, user_id: int):
+    """Получить сегодняшнюю сессию из БД (без учёта текущего времени)."""
+    return db.scalars(today_daily_session_query(user_id)).first()
 
 
 def check_any_task_running(db: Session, user_id: int) -> bool:
@@ -437,37 +1298,79 @@ def check_any_task_running(db: Session, user_id: int) -> bool:
     )
 
 
+def get_running_tasks(db: Session, user_id: int):
+    """Задачи пользователя с запущенным таймером."""
+    return (
+        db.query(models.Task)
+        .filter(models.Task.owner_id == user_id, models.Task.is_timer_running == True)
+        .all()
+    )
+
+
 # ------------------------------------------------------------
 # Earnings
 # ------------------------------------------------------------
-def get_user_earnings_summary(db: Session, user_id: int):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        return None
+def _month(db: Session, day_column):
+    """SQL-выражение: 'YYYY-MM' для даты (зависит от диалекта)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m", day_column)
+    if dialect in ("mysql", "mariadb"):
+        return func.date_format(day_column, "%Y-%m")
+    return func.to_char(day_column, "YYYY-MM")
+
+
+def _rate_expression():
+    """Ставка в SQL, как в _effective_rates; нужны JOIN users и OUTER JOIN projects."""
+    return case(
+        (models.Project.id.is_(None), 0.0),
+        (models.Project.hourly_rate > 0, models.Project.hourly_rate),
+        else_=func.coalesce(models.User.default_hourly_rate, 0.0),
+    )
 
-    projects = db.query(models.Project).filter(models.Project.owner_id == user_id).all()
-    total_earned = 0.0
-    for project in projects:
-        total_time = 0
-        for task in project.tasks:
-            total_time += task.total_time or 0
-            if task.is_timer_running and task.last_start_time:
-                total_time += (datetime.now() - task.last_start_time).total_seconds()
-        # Используем ставку проекта, если она > 0, иначе ставку пользователя
-        rate = project.hourly_rate if project.hourly_rate > 0 else user.default_hourly_rate
-        total_earned += total_time * rate / 3600
 
-    now = datetime.now()
-    months_since = (now.year - user.created_at.year) * 12 + (
-        now.month - user.created_at.month
+def get_earnings_by_month(db: Session, user_id: int):
+    """Закрытое время и заработок по (месяц, проект) одним запросом.
+
+    Время оценивается по текущим ставкам, как и в остальных отчётах.
+    """
+    month = _month(db, models.TimeRollup.day).label("month")
+    seconds = models.TimeRollup.seconds
+    return (
+        db.query(
+            month,
+            models.TimeRollup.project_id,
+            models.Project.name,
+            func.sum(seconds),
+            func.sum(seconds * _rate_expression()) / 3600,
+        )
+        .select_from(models.TimeRollup)
+        .join(models.User, models.User.id == models.TimeRollup.user_id)
+        .outerjoin(models.Project, models.Project.id == models.TimeRollup.project_id)
+        .filter(models.TimeRollup.user_id == user_id)
+        .group_by(month, models.TimeRollup.project_id, models.Project.name)
+        .all()
     )
-    if months_since < 1:
-        months_since = 1
 
-    average_monthly = total_earned / months_since
 
-    return {
-        "total_earned": total_earned,
-        "months_since_registration": months_since,
-        "average_monthly": average_monthly,
-    }
+def get_running_earnings(db: Session, user_id: int, now: datetime):
+    """Время и заработок текущих сессий запущенных таймеров по проектам."""
+    seconds = _elapsed_seconds(db, models.Task.last_start_time, now)
+    return (
+        db.query(
+            models.Task.project_id,
+            models.Project.name,
+            func.sum(seconds),
+            func.sum(seconds * _rate_expression()) / 3600,
+        )
+        .select_from(models.Task)
+        .join(models.User, models.User.id == models.Task.owner_id)
+        .outerjoin(models.Project, models.Project.id == models.Task.project_id)
+        .filter(
+            models.Task.owner_id == user_id,
+            models.Task.is_timer_running == True,
+            models.Task.last_start_time.isnot(None),
+        )
+        .group_by(models.Task.project_id, models.Project.name)
+        .all()
+    )
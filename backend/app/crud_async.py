@@ -0,0 +1,62 @@
+"""Асинхронные версии запросов для эндпоинтов на AsyncSession.
+
+На AsyncSession работают только регистрация, логин, /users/me и чтения
+ежедневного таймера, которые клиенты опрашивают постоянно. Остальные
+эндпоинты, в том числе все записи, остаются на sync-сессии: CAS таймеров и
+учёт time_rollups не дублируются. Цель — чтобы сотни опрашивающих клиентов
+не исчерпывали пул потоков и соединений, а не пропускная способность: на
+SQLite при небольшой конкурентности async-путь медленнее.
+
+SQL строится теми же функциями, что и в crud, здесь только выполнение;
+совпадение результатов с crud проверяет tests/test_crud_async.py.
+"""
+
+from datetime import date, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, schemas
+
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.scalars(
+        select(models.User).where(models.User.username == username)
+    )
+    return result.first()
+
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate, password_hash: str):
+    db_user = models.User(username=user.username, password=password_hash)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def get_data_version(db: AsyncSession, user_id: int):
+    result = await db.execute(crud.data_version_query(user_id))
+    return result.first()
+
+
+async def get_today_daily_session(db: AsyncSession, user_id: int):
+    """Получить сегодняшнюю сессию из БД (без учёта текущего времени)."""
+    result = await db.scalars(crud.today_daily_session_query(user_id))
+    return result.first()
+
+
+async def get_daily_totals(db: AsyncSession, user_id: int, start: date, end: date):
+    sessions = await db.execute(crud.daily_sessions_query(user_id, start, end))
+    return crud.fill_daily_totals(start, end, sessions)
+
+
+async def get_daily_stats(db: AsyncSession, user_id: int, days: int = 30):
+    """Получить статистику за последние N дней."""
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    totals = await get_daily_totals(db, user_id, start_date, end_date)
+    return crud.daily_stats_items(start_date, totals)
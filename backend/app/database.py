@@ -1,7 +1,10 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,12 +12,101 @@ load_dotenv()
 # Используем SQLite вместо MySQL
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./task_tracker.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Только для SQLite
-)
+# Пул соединений. pool_size + max_overflow не меньше размера threadpool,
+# иначе sync-эндпоинты ждут соединение, держа поток
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# MySQL закрывает простаивающие соединения через wait_timeout (8 часов)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# PRAGMA для SQLite. WAL позволяет читать отчёты, не блокируя запись таймеров
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Отрицательное значение — размер в килобайтах
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-64000"))
+
+# Асинхронные драйверы для того же URL: sqlite -> aiosqlite, mysql -> aiomysql
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": "aiomysql"}
+
+
+def get_async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(
+        drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"
+    ).render_as_string(hide_password=False)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+
+def engine_options(url: str) -> dict:
+    """Параметры create_engine/create_async_engine для диалекта URL."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options = {
+            "connect_args": {
+                # Соединение отдаётся из пула в другой поток
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            }
+        }
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    else:
+        options = {
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "pool_recycle": DB_POOL_RECYCLE,
+        }
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+def create_db_engine(url: str):
+    engine = create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def create_async_db_engine(url: str):
+    options = engine_options(url)
+    if "pool_size" in options and make_url(url).get_backend_name() == "sqlite":
+        # По умолчанию aiosqlite работает без пула и открывает файл на запрос
+        options["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(url, **options)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", get_async_database_url(SQLALCHEMY_DATABASE_URL)
+)
+
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -24,3 +116,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
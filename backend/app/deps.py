@@ -0,0 +1,180 @@
+"""Зависимости FastAPI: текущий пользователь и сущности, которыми он владеет.
+
+get_owned_* загружают сущность вместе с цепочкой родителей до Task одним
+запросом с JOIN и условием на владельца и отдают объект эндпоинту, а тот —
+в crud, где он уже не перечитывается по id. Чужая и несуществующая сущность
+неотличимы: обе дают 404.
+"""
+
+from fastapi import Depends, HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, contains_eager, joinedload
+
+from . import crud, crud_async, models, schemas
+from .auth import ALGORITHM, SECRET_KEY
+from .database import get_async_db, get_db
+from .user_cache import attach_user, user_cache
+
+
+# ------------------------------------------------------------
+# Текущий пользователь
+# ------------------------------------------------------------
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def decode_access_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+def get_current_user(
+    token: str = Depends(schemas.oauth2_scheme), db: Session = Depends(get_db)
+):
+    cached = user_cache.get(token)
+    if cached is not None:
+        return attach_user(db, cached)
+
+    payload = decode_access_token(token)
+    username, user_id = payload["sub"], payload.get("uid")
+    if user_id is not None:
+        user = db.get(models.User, user_id)
+    else:
+        # Токены, выданные до появления uid в claims
+        user = crud.get_user_by_username(db, username=username)
+    if user is None or user.username != username:
+        raise _credentials_exception()
+    user_cache.put(token, user, payload["exp"])
+    return user
+
+
+async def get_current_user_async(
+    token: str = Depends(schemas.oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """То же, что get_current_user, для async-эндпоинтов."""
+    cached = user_cache.get(token)
+    if cached is not None:
+        return attach_user(db, cached)
+
+    payload = decode_access_token(token)
+    username, user_id = payload["sub"], payload.get("uid")
+    if user_id is not None:
+        user = await crud_async.get_user(db, user_id)
+    else:
+        user = await crud_async.get_user_by_username(db, username)
+    if user is None or user.username != username:
+        raise _credentials_exception()
+    user_cache.put(token, user, payload["exp"])
+    return user
+
+
+# ------------------------------------------------------------
+# Сущности текущего пользователя
+# ------------------------------------------------------------
+def _first_or_404(query, detail: str):
+    entity = query.first()
+    if entity is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return entity
+
+
+def owned_project(db: Session, project_id: int, owner_id: int) -> models.Project:
+    """Проект пользователя по id (в том числе из тела запроса) или 404."""
+    return _first_or_404(
+        db.query(models.Project).filter(
+            models.Project.id == project_id, models.Project.owner_id == owner_id
+        ),
+        "Project not found",
+    )
+
+
+def get_owned_project(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> models.Project:
+    return owned_project(db, project_id, current_user.id)
+
+
+def get_owned_task(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> models.Task:
+    """Задача с загруженной task.project (ставка для учёта времени таймера)."""
+    return _first_or_404(
+        db.query(models.Task)
+        .options(joinedload(models.Task.project))
+        .filter(models.Task.id == task_id, models.Task.owner_id == current_user.id),
+        "Task not found",
+    )
+
+
+def get_owned_sub_task(
+    sub_task_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> models.SubTask:
+    """Подзадача с загруженной sub_task.task."""
+    return _first_or_404(
+        db.query(models.SubTask)
+        .join(models.SubTask.task)
+        .options(contains_eager(models.SubTask.task))
+        .filter(
+            models.SubTask.id == sub_task_id,
+            models.Task.owner_id == current_user.id,
+        ),
+        "Sub task not found",
+    )
+
+
+def get_owned_task_comment(
+    comment_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> models.TaskComment:
+    """Комментарий к задаче с загруженной comment.task."""
+    return _first_or_404(
+        db.query(models.TaskComment)
+        .join(models.TaskComment.task)
+        .options(contains_eager(models.TaskComment.task))
+        .filter(
+            models.TaskComment.id == comment_id,
+            models.Task.owner_id == current_user.id,
+        ),
+        "Comment not found",
+    )
+
+
+def get_owned_sub_task_comment(
+    comment_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> models.SubTaskComment:
+    """Комментарий к подзадаче с загруженными comment.sub_task.task."""
+    return _first_or_404(
+        db.query(models.SubTaskComment)
+        .join(models.SubTaskComment.sub_task)
+        .join(models.SubTask.task)
+        .options(
+            contains_eager(models.SubTaskComment.sub_task).contains_eager(
+                models.SubTask.task
+            )
+        )
+        .filter(
+            models.SubTaskComment.id == comment_id,
+            models.Task.owner_id == current_user.id,
+        ),
+        "Comment not found",
+    )
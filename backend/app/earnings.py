@@ -0,0 +1,129 @@
+"""Сводка заработка: история из time_rollups плюс запущенные таймеры.
+
+Агрегат по закрытому времени кэшируется в процессе по (пользователь,
+data_version). Версия растёт при любом изменении входных данных — ставки
+пользователя или проекта, закрытии интервала, правке или удалении задачи,
+— поэтому устаревшая запись просто не совпадёт по версии, а другие процессы
+увидят новую версию в БД. Текущие сессии таймеров меняются каждую секунду
+и досчитываются отдельным запросом, только если таймер запущен.
+"""
+
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+EARNINGS_CACHE_SIZE = int(os.getenv("EARNINGS_CACHE_SIZE", "1024"))
+
+
+class VersionedCache:
+    """LRU-кэш: запись годна, пока версия данных совпадает с сохранённой."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+earnings_cache = VersionedCache(maxsize=EARNINGS_CACHE_SIZE)
+
+
+def _month_range(first: str, last: str):
+    """Все месяцы 'YYYY-MM' от first до last включительно."""
+    year, month = map(int, first.split("-"))
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def get_earnings_summary(db: Session, user: models.User, state=None):
+    """Итог, средний за месяц и разбивка по месяцам и проектам.
+
+    state — результат crud.get_data_version, если он уже получен в запросе.
+    """
+    if state is None:
+        state = crud.get_data_version(db, user.id)
+    if state is None:
+        return None
+    data_version, timer_running = state
+
+    closed = earnings_cache.get(user.id, data_version)
+    if closed is None:
+        closed = [tuple(row) for row in crud.get_earnings_by_month(db, user.id)]
+        earnings_cache.put(user.id, data_version, closed)
+
+    now = datetime.now()
+    current_month = now.strftime("%Y-%m")
+    rows = list(closed)
+    if timer_running:
+        rows.extend(
+            (current_month, *row) for row in crud.get_running_earnings(db, user.id, now)
+        )
+
+    by_month = defaultdict(lambda: [0.0, 0.0])
+    by_project = {}
+    for month, project_id, name, seconds, earned in rows:
+        seconds, earned = seconds or 0.0, earned or 0.0
+        by_month[month][0] += seconds
+        by_month[month][1] += earned
+        project = by_project.setdefault(project_id, [name, 0.0, 0.0])
+        project[1] += seconds
+        project[2] += earned
+
+    total_earned = sum(earned for _, earned in by_month.values())
+    months_since = (now.year - user.created_at.year) * 12 + (
+        now.month - user.created_at.month
+    )
+    if months_since < 1:
+        months_since = 1
+
+    first_month = min([user.created_at.strftime("%Y-%m"), *by_month])
+    return {
+        "total_earned": total_earned,
+        "months_since_registration": months_since,
+        "average_monthly": total_earned / months_since,
+        "months": [
+            {
+                "month": month,
+                "seconds": by_month[month][0],
+                "earned": by_month[month][1],
+            }
+            for month in _month_range(first_month, current_month)
+        ],
+        "projects": [
+            {
+                "project_id": project_id,
+                "name": name,
+                "seconds": seconds,
+                "earned": earned,
+            }
+            for project_id, (name, seconds, earned) in sorted(
+                by_project.items(), key=lambda item: -item[1][2]
+            )
+        ],
+    }
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class TimerEventBroker:
+    """Рассылка изменений таймеров подписчикам (SSE) внутри процесса.
+
+    Публиковать можно из любого потока (эндпоинты работают в threadpool,
+    планировщик — в своём потоке): доставка всегда выполняется в event loop.
+    Каждому подписчику важно только последнее состояние, поэтому очередь
+    хранит не больше одного события.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._subscribers
+
+    def subscribed_user_ids(self) -> list:
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, user_id: int, payload: str):
+        if self._loop is None or self._loop.is_closed():
+            return
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for queue in queues:
+            self._loop.call_soon_threadsafe(_deliver_latest, queue, payload)
+
+
+def _deliver_latest(queue: asyncio.Queue, payload: str):
+    # Старое непрочитанное состояние больше не актуально — заменяем его
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+broker = TimerEventBroker()
@@ -0,0 +1,312 @@
+"""Потоковая выгрузка отчёта по времени: CSV, NDJSON и XLSX.
+
+Строки читаются из БД порциями (yield_per) и сразу пишутся в ответ, поэтому
+память не зависит от объёма истории. По задачам отчёт строится из
+time_entries: интервалы идут по start_time и режутся по дням, а день
+отдаётся, как только начались интервалы следующего; дни без интервалов
+(время, записанное до появления time_entries) берутся по проектам из
+time_rollups. По проектам — из time_rollups, куда попадают и ручные правки
+total_time.
+
+XLSX — zip, и его оглавление пишется в конце, поэтому файл сначала
+собирается во временный файл (на диске, если он больше
+EXPORT_SPOOL_MAX_BYTES), а затем отдаётся кусками.
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+COLUMNS = (
+    "day",
+    "project_id",
+    "project",
+    "task_id",
+    "task",
+    "seconds",
+    "hours",
+    "earnings",
+)
+
+
+# ------------------------------------------------------------
+# Строки отчёта
+# ------------------------------------------------------------
+def _user_rates(db: Session, user_id: int) -> dict:
+    project_ids = db.scalars(
+        select(models.Project.id).where(models.Project.owner_id == user_id)
+    ).all()
+    return crud._effective_rates(db, project_ids)
+
+
+def _row(day, project_id, project, task_id, task, seconds, rate):
+    return (
+        day,
+        project_id,
+        project,
+        task_id,
+        task,
+        round(seconds, 3),
+        round(seconds / 3600, 4),
+        round(seconds * rate / 3600, 2),
+    )
+
+
+def task_day_rows(
+    db: Session, user_id: int, start: date, end: date, project_id: int = None
+):
+    """Время по (день, задача) за [start, end]; открытые интервалы — до сейчас.
+
+    За дни без интервалов отдаются строки по проектам из time_rollups
+    (task_id пустой): история до time_entries иначе пропала бы из отчёта.
+    """
+    # Читаются целиком до интервалов: два потоковых курсора на одном
+    # соединении MySQL не поддерживает. Строк не больше дней × проектов
+    rollups = {}
+    for row in project_day_rows(db, user_id, start, end, project_id):
+        rollups.setdefault(row[0], []).append(row)
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    now = datetime.now()
+    rates = _user_rates(db, user_id)
+
+    query = (
+        select(
+            models.TimeEntry.start_time,
+            models.TimeEntry.end_time,
+            models.Task.id,
+            models.Task.title,
+            models.Task.project_id,
+            models.Project.name,
+        )
+        .join(models.Task, models.Task.id == models.TimeEntry.task_id)
+        .outerjoin(models.Project, models.Project.id == models.Task.project_id)
+        .where(
+            models.TimeEntry.owner_id == user_id,
+            models.TimeEntry.start_time < range_end,
+            or_(
+                models.TimeEntry.end_time.is_(None),
+                models.TimeEntry.end_time > range_start,
+            ),
+        )
+        .order_by(models.TimeEntry.start_time)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if project_id is not None:
+        query = query.where(models.Task.project_id == project_id)
+
+    # день -> task_id -> [секунды, проект, название проекта, задача]
+    pending = {}
+
+    def flush(before: date):
+        for day in sorted(d for d in pending if d < before):
+            for rollup_day in sorted(d for d in rollups if d < day):
+                yield from rollups.pop(rollup_day)
+            rollups.pop(day, None)
+            tasks = pending.pop(day)
+            for task_id, (seconds, p_id, p_name, title) in sorted(
+                tasks.items(),
+                key=lambda item: (item[1][1] is None, item[1][1], item[0]),
+            ):
+                yield _row(
+                    day, p_id, p_name, task_id, title, seconds, rates.get(p_id, 0.0)
+                )
+
+    for entry_start, entry_end, task_id, title, p_id, p_name in db.execute(query):
+        entry_start = max(entry_start, range_start)
+        entry_end = min(entry_end or now, range_end)
+        # Интервалы идут по start_time: более ранние дни уже не пополнятся
+        yield from flush(entry_start.date())
+        for day, seconds in crud._split_by_day(entry_start, entry_end):
+            tasks = pending.setdefault(day, {})
+            item = tasks.setdefault(task_id, [0.0, p_id, p_name, title])
+            item[0] += seconds
+    yield from flush(date.max)
+    for day in sorted(rollups):
+        yield from rollups[day]
+
+
+def project_day_rows(
+    db: Session, user_id: int, start: date, end: date, project_id: int = None
+):
+    """Время по (день, проект) за [start, end] из time_rollups."""
+    rates = _user_rates(db, user_id)
+    query = (
+        select(
+            models.TimeRollup.day,
+            models.TimeRollup.project_id,
+            models.Project.name,
+            func.sum(models.TimeRollup.seconds),
+        )
+        .outerjoin(models.Project, models.Project.id == models.TimeRollup.project_id)
+        .where(
+            models.TimeRollup.user_id == user_id,
+            models.TimeRollup.day >= start,
+            models.TimeRollup.day <= end,
+        )
+        .group_by(
+            models.TimeRollup.day, models.TimeRollup.project_id, models.Project.name
+        )
+        .order_by(models.TimeRollup.day, models.TimeRollup.project_id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if project_id is not None:
+        query = query.where(models.TimeRollup.project_id == project_id)
+    for day, p_id, p_name, seconds in db.execute(query):
+        # Отрицательные и нулевые после округления суммы (остатки старых
+        # правок задним числом) в отчёт не идут
+        if seconds is not None and round(seconds, 3) > 0:
+            yield _row(day, p_id, p_name, None, None, seconds, rates.get(p_id, 0.0))
+
+
+ROW_SOURCES = {"task": task_day_rows, "project": project_day_rows}
+
+
+def report_rows(
+    user_id: int, start: date, end: date, project_id: int = None, detail="task"
+):
+    """Строки отчёта в своей сессии: ответ стримится после выхода из эндпоинта."""
+    with SessionLocal() as db:
+        yield from ROW_SOURCES[detail](db, user_id, start, end, project_id)
+
+
+# ------------------------------------------------------------
+# Форматы
+# ------------------------------------------------------------
+def _text_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _batched_text(lines):
+    """Склеить строки в куски ~CHUNK_SIZE, чтобы не отправлять по строке."""
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def iter_csv(rows):
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+        out.write("\ufeff")
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(_text_value(value) for value in row)
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+        yield out.getvalue()
+
+    return _batched_text(lines())
+
+
+def iter_ndjson(rows):
+    return _batched_text(
+        json.dumps(dict(zip(COLUMNS, map(_text_value, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    text = escape(str(_text_value(value)))
+    return f'<c t="inlineStr"><is><t>{text}</t></is></c>'
+
+
+def _xlsx_row(values) -> bytes:
+    return ("<row>" + "".join(map(_xlsx_cell, values)) + "</row>").encode()
+
+
+def iter_xlsx(rows):
+    """Минимальный XLSX (один лист, inline-строки) без сторонних библиотек."""
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES) as spool:
+        with zipfile.ZipFile(spool, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+            archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+            archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK)
+            archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+            with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+                sheet.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                    b'spreadsheetml/2006/main"><sheetData>'
+                )
+                sheet.write(_xlsx_row(COLUMNS))
+                for row in rows:
+                    sheet.write(_xlsx_row(row))
+                sheet.write(b"</sheetData></worksheet>")
+        spool.seek(0)
+        while chunk := spool.read(CHUNK_SIZE):
+            yield chunk
+
+
+# Формат -> (media type, расширение файла, генератор тела)
+FORMATS = {
+    "csv": ("text/csv", "csv", iter_csv),
+    "ndjson": ("application/x-ndjson", "ndjson", iter_ndjson),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+        iter_xlsx,
+    ),
+}
@@ -0,0 +1,49 @@
+"""Быстрый JSON-ответ для больших списков.
+
+Обычный путь FastAPI для response_model — валидация каждого ORM-объекта
+схемой, jsonable_encoder и json.dumps. Списки задач с FAST_JSON=true вместо
+этого отдают словари из crud.get_task_dicts (уже в форме схемы) и кодируют
+их orjson; без orjson — stdlib json с тем же выводом. Сравнение путей:
+python -m benchmarks.serialization.
+"""
+
+import json
+import os
+from datetime import date
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() == "true"
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def list_response(response: Response, content) -> FastJSONResponse:
+    """Ответ с заголовками, уже выставленными в response (ETag, X-Next-Cursor)."""
+    fast = FastJSONResponse(content)
+    fast.raw_headers.extend(response.raw_headers)
+    return fast
@@ -0,0 +1,418 @@
+"""Импорт проектов, задач, подзадач и времени из CSV или NDJSON.
+
+Каждая строка — одна сущность, вид задаёт поле type: project, task,
+sub_task или time. Строки ссылаются друг на друга через ref: задача — на
+проект (project=<ref>) или на уже существующий проект (project_id),
+подзадача и интервал времени — на задачу (task=<ref>). Родитель должен
+идти в файле раньше детей.
+
+Файл читается и проверяется построчно, прошедшие проверку строки копятся в
+буферах и вставляются пачками по IMPORT_BATCH_SIZE: проекты и задачи через
+add_all (им нужны id для ссылок), подзадачи и интервалы — executemany.
+Каждая пачка — своя транзакция, и ошибка БД откатывает только её строки;
+с atomic всё идёт одной транзакцией и откатывается при любой ошибке.
+
+Время задачи — total_time (учитывается в time_rollups днём завершения или
+создания задачи) плюс её интервалы time, которые добавляются к total_time
+и раскладываются по дням, как закрытые интервалы таймера.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+MAX_IMPORT_ERRORS = 1000
+
+ROW_SCHEMAS = {
+    "project": schemas.ImportProject,
+    "task": schemas.ImportTask,
+    "sub_task": schemas.ImportSubTask,
+    "time": schemas.ImportTimeEntry,
+}
+
+
+# ------------------------------------------------------------
+# Чтение файла
+# ------------------------------------------------------------
+def read_csv(stream):
+    """(номер строки, dict) для каждой строки CSV; пустые ячейки отбрасываются."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    for row in reader:
+        values = {
+            key.strip(): value
+            for key, value in row.items()
+            if key is not None and value not in (None, "")
+        }
+        if values:
+            yield reader.line_num, values
+
+
+def read_ndjson(stream):
+    """(номер строки, dict или сообщение об ошибке) для каждой строки NDJSON."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, row
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def detect_format(filename: str = None, content_type: str = None):
+    """Формат по расширению файла или content type; None — не распознан."""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ("csv", "ndjson", "jsonl"):
+        return "csv" if extension == "csv" else "ndjson"
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type == "text/csv":
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        (
+            f"{'.'.join(map(str, item['loc']))}: {item['msg']}"
+            if item["loc"]
+            else item["msg"]
+        )
+        for item in error.errors()
+    )
+
+
+# ------------------------------------------------------------
+# Импорт
+# ------------------------------------------------------------
+class Importer:
+    """Состояние одного импорта: ссылки ref -> id, буферы и отчёт."""
+
+    def __init__(self, db: Session, user: models.User, atomic: bool = False):
+        self.db = db
+        self.user = user
+        self.atomic = atomic
+        self.failed = False
+        self.created = {"projects": 0, "tasks": 0, "sub_tasks": 0, "time_entries": 0}
+        self.errors = []
+        self.error_count = 0
+        self.owned_projects = set(
+            db.scalars(
+                select(models.Project.id).where(models.Project.owner_id == user.id)
+            )
+        )
+        # ref -> id вставленных строк и ref -> строка ещё в буфере
+        self.project_ids, self.task_ids = {}, {}
+        self.task_projects = {}  # id задачи -> project_id
+        self.pending_projects, self.pending_tasks = {}, {}
+        self.sub_tasks, self.intervals = [], []
+
+    # -- отчёт ----------------------------------------------------
+    def error(self, line: int, message: str):
+        self.error_count += 1
+        # atomic-импорт уже не будет зафиксирован — дальше строки только проверяются
+        self.failed = self.atomic
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def result(self) -> dict:
+        committed = not (self.atomic and self.error_count)
+        return {
+            "committed": committed,
+            "created": (self.created if committed else dict.fromkeys(self.created, 0)),
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+    # -- проверка строк ---------------------------------------------
+    def _known_project(self, ref: str) -> bool:
+        return ref in self.project_ids or ref in self.pending_projects
+
+    def _known_task(self, ref: str) -> bool:
+        return ref in self.task_ids or ref in self.pending_tasks
+
+    def add(self, line: int, row: dict):
+        kind = row.pop("type", None)
+        # Не строка (например, список) — не ключ словаря, in дал бы TypeError
+        if not isinstance(kind, str) or kind not in ROW_SCHEMAS:
+            self.error(line, f"Unknown row type: {kind!r}")
+            return
+        try:
+            item = ROW_SCHEMAS[kind].model_validate(row)
+        except ValidationError as e:
+            self.error(line, _validation_message(e))
+            return
+        for field, value in item:
+            if isinstance(value, datetime) and value.tzinfo is not None:
+                # В БД время хранится без зоны, в локальном времени сервера
+                setattr(item, field, value.astimezone().replace(tzinfo=None))
+        problem = getattr(self, f"_check_{kind}")(item)
+        if problem:
+            self.error(line, problem)
+            return
+
+        if kind == "project":
+            self.pending_projects[item.ref or line] = (line, item)
+        elif kind == "task":
+            self.pending_tasks[item.ref or line] = (line, item)
+        elif kind == "sub_task":
+            self.sub_tasks.append((line, item))
+        else:
+            self.intervals.append((line, item))
+        if self.buffered() >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def _check_project(self, item: schemas.ImportProject):
+        if item.ref is not None and self._known_project(item.ref):
+            return f"Duplicate project ref: {item.ref}"
+        if item.hourly_rate is not None and item.hourly_rate < 0:
+            return "hourly_rate must be >= 0"
+
+    def _check_task(self, item: schemas.ImportTask):
+        if item.ref is not None and self._known_task(item.ref):
+            return f"Duplicate task ref: {item.ref}"
+        if item.project is not None and item.project_id is not None:
+            return "Use either project or project_id"
+        if item.project is not None and not self._known_project(item.project):
+            return f"Unknown project ref: {item.project}"
+        if item.project_id is not None and item.project_id not in self.owned_projects:
+            return "Project not found"
+        if item.total_time < 0:
+            return "total_time must be >= 0"
+
+    def _check_sub_task(self, item: schemas.ImportSubTask):
+        if not self._known_task(item.task):
+            return f"Unknown task ref: {item.task}"
+
+    def _check_time(self, item: schemas.ImportTimeEntry):
+        if not self._known_task(item.task):
+            return f"Unknown task ref: {item.task}"
+        if item.end <= item.start:
+            return "end must be after start"
+
+    # -- запись пачки -----------------------------------------------
+    def buffered(self) -> int:
+        return (
+            len(self.pending_projects)
+            + len(self.pending_tasks)
+            + len(self.sub_tasks)
+            + len(self.intervals)
+        )
+
+    def flush(self):
+        """Вставить буферы: проекты, задачи, подзадачи, интервалы."""
+        if not self.buffered():
+            return
+        batch = (
+            self.pending_projects,
+            self.pending_tasks,
+            self.sub_tasks,
+            self.intervals,
+        )
+        self.pending_projects, self.pending_tasks = {}, {}
+        self.sub_tasks, self.intervals = [], []
+        if self.failed:
+            return
+
+        project_ids, task_ids = dict(self.project_ids), dict(self.task_ids)
+        task_projects = dict(self.task_projects)
+        created = dict(self.created)
+        try:
+            self._insert(*batch)
+            crud.bump_data_version(self.db, self.user.id)
+            if self.atomic:
+                self.db.flush()
+            else:
+                self.db.commit()
+        except SQLAlchemyError as e:
+            logger.warning("Import batch failed: %s", e)
+            self.db.rollback()
+            self.project_ids, self.task_ids, self.created = (
+                project_ids,
+                task_ids,
+                created,
+            )
+            self.task_projects = task_projects
+            projects, tasks, sub_tasks, intervals = batch
+            lines = [line for line, _ in (*projects.values(), *tasks.values())]
+            lines += [line for line, _ in (*sub_tasks, *intervals)]
+            for line in sorted(lines):
+                self.error(line, "Database error, row not imported")
+
+    def _insert(self, projects: dict, tasks: dict, sub_tasks: list, intervals: list):
+        db, user_id = self.db, self.user.id
+
+        default_rate = self.user.default_hourly_rate or 0.0
+        db_projects = {
+            ref: models.Project(
+                name=item.name,
+                owner_id=user_id,
+                hourly_rate=(
+                    item.hourly_rate if item.hourly_rate is not None else default_rate
+                ),
+            )
+            for ref, (_, item) in projects.items()
+        }
+        db.add_all(db_projects.values())
+        db.flush()
+        for ref, project in db_projects.items():
+            self.project_ids[ref] = project.id
+        self.created["projects"] += len(db_projects)
+
+        now = datetime.now()
+        db_tasks = {}
+        for ref, (_, item) in tasks.items():
+            completed_at = item.completed_at
+            if item.is_completed and completed_at is None:
+                completed_at = item.created_at or now
+            db_tasks[ref] = models.Task(
+                title=item.title,
+                project_id=(
+                    self.project_ids[item.project]
+                    if item.project is not None
+                    else item.project_id
+                ),
+                owner_id=user_id,
+                total_time=item.total_time,
+                is_timer_running=False,
+                priority=item.priority or 1,
+                due_date=item.due_date,
+                is_completed=item.is_completed,
+                created_at=item.created_at or now,
+                completed_at=completed_at if item.is_completed else None,
+            )
+        db.add_all(db_tasks.values())
+        db.flush()
+        for ref, task in db_tasks.items():
+            self.task_ids[ref] = task.id
+            self.task_projects[task.id] = task.project_id
+        self.created["tasks"] += len(db_tasks)
+        self._record_task_totals(db_tasks.values())
+
+        if sub_tasks:
+            db.execute(
+                insert(models.SubTask),
+                [
+                    {
+                        "title": item.title,
+                        "task_id": self.task_ids[item.task],
+                        "is_completed": item.is_completed,
+                        "completed_at": now if item.is_completed else None,
+                    }
+                    for _, item in sub_tasks
+                ],
+            )
+            self.created["sub_tasks"] += len(sub_tasks)
+
+        if intervals:
+            self._insert_intervals([item for _, item in intervals])
+
+    def _record_task_totals(self, tasks):
+        """total_time импортированных задач — в time_rollups по дню задачи."""
+        tasks = [task for task in tasks if task.total_time]
+        rates = crud._effective_rates(self.db, [task.project_id for task in tasks])
+        totals = defaultdict(float)
+        for task in tasks:
+            day = (task.completed_at or task.created_at).date()
+            totals[(task.project_id, day)] += task.total_time
+        for (project_id, day), seconds in totals.items():
+            crud._add_to_rollup(
+                self.db,
+                self.user.id,
+                project_id,
+                day,
+                seconds,
+                rates.get(project_id, 0.0),
+            )
+
+    def _insert_intervals(self, items: list):
+        user_id = self.user.id
+        self.db.execute(
+            insert(models.TimeEntry),
+            [
+                {
+                    "task_id": self.task_ids[item.task],
+                    "owner_id": user_id,
+                    "start_time": item.start,
+                    "end_time": item.end,
+                }
+                for item in items
+            ],
+        )
+        seconds = defaultdict(float)
+        for item in items:
+            seconds[self.task_ids[item.task]] += (item.end - item.start).total_seconds()
+        tasks = models.Task.__table__
+        self.db.execute(
+            update(tasks)
+            .where(tasks.c.id == bindparam("b_id"))
+            .values(
+                total_time=func.coalesce(tasks.c.total_time, 0.0)
+                + bindparam("b_seconds")
+            ),
+            [
+                {"b_id": task_id, "b_seconds": total}
+                for task_id, total in seconds.items()
+            ],
+        )
+        crud.record_intervals(
+            self.db,
+            [
+                (
+                    user_id,
+                    self.task_projects[self.task_ids[item.task]],
+                    item.start,
+                    item.end,
+                )
+                for item in items
+            ],
+        )
+        self.created["time_entries"] += len(items)
+
+
+def import_file(
+    db: Session, user: models.User, stream, format: str, atomic: bool = False
+) -> dict:
+    """Импортировать файл; отчёт — созданные сущности и ошибки по строкам."""
+    importer = Importer(db, user, atomic=atomic)
+    rows = READERS[format](stream)
+    try:
+        for line, row in rows:
+            if isinstance(row, str):
+                importer.error(line, row)
+            else:
+                importer.add(line, row)
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Дальше файл не читается; уже принятые строки импортируются
+        importer.error(0, f"Unreadable file: {e}")
+    importer.flush()
+    if atomic:
+        if importer.error_count:
+            db.rollback()
+        else:
+            db.commit()
+    return importer.result()
@@ -1,22 +1,87 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import hashlib
+import logging
+import os
+
+import anyio
+
+from fastapi import (
+    FastAPI,
+    Depends,
+    File,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from jose import jwt
+from datetime import date, datetime, timedelta
 from contextlib import asynccontextmanager
 
-from app.auth import verify_password
-from . import crud, models, schemas
-from .database import SessionLocal, engine
+from app.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    get_password_hash_async,
+    needs_rehash,
+    verify_password_async,
+)
+from . import (
+    crud,
+    crud_async,
+    earnings,
+    export,
+    fast_json,
+    importer,
+    models,
+    pagination,
+    schemas,
+    search,
+    timer_registry,
+)
+from . import scheduler as jobs
+from .database import SessionLocal, async_engine, engine, get_async_db, get_db
+from .deps import (
+    get_current_user,
+    get_current_user_async,
+    get_owned_project,
+    get_owned_sub_task,
+    get_owned_sub_task_comment,
+    get_owned_task,
+    get_owned_task_comment,
+    owned_project,
+)
+from .events import broker
+from .metrics import MetricsMiddleware, install_sql_hooks, render_metrics
 
 # Создаём таблицы
 models.Base.metadata.create_all(bind=engine)
+search.install(engine)
+
+install_sql_hooks(engine, async_engine.sync_engine)
+
+logger = logging.getLogger(__name__)
 
-SECRET_KEY = "simple-secret-key-for-development-change-in-production"
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 24 * 60  # 24 часа
 
+STREAM_KEEPALIVE_SECONDS = 15
+# Как часто стримы сверяют data_version подписчиков с БД: изменения из других
+# воркеров и отдельного планировщика до этого процесса иначе не доходят. 0 — выкл.
+STREAM_SYNC_SECONDS = float(os.getenv("STREAM_SYNC_SECONDS", "5"))
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+MAX_STATS_DAYS = 10 * 366
+MAX_SEARCH_LIMIT = 100
+
+# Потоки для sync-эндпоинтов (по умолчанию в Starlette 40)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
 scheduler = None
 
 
@@ -28,67 +93,196 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-def get_db():
-    db = SessionLocal()
+def decode_page_cursor(cursor: Optional[str], sort: str, keys: list):
+    """Разобрать курсор из query-параметра; 400, если он не подходит."""
+    if cursor is None:
+        return None
     try:
-        yield db
-    finally:
-        db.close()
+        return pagination.decode_cursor(cursor, sort, keys)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def set_next_cursor(response: Response, sort: str, keys: list, items, limit):
+    if limit is None:
+        return
+    cursor = pagination.next_cursor(sort, keys, items, limit)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = cursor
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def check_not_modified(request: Request, response: Response, user_id: int, state):
+    """ETag по версии данных пользователя; 304, если у клиента та же версия.
+
+    Пока идёт таймер, ответы меняются каждую секунду — ETag не выдаётся.
+    В ключ входит дата (сегодняшний день в статистике) и URL с параметрами.
+    """
+    response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+    if state is None:
+        return
+    data_version, timer_running = state
+    if timer_running:
+        return
+    key = f"{user_id}:{data_version}:{date.today()}:{request.url.path}?{request.url.query}"
+    etag = '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL},
+        )
+    response.headers["ETag"] = etag
 
 
-def get_current_user(
-    token: str = Depends(schemas.oauth2_scheme), db: Session = Depends(get_db)
+def conditional_get(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
 ):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+    timer_registry.sync(current_user.id)
+    state = crud.get_data_version(db, current_user.id)
+    # Эндпоинт может взять версию отсюда, а не запрашивать её ещё раз
+    request.state.data_version = state
+    check_not_modified(request, response, current_user.id, state)
+
+
+async def conditional_get_async(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+):
+    if timer_registry.has_pending(current_user.id):
+        await run_in_threadpool(timer_registry.sync, current_user.id)
+    state = await crud_async.get_data_version(db, current_user.id)
+    check_not_modified(request, response, current_user.id, state)
+
+
+def timers_synced(current_user: models.User = Depends(get_current_user)):
+    """Для эндпоинтов, читающих время из БД: сначала записать переходы из реестра."""
+    timer_registry.sync(current_user.id)
+
+
+def live_daily_session(session):
+    """Копия сессии с учётом текущего времени, если таймер запущен."""
+    if session and session.is_timer_running and session.last_start_time:
+        elapsed = (datetime.now() - session.last_start_time).total_seconds()
+        # Создадим копию, чтобы не менять объект БД
+        session_copy = schemas.DailyWorkSession.model_validate(session)
+        session_copy.total_time = session.total_time + elapsed
+        return session_copy
+    return session
+
+
+def build_timer_state(db: Session, user_id: int) -> schemas.TimerState:
+    now = datetime.now()
+    running_tasks = []
+    for task in crud.get_running_tasks(db, user_id):
+        running = schemas.RunningTask.model_validate(task)
+        if task.last_start_time:
+            running.total_time = (task.total_time or 0) + (
+                now - task.last_start_time
+            ).total_seconds()
+        running_tasks.append(running)
+    return schemas.TimerState(
+        daily_session=live_daily_session(crud.get_today_daily_session(db, user_id)),
+        running_tasks=running_tasks,
+        server_time=now,
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
-    user = crud.get_user_by_username(db, username=username)
-    if user is None:
-        raise credentials_exception
-    return user
+
+def publish_timer_state(db: Session, user_id: int):
+    """Отправить подписчикам /daily/stream актуальное состояние таймеров."""
+    if broker.has_subscribers(user_id):
+        broker.publish(user_id, build_timer_state(db, user_id).model_dump_json())
+
+
+def publish_timer_states(user_ids):
+    """publish_timer_state для пользователей, чьи таймеры записал реестр."""
+    user_ids = [user_id for user_id in user_ids if broker.has_subscribers(user_id)]
+    if user_ids:
+        with SessionLocal() as db:
+            for user_id in user_ids:
+                publish_timer_state(db, user_id)
 
 
-def auto_pause_old_timers():
+def sync_timer_streams(versions: dict):
+    """Разослать состояние подписчикам, чья data_version сменилась с прошлой сверки.
+
+    versions — последняя увиденная версия по пользователю. Новому подписчику
+    состояние отправляется один раз: изменение могло прийти между его
+    подключением и сверкой.
+    """
+    user_ids = broker.subscribed_user_ids()
+    for user_id in versions.keys() - set(user_ids):
+        del versions[user_id]
+    if not user_ids:
+        return
     with SessionLocal() as db:
+        rows = db.execute(
+            select(models.User.id, models.User.data_version).where(
+                models.User.id.in_(user_ids)
+            )
+        ).all()
+        for user_id, version in rows:
+            if versions.get(user_id) != version:
+                versions[user_id] = version
+                publish_timer_state(db, user_id)
+
+
+async def run_stream_sync():
+    versions = {}
+    while True:
+        await asyncio.sleep(STREAM_SYNC_SECONDS)
         try:
-            paused_count = crud.auto_pause_old_timers(db)
-            if paused_count > 0:
-                print(f"Автоматически остановлено {paused_count} старых таймеров")
-        except Exception as e:
-            print(f"Ошибка при автоматической остановке таймеров: {e}")
+            await run_in_threadpool(sync_timer_streams, versions)
+        except Exception:
+            logger.exception("Timer stream sync failed")
+
+
+def timers_auto_paused(db: Session, user_id: int):
+    if timer_registry.registry is not None:
+        timer_registry.registry.forget(user_id)
+    publish_timer_state(db, user_id)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Запуск приложения...")
-    from apscheduler.schedulers.background import BackgroundScheduler
-    from apscheduler.triggers.interval import IntervalTrigger
-
+    broker.bind_loop(asyncio.get_running_loop())
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    if timer_registry.start(SessionLocal, on_flushed=publish_timer_states):
+        print("Реестр таймеров запущен")
     global scheduler
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(
-        auto_pause_old_timers,
-        trigger=IntervalTrigger(minutes=30),
-        id="auto_pause_timers",
-        replace_existing=True,
-    )
-    scheduler.start()
-    print("Планировщик запущен")
+    if jobs.SCHEDULER_ENABLED:
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        # Задачи берут аренду в БД, так что воркеров может быть несколько
+        scheduler = jobs.add_jobs(
+            BackgroundScheduler(), on_timers_paused=timers_auto_paused
+        )
+        scheduler.start()
+        print("Планировщик запущен")
+    stream_sync = None
+    if STREAM_SYNC_SECONDS > 0:
+        stream_sync = asyncio.create_task(run_stream_sync())
     yield
     print("Остановка приложения...")
+    if stream_sync is not None:
+        stream_sync.cancel()
     if scheduler and scheduler.running:
         scheduler.shutdown()
         print("Планировщик остановлен")
+    # Очередь реестра записывается в БД до выхода
+    timer_registry.stop()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -103,30 +297,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "ETag",
+        "X-Next-Cursor",
+        "X-Query-Count",
+        "Server-Timing",
+        "Content-Disposition",
+    ],
 )
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(timer_registry.TimerSyncTimeout)
+async def timer_sync_timeout_handler(request: Request, exc):
+    # Переходы таймеров приняты, но БД пока не отвечает — клиент повторит
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Timer state is not saved yet"},
+        headers={"Retry-After": "1"},
+    )
 
 
 # ------------------------------------------------------------
 # Auth
 # ------------------------------------------------------------
 @app.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_async.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    password_hash = await get_password_hash_async(user.password)
+    return await crud_async.create_user(db, user=user, password_hash=password_hash)
 
 
 @app.post("/login")
-def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, username=login_data.username)
-    if not user or not verify_password(login_data.password, user.password):
+async def login(
+    login_data: schemas.LoginRequest, db: AsyncSession = Depends(get_async_db)
+):
+    user = await crud_async.get_user_by_username(db, username=login_data.username)
+    if not user or not await verify_password_async(login_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.username})
+    if needs_rehash(user.password):
+        # Пароль открытым текстом или хеш с прежней стоимостью
+        user.password = await get_password_hash_async(login_data.password)
+        await db.commit()
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -134,7 +353,12 @@ def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
 # Users
 # ------------------------------------------------------------
 @app.get("/users/me", response_model=schemas.User)
-def read_current_user(current_user: models.User = Depends(get_current_user)):
+async def read_current_user(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+):
+    # Ставки нет в кэше пользователей: дочитываем её без ленивой загрузки
+    await db.refresh(current_user, ["default_hourly_rate"])
     return current_user
 
 
@@ -145,6 +369,7 @@ def update_default_rate(
     current_user: models.User = Depends(get_current_user),
 ):
     current_user.default_hourly_rate = rate_data.default_hourly_rate
+    crud.bump_data_version(db, current_user.id)
     db.commit()
     return {
         "message": "Rate updated",
@@ -164,48 +389,49 @@ def create_project(
     return crud.create_project(db=db, project=project, owner_id=current_user.id)
 
 
-@app.get("/projects/", response_model=List[schemas.Project])
+@app.get(
+    "/projects/",
+    response_model=List[schemas.Project],
+    dependencies=[Depends(conditional_get)],
+)
 def read_projects(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.get_projects_by_owner(
-        db=db, owner_id=current_user.id, skip=skip, limit=limit
+    """Проекты по id. Следующая страница — по курсору из X-Next-Cursor."""
+    keys = pagination.id_keys(models.Project)
+    after = decode_page_cursor(cursor, "id", keys)
+    projects = crud.get_projects_by_owner(
+        db=db,
+        owner_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        after_id=after[0] if after else None,
     )
+    set_next_cursor(response, "id", keys, projects, limit)
+    return projects
 
 
 @app.put("/projects/{project_id}", response_model=schemas.Project)
 def update_project(
-    project_id: int,
     project_update: schemas.ProjectUpdate,
+    project: models.Project = Depends(get_owned_project),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project or project.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Project not found")
-    updated_project = crud.update_project(
-        db=db, project_id=project_id, project_update=project_update
-    )
-    if not updated_project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return updated_project
+    return crud.update_project(db=db, db_project=project, project_update=project_update)
 
 
 @app.delete("/projects/{project_id}")
 def delete_project(
-    project_id: int,
+    project: models.Project = Depends(get_owned_project),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project or project.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Project not found")
-    success = crud.delete_project(db, project_id=project_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Project not found")
+    with timer_registry.bypass(project.owner_id):
+        crud.delete_project(db, db_project=project)
     return {"message": "Project deleted"}
 
 
@@ -219,80 +445,112 @@ def create_task(
     current_user: models.User = Depends(get_current_user),
 ):
     if task.project_id is not None:
-        project = (
-            db.query(models.Project)
-            .filter(models.Project.id == task.project_id)
-            .first()
-        )
-        if not project or project.owner_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Project not found")
+        owned_project(db, task.project_id, current_user.id)
     return crud.create_task(db=db, task=task, user_id=current_user.id)
 
 
-@app.get("/tasks/", response_model=List[schemas.Task])
+def task_list_response(
+    response: Response,
+    db: Session,
+    current_user: models.User,
+    skip: int,
+    limit: int,
+    sort: schemas.TaskSort,
+    after: Optional[list],
+):
+    """Страница задач в форме schemas.Task без ORM-объектов и валидации."""
+    tasks = crud.get_task_dicts(
+        db=db,
+        owner_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        sort=sort.value,
+        after=after,
+    )
+    set_next_cursor(
+        response, sort.value, pagination.TASK_SORTS[sort.value], tasks, limit
+    )
+    return fast_json.list_response(response, tasks)
+
+
+@app.get(
+    "/tasks/",
+    response_model=List[schemas.Task],
+    dependencies=[Depends(conditional_get)],
+)
 def read_tasks(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: schemas.TaskSort = schemas.TaskSort.id,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.get_tasks_by_owner(
-        db=db, owner_id=current_user.id, skip=skip, limit=limit
+    keys = pagination.TASK_SORTS[sort.value]
+    after = decode_page_cursor(cursor, sort.value, keys)
+    if fast_json.FAST_JSON:
+        return task_list_response(response, db, current_user, skip, limit, sort, after)
+    tasks = crud.get_tasks_by_owner(
+        db=db,
+        owner_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        sort=sort.value,
+        after=after,
     )
+    set_next_cursor(response, sort.value, keys, tasks, limit)
+    return tasks
 
 
 @app.put("/tasks/{task_id}", response_model=schemas.Task)
 def update_task(
-    task_id: int,
     task_update: schemas.TaskUpdate,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
     if task_update.project_id and task_update.project_id != task.project_id:
-        new_project = (
-            db.query(models.Project)
-            .filter(models.Project.id == task_update.project_id)
-            .first()
-        )
-        if not new_project or new_project.owner_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Project not found")
-    updated_task = crud.update_task(db=db, task_id=task_id, task_update=task_update)
-    if not updated_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return updated_task
+        owned_project(db, task_update.project_id, task.owner_id)
+    return crud.update_task(db=db, db_task=task, task_update=task_update)
 
 
 @app.delete("/tasks/{task_id}")
 def delete_task(
-    task_id: int,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    success = crud.delete_task(db, task_id=task_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Task not found")
+    with timer_registry.bypass(task.owner_id):
+        crud.delete_task(db, db_task=task)
     return {"message": "Task deleted"}
 
 
-@app.get("/tasks-with-details/", response_model=List[schemas.Task])
+@app.get(
+    "/tasks-with-details/",
+    response_model=List[schemas.Task],
+    dependencies=[Depends(conditional_get)],
+)
 def read_tasks_with_details(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: schemas.TaskSort = schemas.TaskSort.id,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    tasks = crud.get_tasks_by_owner(
-        db=db, owner_id=current_user.id, skip=skip, limit=limit
+    keys = pagination.TASK_SORTS[sort.value]
+    after = decode_page_cursor(cursor, sort.value, keys)
+    if fast_json.FAST_JSON:
+        return task_list_response(response, db, current_user, skip, limit, sort, after)
+    tasks = crud.get_tasks_with_details(
+        db=db,
+        owner_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        sort=sort.value,
+        after=after,
     )
-    for task in tasks:
-        task.comments = crud.get_task_comments(db=db, task_id=task.id)
-        task.sub_tasks = crud.get_sub_tasks(db=db, task_id=task.id)
+    set_next_cursor(response, sort.value, keys, tasks, limit)
     return tasks
 
 
@@ -302,57 +560,50 @@ def read_tasks_with_details(
 @app.post("/timer/start/{task_id}")
 def start_timer(
     task_id: int,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    crud.start_timer(db=db, task_id=task_id)
-    crud.start_daily_timer(db, current_user.id)
-    daily_session = crud.get_today_daily_session(db, current_user.id)
-    if daily_session:
-        if daily_session.is_timer_running and daily_session.last_start_time:
-            elapsed = (datetime.now() - daily_session.last_start_time).total_seconds()
-            daily_session.total_time += elapsed
+    if timer_registry.registry is not None:
+        daily_session = timer_registry.registry.start_task(current_user.id, task.id)
+        return {
+            "message": "Timer started",
+            "task_id": task_id,
+            "daily_session": daily_session,
+        }
+    # После commit объект пользователя истекает — id берём заранее
+    user_id = current_user.id
+    daily_session = crud.start_timer(db=db, task=task)
+    publish_timer_state(db, user_id)
     return {
         "message": "Timer started",
         "task_id": task_id,
-        "daily_session": daily_session,
+        "daily_session": live_daily_session(daily_session),
     }
 
 
 @app.post("/timer/pause/{task_id}")
 def pause_timer(
     task_id: int,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    crud.pause_timer(db=db, task_id=task_id)
-
-    # Проверяем, остались ли ещё запущенные задачи
-    any_running = crud.check_any_task_running(db, current_user.id)
-    if not any_running:
-        crud.pause_daily_timer(db, current_user.id)
-
-    daily_session = crud.get_today_daily_session(db, current_user.id)
-    if (
-        daily_session
-        and daily_session.is_timer_running
-        and daily_session.last_start_time
-    ):
-        elapsed = (datetime.now() - daily_session.last_start_time).total_seconds()
-        daily_session.total_time += elapsed
-
+    if timer_registry.registry is not None:
+        daily_session = timer_registry.registry.pause_task(current_user.id, task.id)
+        return {
+            "message": "Timer paused",
+            "task_id": task_id,
+            "daily_session": daily_session,
+        }
+    user_id = current_user.id
+    # Ежедневный таймер останавливается, если запущенных задач не осталось
+    daily_session = crud.pause_timer(db=db, task=task)
+    publish_timer_state(db, user_id)
     return {
         "message": "Timer paused",
         "task_id": task_id,
-        "daily_session": daily_session,
+        "daily_session": live_daily_session(daily_session),
     }
 
 
@@ -361,23 +612,77 @@ def stop_all_timers(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    active_tasks = (
-        db.query(models.Task)
-        .filter(
-            models.Task.owner_id == current_user.id,
-            models.Task.is_timer_running == True,
+    with timer_registry.bypass(current_user.id):
+        result = crud.apply_timer_batch(db, current_user.id, pause_others=True)
+    publish_timer_state(db, current_user.id)
+
+    return {"message": f"Остановлено {len(result['paused'])} таймеров"}
+
+
+@app.post("/timer/batch", response_model=schemas.TimerBatchResponse)
+def apply_timer_batch(
+    batch: schemas.TimerBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Несколько операций с таймерами за одну транзакцию.
+
+    Операции применяются по порядку к итоговому набору: start добавляет задачи
+    к запускаемым, pause — к останавливаемым, switch запускает свои задачи и
+    останавливает все остальные.
+    """
+    start_ids, pause_ids, pause_others = set(), set(), False
+    for operation in batch.operations:
+        task_ids = set(operation.task_ids)
+        if operation.action == schemas.TimerAction.start:
+            start_ids |= task_ids
+            pause_ids -= task_ids
+        elif operation.action == schemas.TimerAction.pause:
+            pause_ids |= task_ids
+            start_ids -= task_ids
+        else:
+            start_ids, pause_ids, pause_others = task_ids, set(), True
+
+    task_ids = start_ids | pause_ids
+    owned = db.scalar(
+        select(func.count(models.Task.id)).where(
+            models.Task.id.in_(task_ids), models.Task.owner_id == current_user.id
         )
-        .all()
     )
-    stopped_count = 0
-    for task in active_tasks:
-        if crud.pause_timer(db=db, task_id=task.id):
-            stopped_count += 1
+    if owned != len(task_ids):
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    with timer_registry.bypass(current_user.id):
+        result = crud.apply_timer_batch(
+            db,
+            current_user.id,
+            start_ids=start_ids,
+            pause_ids=pause_ids,
+            pause_others=pause_others,
+        )
+    publish_timer_state(db, current_user.id)
+    result["daily_session"] = live_daily_session(result["daily_session"])
+    return result
 
-    # Останавливаем daily таймер
-    crud.pause_daily_timer(db, current_user.id)
 
-    return {"message": f"Остановлено {stopped_count} таймеров"}
+@app.get(
+    "/time-entries",
+    response_model=List[schemas.TimeEntry],
+    dependencies=[Depends(timers_synced)],
+)
+def read_time_entries(
+    start: datetime,
+    end: Optional[datetime] = None,
+    task_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Интервалы работы таймеров, пересекающиеся с периодом [start, end)."""
+    if end is None:
+        end = datetime.now()
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Invalid time range")
+    return crud.get_time_entries(db, current_user.id, start, end, task_id=task_id)
 
 
 # ------------------------------------------------------------
@@ -385,46 +690,36 @@ def stop_all_timers(
 # ------------------------------------------------------------
 @app.post("/tasks/{task_id}/comments", response_model=schemas.TaskComment)
 def create_task_comment(
-    task_id: int,
     comment: schemas.TaskCommentCreate,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return crud.create_task_comment(db=db, comment=comment, task_id=task_id)
+    return crud.create_task_comment(db=db, comment=comment, task=task)
 
 
 @app.get("/tasks/{task_id}/comments", response_model=List[schemas.TaskComment])
 def get_task_comments(
-    task_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return crud.get_task_comments(db=db, task_id=task_id)
+    keys = pagination.id_keys(models.TaskComment)
+    after = decode_page_cursor(cursor, "id", keys)
+    comments = crud.get_task_comments(
+        db=db, task_id=task.id, limit=limit, after_id=after[0] if after else None
+    )
+    set_next_cursor(response, "id", keys, comments, limit)
+    return comments
 
 
 @app.delete("/comments/{comment_id}")
 def delete_task_comment(
-    comment_id: int,
+    comment: models.TaskComment = Depends(get_owned_task_comment),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    comment = (
-        db.query(models.TaskComment).filter(models.TaskComment.id == comment_id).first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    task = db.query(models.Task).filter(models.Task.id == comment.task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    success = crud.delete_task_comment(db, comment_id=comment_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Comment not found")
+    crud.delete_task_comment(db, db_comment=comment)
     return {"message": "Comment deleted"}
 
 
@@ -433,65 +728,47 @@ def delete_task_comment(
 # ------------------------------------------------------------
 @app.post("/tasks/{task_id}/subtasks", response_model=schemas.SubTask)
 def create_sub_task(
-    task_id: int,
     sub_task: schemas.SubTaskCreate,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return crud.create_sub_task(db=db, sub_task=sub_task, task_id=task_id)
+    return crud.create_sub_task(db=db, sub_task=sub_task, task=task)
 
 
 @app.get("/tasks/{task_id}/subtasks", response_model=List[schemas.SubTask])
 def get_sub_tasks(
-    task_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    task: models.Task = Depends(get_owned_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return crud.get_sub_tasks(db=db, task_id=task_id)
+    keys = pagination.id_keys(models.SubTask)
+    after = decode_page_cursor(cursor, "id", keys)
+    sub_tasks = crud.get_sub_tasks(
+        db=db, task_id=task.id, limit=limit, after_id=after[0] if after else None
+    )
+    set_next_cursor(response, "id", keys, sub_tasks, limit)
+    return sub_tasks
 
 
 @app.put("/subtasks/{sub_task_id}", response_model=schemas.SubTask)
 def update_sub_task(
-    sub_task_id: int,
     sub_task_update: schemas.SubTaskUpdate,
+    sub_task: models.SubTask = Depends(get_owned_sub_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    sub_task = db.query(models.SubTask).filter(models.SubTask.id == sub_task_id).first()
-    if not sub_task:
-        raise HTTPException(status_code=404, detail="Sub task not found")
-    task = db.query(models.Task).filter(models.Task.id == sub_task.task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    updated_sub_task = crud.update_sub_task(
-        db=db, sub_task_id=sub_task_id, sub_task_update=sub_task_update
+    return crud.update_sub_task(
+        db=db, db_sub_task=sub_task, sub_task_update=sub_task_update
     )
-    if not updated_sub_task:
-        raise HTTPException(status_code=404, detail="Sub task not found")
-    return updated_sub_task
 
 
 @app.delete("/subtasks/{sub_task_id}")
 def delete_sub_task(
-    sub_task_id: int,
+    sub_task: models.SubTask = Depends(get_owned_sub_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    sub_task = db.query(models.SubTask).filter(models.SubTask.id == sub_task_id).first()
-    if not sub_task:
-        raise HTTPException(status_code=404, detail="Sub task not found")
-    task = db.query(models.Task).filter(models.Task.id == sub_task.task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    success = crud.delete_sub_task(db, sub_task_id=sub_task_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Sub task not found")
+    crud.delete_sub_task(db, db_sub_task=sub_task)
     return {"message": "Sub task deleted"}
 
 
@@ -500,63 +777,41 @@ def delete_sub_task(
 # ------------------------------------------------------------
 @app.post("/subtasks/{sub_task_id}/comments", response_model=schemas.SubTaskComment)
 def create_sub_task_comment(
-    sub_task_id: int,
     comment: schemas.SubTaskCommentCreate,
+    sub_task: models.SubTask = Depends(get_owned_sub_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    sub_task = db.query(models.SubTask).filter(models.SubTask.id == sub_task_id).first()
-    if not sub_task:
-        raise HTTPException(status_code=404, detail="Sub task not found")
-    task = db.query(models.Task).filter(models.Task.id == sub_task.task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return crud.create_sub_task_comment(db=db, comment=comment, sub_task_id=sub_task_id)
+    return crud.create_sub_task_comment(db=db, comment=comment, sub_task=sub_task)
 
 
 @app.get(
     "/subtasks/{sub_task_id}/comments", response_model=List[schemas.SubTaskComment]
 )
 def get_sub_task_comments(
-    sub_task_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sub_task: models.SubTask = Depends(get_owned_sub_task),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    sub_task = db.query(models.SubTask).filter(models.SubTask.id == sub_task_id).first()
-    if not sub_task:
-        raise HTTPException(status_code=404, detail="Sub task not found")
-    task = db.query(models.Task).filter(models.Task.id == sub_task.task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return crud.get_sub_task_comments(db=db, sub_task_id=sub_task_id)
+    keys = pagination.id_keys(models.SubTaskComment)
+    after = decode_page_cursor(cursor, "id", keys)
+    comments = crud.get_sub_task_comments(
+        db=db,
+        sub_task_id=sub_task.id,
+        limit=limit,
+        after_id=after[0] if after else None,
+    )
+    set_next_cursor(response, "id", keys, comments, limit)
+    return comments
 
 
 @app.delete("/subtask-comments/{comment_id}")
 def delete_sub_task_comment(
-    comment_id: int,
+    comment: models.SubTaskComment = Depends(get_owned_sub_task_comment),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
 ):
-    comment = (
-        db.query(models.SubTaskComment)
-        .filter(models.SubTaskComment.id == comment_id)
-        .first()
-    )
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    sub_task = (
-        db.query(models.SubTask)
-        .filter(models.SubTask.id == comment.sub_task_id)
-        .first()
-    )
-    if not sub_task:
-        raise HTTPException(status_code=404, detail="Sub task not found")
-    task = db.query(models.Task).filter(models.Task.id == sub_task.task_id).first()
-    if not task or task.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Task not found")
-    success = crud.delete_sub_task_comment(db, comment_id=comment_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Comment not found")
+    crud.delete_sub_task_comment(db, db_comment=comment)
     return {"message": "Comment deleted"}
 
 
@@ -564,67 +819,255 @@ def delete_sub_task_comment(
 # Daily Work Session (новые эндпоинты)
 # ------------------------------------------------------------
 @app.get("/daily/current", response_model=Optional[schemas.DailyWorkSession])
-def get_current_daily_session(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+async def get_current_daily_session(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
 ):
     """Получить сегодняшнюю сессию (с текущим временем, если таймер запущен)."""
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    session = (
-        db.query(models.DailyWorkSession)
-        .filter(
-            models.DailyWorkSession.user_id == current_user.id,
-            models.DailyWorkSession.date == today_start,
-        )
-        .first()
+    if timer_registry.registry is not None:
+        loaded, session = timer_registry.registry.peek(current_user.id)
+        if loaded:
+            return session
+    session = await crud_async.get_today_daily_session(db, current_user.id)
+    return live_daily_session(session)
+
+
+def _stream_user_id(token: str) -> int:
+    with SessionLocal() as db:
+        return get_current_user(token=token, db=db).id
+
+
+def _load_timer_state(user_id: int) -> str:
+    timer_registry.sync(user_id)
+    with SessionLocal() as db:
+        return build_timer_state(db, user_id).model_dump_json()
+
+
+@app.get("/daily/stream")
+async def stream_timer_state(request: Request, token: str):
+    """Server-Sent Events: состояние таймеров отправляется только при изменениях.
+
+    EventSource не умеет передавать заголовки, поэтому токен идёт в query.
+    Прошедшее время клиент досчитывает сам по server_time.
+    """
+    # Сессия БД нужна только на время проверки токена, а не на весь стрим
+    user_id = await run_in_threadpool(_stream_user_id, token)
+
+    async def event_stream():
+        queue = broker.subscribe(user_id)
+        try:
+            yield f"data: {await run_in_threadpool(_load_timer_state, user_id)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(
+                        queue.get(), timeout=STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            broker.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    if session and session.is_timer_running and session.last_start_time:
-        # Для ответа добавим текущее время к total_time
-        elapsed = (datetime.now() - session.last_start_time).total_seconds()
-        # Создадим копию, чтобы не менять объект БД
-        session_copy = schemas.DailyWorkSession.model_validate(session)
-        session_copy.total_time = session.total_time + elapsed
-        return session_copy
-    return session
 
 
-@app.get("/daily/stats", response_model=schemas.DailyStatsResponse)
-def get_daily_stats(
+@app.get(
+    "/daily/stats",
+    response_model=schemas.DailyStatsResponse,
+    dependencies=[Depends(conditional_get_async)],
+)
+async def get_daily_stats(
     days: int = 30,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
 ):
     """Получить статистику за последние N дней, сегодняшний день и т.д."""
-    stats = crud.get_daily_stats(db, current_user.id, days)
-    # Отфильтруем только нужные периоды
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    week_start = datetime.now() - timedelta(days=7)
-    week_items = [s for s in stats if s["date"] >= week_start.strftime("%Y-%m-%d")]
-
-    # Выделим сегодня
-    today_item = next(
-        (s for s in stats if s["date"] == today_str),
-        {"date": today_str, "total_seconds": 0.0},
+    if days < 1 or days > MAX_STATS_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid days range")
+    stats = await crud_async.get_daily_stats(db, current_user.id, days)
+    # Массив плотный и заканчивается сегодняшним днём: периоды — это срезы
+    return schemas.DailyStatsResponse(
+        today=stats[-1],
+        week=stats[-8:],  # сегодня и 7 предыдущих дней
+        month=stats[-30:],  # последние 30 дней
     )
 
-    return schemas.DailyStatsResponse(
-        today=today_item, week=week_items, month=stats[-30:]  # последние 30 дней
+
+@app.get(
+    "/daily/stats/range",
+    response_model=schemas.DailyStatsRangeResponse,
+    dependencies=[Depends(conditional_get_async)],
+)
+async def get_daily_stats_range(
+    start: date,
+    end: Optional[date] = None,
+    group: schemas.StatsGroup = schemas.StatsGroup.day,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+):
+    """Статистика за произвольный период с группировкой по дням, неделям или месяцам."""
+    if end is None:
+        end = date.today()
+    if end < start or (end - start).days >= MAX_STATS_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    totals = await crud_async.get_daily_totals(db, current_user.id, start, end)
+    items = [
+        schemas.DailyStatsItem(date=day.strftime("%Y-%m-%d"), total_seconds=total)
+        for day, total in crud.rollup_daily_totals(start, totals, group.value)
+    ]
+    return schemas.DailyStatsRangeResponse(
+        start=start,
+        end=end,
+        group=group,
+        total_seconds=sum(totals),
+        items=items,
+    )
+
+
+# ------------------------------------------------------------
+# Reports
+# ------------------------------------------------------------
+@app.get(
+    "/reports/daily-projects",
+    response_model=List[schemas.RollupItem],
+    dependencies=[Depends(timers_synced)],
+)
+def get_daily_project_report(
+    start: date,
+    end: Optional[date] = None,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Время и заработок по проектам и дням из time_rollups (закрытые интервалы)."""
+    if end is None:
+        end = date.today()
+    if end < start:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    return crud.get_rollups(db, current_user.id, start, end, project_id=project_id)
+
+
+@app.get("/reports/export", dependencies=[Depends(timers_synced)])
+def export_report(
+    start: date,
+    end: Optional[date] = None,
+    project_id: Optional[int] = None,
+    format: schemas.ExportFormat = schemas.ExportFormat.csv,
+    detail: schemas.ExportDetail = schemas.ExportDetail.task,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Выгрузка времени по дням и задачам (detail=task) или проектам (detail=project).
+
+    Тело отдаётся потоком по мере чтения из БД, см. app/export.py.
+    """
+    if end is None:
+        end = date.today()
+    if end < start or (end - start).days >= MAX_STATS_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    if project_id is not None:
+        owned_project(db, project_id, current_user.id)
+    media_type, extension, render = export.FORMATS[format.value]
+    rows = export.report_rows(current_user.id, start, end, project_id, detail.value)
+    filename = f"report_{start.isoformat()}_{end.isoformat()}.{extension}"
+    return StreamingResponse(
+        render(rows),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+# ------------------------------------------------------------
+# Import
+# ------------------------------------------------------------
+@app.post("/import", response_model=schemas.ImportResult)
+def import_data(
+    file: UploadFile = File(...),
+    format: Optional[schemas.ImportFormat] = None,
+    atomic: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Импорт проектов, задач, подзадач и времени из CSV или NDJSON.
+
+    Формат строк — в app/importer.py. Ответ — число созданных сущностей и
+    ошибки по номерам строк; с atomic=true при любой ошибке ничего не пишется.
+    """
+    if format is None:
+        detected = importer.detect_format(file.filename, file.content_type)
+        if detected is None:
+            raise HTTPException(status_code=400, detail="Unknown import format")
+    else:
+        detected = format.value
+    return importer.import_file(db, current_user, file.file, detected, atomic=atomic)
+
+
+# ------------------------------------------------------------
+# Search
+# ------------------------------------------------------------
+@app.get("/search", response_model=List[schemas.SearchResult])
+def search_all(
+    q: str,
+    response: Response,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Поиск по задачам, подзадачам и комментариям (по префиксам слов).
+
+    Результаты по релевантности; следующая страница — по курсору из X-Next-Cursor.
+    """
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        raise HTTPException(status_code=400, detail="Invalid limit")
+    try:
+        results, next_cursor = search.search(
+            db, current_user.id, q, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results
+
+
 # ------------------------------------------------------------
 # Earnings
 # ------------------------------------------------------------
-@app.get("/earnings/summary", response_model=schemas.EarningsSummaryResponse)
+@app.get(
+    "/earnings/summary",
+    response_model=schemas.EarningsSummaryResponse,
+    dependencies=[Depends(conditional_get)],
+)
 def get_earnings_summary(
-    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
 ):
-    summary = crud.get_user_earnings_summary(db, current_user.id)
+    summary = earnings.get_earnings_summary(
+        db, current_user, state=request.state.data_version
+    )
     if not summary:
         raise HTTPException(status_code=404, detail="User not found")
     return summary
 
 
+# ------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """Метрики в текстовом формате Prometheus."""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
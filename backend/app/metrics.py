@@ -0,0 +1,240 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Запросы дольше порога пишутся в лог вместе с параметрами
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# X-Query-Count и Server-Timing в ответах (для отладки N+1 из браузера)
+METRICS_RESPONSE_HEADERS = (
+    os.getenv("METRICS_RESPONSE_HEADERS", "false").lower() == "true"
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", r"\\").replace('"', r"\""))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label_values -> [счётчики по корзинам (+Inf последней), сумма]
+        self._values = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items()
+            )
+        names = self.labels + ("le",)
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(names, label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    labels=("method", "route", "status"),
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed per HTTP request",
+    labels=("route",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_query_seconds = Counter(
+    "db_query_seconds_total",
+    "Time spent in SQL statements",
+    labels=("route",),
+)
+db_slow_queries = Counter(
+    "db_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_MS:g} ms"
+)
+job_duration = Histogram(
+    "scheduler_job_duration_seconds",
+    "Scheduler job run time",
+    labels=("job", "status"),
+    buckets=JOB_BUCKETS,
+)
+
+REGISTRY = (
+    http_request_duration,
+    db_queries_per_request,
+    db_query_seconds,
+    db_slow_queries,
+    job_duration,
+)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Статистика SQL текущего запроса. Sync-эндпоинты получают копию контекста
+# в threadpool, но объект QueryStats тот же
+_query_stats = contextvars.ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc()
+        logger.warning(
+            "Slow query (%.1f ms): %s; parameters: %.1000r",
+            elapsed * 1000,
+            statement,
+            parameters,
+        )
+
+
+def install_sql_hooks(*engines):
+    """Подключить учёт SQL к движкам (для async — к engine.sync_engine)."""
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_job(name: str):
+    started = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        job_duration.observe(time.perf_counter() - started, name, status)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время ответа по маршрутам и SQL на запрос."""
+
+    def __init__(self, app, response_headers: bool = METRICS_RESPONSE_HEADERS):
+        self.app = app
+        self.response_headers = response_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.response_headers:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-count", str(stats.count).encode()))
+                    headers.append(
+                        (
+                            b"server-timing",
+                            f"db;dur={stats.seconds * 1000:.1f};"
+                            f'desc="{stats.count} queries", '
+                            f"app;dur={elapsed_ms:.1f}".encode(),
+                        )
+                    )
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_stats.reset(token)
+            # Шаблон пути, а не сам путь: иначе метрик будет по числу id
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], route, status_code
+            )
+            db_queries_per_request.observe(stats.count, route)
+            db_query_seconds.inc(route, amount=stats.seconds)
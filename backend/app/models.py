@@ -1,8 +1,31 @@
-from sqlalchemy import Integer, String, DateTime, ForeignKey, Boolean, Float, Text
+from sqlalchemy import (
+    Integer,
+    String,
+    Date,
+    DateTime,
+    ForeignKey,
+    Boolean,
+    Float,
+    Text,
+    Index,
+    text,
+)
+from sqlalchemy.dialects import mysql, sqlite
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from .database import Base
 
+# SQLite хранит даты строками, а CURRENT_TIMESTAMP — без долей секунды.
+# Значения из Python (импорт, курсор пагинации) пишутся в том же виде, иначе
+# '...:SS' < '...:SS.000000' и сравнение строк расходится со сравнением дат
+SecondsDateTime = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(truncate_microseconds=True), "sqlite"
+)
+
+# Моменты таймеров с микросекундами и в MySQL (там DATETIME по умолчанию без
+# долей секунды): изменения сравнивают last_start_time с запомненным стартом
+TimerDateTime = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
 
 class User(Base):
     __tablename__ = "users"
@@ -18,6 +41,10 @@ class User(Base):
     default_hourly_rate: Mapped[float] = mapped_column(
         Float, nullable=False, default=0.0
     )
+    # Растёт при каждом изменении данных пользователя (ETag списков)
+    data_version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
     projects: Mapped[list["Project"]] = relationship("Project", back_populates="owner")
     daily_sessions: Mapped[list["DailyWorkSession"]] = relationship(
@@ -34,7 +61,7 @@ class Project(Base):
         DateTime(timezone=True), server_default=func.now()
     )
     owner_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id"), nullable=False
+        Integer, ForeignKey("users.id"), nullable=False, index=True
     )
     hourly_rate: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
 
@@ -47,7 +74,7 @@ class TaskComment(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("tasks.id"))
+    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("tasks.id"), index=True)
     created_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
@@ -60,7 +87,9 @@ class SubTaskComment(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    sub_task_id: Mapped[int] = mapped_column(Integer, ForeignKey("sub_tasks.id"))
+    sub_task_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("sub_tasks.id"), index=True
+    )
     created_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
@@ -73,7 +102,7 @@ class SubTask(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(500), nullable=False)
-    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("tasks.id"))
+    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("tasks.id"), index=True)
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
@@ -90,14 +119,35 @@ class SubTask(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Задачи пользователя и поиск запущенных таймеров
+        Index("ix_tasks_owner_id_is_timer_running", "owner_id", "is_timer_running"),
+        # auto_pause_old_timers
+        Index(
+            "ix_tasks_is_timer_running_last_start_time",
+            "is_timer_running",
+            "last_start_time",
+        ),
+        # Keyset-пагинация списка задач (см. pagination.TASK_SORTS)
+        Index("ix_tasks_owner_id_id", "owner_id", "id"),
+        Index("ix_tasks_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_tasks_owner_id_priority", "owner_id", "priority"),
+        # NULL-сроки в конце: тот же ключ, что в pagination.order_by
+        Index(
+            "ix_tasks_owner_id_due_date_nulls_last",
+            "owner_id",
+            text("(due_date IS NULL)"),
+            "due_date",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     project_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("projects.id"), nullable=True
+        Integer, ForeignKey("projects.id"), nullable=True, index=True
     )
     created_at: Mapped[DateTime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        SecondsDateTime, server_default=func.now()
     )
     owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
 
@@ -112,7 +162,7 @@ class Task(Base):
 
     total_time: Mapped[float] = mapped_column(Float, default=0.0)
     is_timer_running: Mapped[bool] = mapped_column(Boolean, default=False)
-    last_start_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    last_start_time: Mapped[DateTime] = mapped_column(TimerDateTime, nullable=True)
 
     project: Mapped["Project"] = relationship("Project", back_populates="tasks")
     owner: Mapped["User"] = relationship("User")
@@ -127,6 +177,16 @@ class Task(Base):
 
 class DailyWorkSession(Base):
     __tablename__ = "daily_work_sessions"
+    __table_args__ = (
+        # Одна сессия на пользователя в день
+        Index("ix_daily_work_sessions_user_id_date", "user_id", "date", unique=True),
+        # _auto_pause_daily_sessions
+        Index(
+            "ix_daily_work_sessions_is_timer_running_last_start_time",
+            "is_timer_running",
+            "last_start_time",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(
@@ -137,7 +197,7 @@ class DailyWorkSession(Base):
     )  # дата дня (без времени)
     total_time: Mapped[float] = mapped_column(Float, default=0.0)  # секунд
     is_timer_running: Mapped[bool] = mapped_column(Boolean, default=False)
-    last_start_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    last_start_time: Mapped[DateTime] = mapped_column(TimerDateTime, nullable=True)
     created_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
@@ -146,3 +206,70 @@ class DailyWorkSession(Base):
     )
 
     user: Mapped["User"] = relationship("User", back_populates="daily_sessions")
+
+
+class TimeRollup(Base):
+    """Накопленное время и заработок по (пользователь, проект, день).
+
+    Обновляется инкрементально при закрытии интервалов таймера. Строк с одним
+    ключом может оказаться несколько (параллельные вставки), поэтому читать
+    только через SUM.
+    """
+
+    __tablename__ = "time_rollups"
+    __table_args__ = (
+        Index("ix_time_rollups_user_id_day", "user_id", "day", "project_id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    project_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("projects.id"), nullable=True, index=True
+    )
+    day: Mapped[Date] = mapped_column(Date, nullable=False)
+    seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    earnings: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+
+class TimeEntry(Base):
+    """Интервал работы таймера задачи. Строки только добавляются и закрываются.
+
+    Открытый интервал (end_time IS NULL) у задачи не больше одного.
+    """
+
+    __tablename__ = "time_entries"
+    __table_args__ = (
+        Index("ix_time_entries_owner_id_start_time", "owner_id", "start_time"),
+        Index("ix_time_entries_task_id_end_time", "task_id", "end_time"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    task_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tasks.id"), nullable=False
+    )
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    start_time: Mapped[DateTime] = mapped_column(TimerDateTime, nullable=False)
+    end_time: Mapped[DateTime] = mapped_column(TimerDateTime, nullable=True)
+
+
+class JobLease(Base):
+    """Аренда периодической задачи: её выполняет только держатель до expires_at."""
+
+    __tablename__ = "job_leases"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(255), nullable=False)
+    expires_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+
+
+class TimerJournalCheckpoint(Base):
+    """Последняя операция журнала таймеров, уже записанная в БД (timer_registry)."""
+
+    __tablename__ = "timer_journal_checkpoints"
+
+    name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,118 @@
+"""Keyset-пагинация по непрозрачному курсору.
+
+Курсор — base64 от JSON с именем сортировки и значениями ключей последней
+строки страницы. Следующая страница выбирается условием «строго после этих
+значений» по индексу, поэтому её стоимость не растёт с номером страницы, а
+вставка новых строк не сдвигает уже показанные.
+
+NULL в ключах сортировки всегда идут в конце, независимо от направления.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, false, or_
+
+from . import models
+
+# Сортировка -> [(колонка, по убыванию)]; id в конце делает порядок полным
+TASK_SORTS = {
+    "id": [(models.Task.id, False)],
+    "created_at": [(models.Task.created_at, True), (models.Task.id, True)],
+    "priority": [(models.Task.priority, True), (models.Task.id, False)],
+    "due_date": [(models.Task.due_date, False), (models.Task.id, False)],
+}
+
+
+def id_keys(model) -> list:
+    return [(model.id, False)]
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    payload = [
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in values
+    ]
+    raw = json.dumps({"s": sort, "v": payload}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, keys: list) -> list:
+    """Значения ключей из курсора; ValueError, если курсор не подходит."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        values = data["v"]
+        cursor_sort = data["s"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Malformed cursor")
+    if cursor_sort != sort or not isinstance(values, list):
+        raise ValueError("Cursor does not match sort order")
+    if len(values) != len(keys):
+        raise ValueError("Malformed cursor")
+    decoded = []
+    for (column, _), value in zip(keys, values):
+        if value is not None:
+            value = _decode_value(column, value)
+        decoded.append(value)
+    return decoded
+
+
+def _decode_value(column, value):
+    python_type = column.type.python_type
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("Malformed cursor")
+    if python_type is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, python_type) or (
+        isinstance(value, bool) and python_type is not bool
+    ):
+        raise ValueError("Malformed cursor")
+    return value
+
+
+def order_by(keys: list) -> list:
+    clauses = []
+    for column, descending in keys:
+        if column.nullable:
+            clauses.append(column.is_(None))
+        clauses.append(column.desc() if descending else column.asc())
+    return clauses
+
+
+def _after(column, descending: bool, value):
+    if value is None:
+        # После NULL идут только NULL — их порядок решают следующие ключи
+        return false()
+    condition = column < value if descending else column > value
+    if column.nullable:
+        condition = or_(condition, column.is_(None))
+    return condition
+
+
+def _same(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def after_cursor(keys: list, values: list):
+    """Условие «строка идёт после values» для сортировки order_by(keys)."""
+    branches = []
+    for i, ((column, descending), value) in enumerate(zip(keys, values)):
+        prefix = [_same(c, v) for (c, _), v in zip(keys[:i], values[:i])]
+        branches.append(and_(*prefix, _after(column, descending, value)))
+    return or_(*branches)
+
+
+def next_cursor(sort: str, keys: list, items: list, limit: int):
+    """Курсор следующей страницы или None, если страница неполная."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    if isinstance(last, dict):
+        return encode_cursor(sort, [last[column.key] for column, _ in keys])
+    return encode_cursor(sort, [getattr(last, column.key) for column, _ in keys])
@@ -0,0 +1,107 @@
+"""Заполнение time_rollups по уже накопленным данным.
+
+    python -m app.rollups backfill [--user-id ID]
+
+Время закрытых интервалов (time_entries) относится на дни, когда оно
+записано. Остаток total_time сверх интервалов (задачи до time_entries,
+ручные правки) — на день завершения задачи или день создания, если она не
+завершена; если правки уменьшили время ниже интервалов, разница снимается с
+последних дней задачи. Миграция, создающая time_rollups, заполняет её по
+total_time так же; команда нужна для пересчёта.
+"""
+
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+
+
+def backfill_rollups(db: Session, user_id: int = None) -> int:
+    rollups = db.query(models.TimeRollup)
+    tasks = db.query(
+        models.Task.id,
+        models.Task.owner_id,
+        models.Task.project_id,
+        models.Task.total_time,
+        models.Task.completed_at,
+        models.Task.created_at,
+    ).filter(models.Task.total_time > 0)
+    entries = db.query(
+        models.TimeEntry.task_id, models.TimeEntry.start_time, models.TimeEntry.end_time
+    ).filter(models.TimeEntry.end_time.isnot(None))
+    if user_id is not None:
+        rollups = rollups.filter(models.TimeRollup.user_id == user_id)
+        tasks = tasks.filter(models.Task.owner_id == user_id)
+        entries = entries.filter(models.TimeEntry.owner_id == user_id)
+    rollups.delete(synchronize_session=False)
+
+    # task_id -> день -> секунды интервалов
+    entry_days = defaultdict(lambda: defaultdict(float))
+    for task_id, start, end in entries.yield_per(1000):
+        for day, day_seconds in crud._split_by_day(start, end):
+            entry_days[task_id][day] += day_seconds
+
+    seconds = defaultdict(float)
+    for (
+        task_id,
+        owner_id,
+        project_id,
+        total_time,
+        completed_at,
+        created_at,
+    ) in tasks.yield_per(1000):
+        days = dict(entry_days.pop(task_id, {}))
+        remainder = total_time - sum(days.values())
+        if remainder > 0:
+            day = (completed_at or created_at).date()
+            days[day] = days.get(day, 0.0) + remainder
+        for day in sorted(days, reverse=True):
+            if remainder >= 0:
+                break
+            cut = min(days[day], -remainder)
+            days[day] -= cut
+            remainder += cut
+        for day, day_seconds in days.items():
+            if day_seconds > 0:
+                seconds[(owner_id, project_id, day)] += day_seconds
+
+    rates = {}
+    rows = []
+    for (owner_id, project_id, day), total in seconds.items():
+        if project_id not in rates:
+            rates[project_id] = crud._effective_rate(db, project_id)
+        rows.append(
+            {
+                "user_id": owner_id,
+                "project_id": project_id,
+                "day": day,
+                "seconds": total,
+                "earnings": total * rates[project_id] / 3600,
+            }
+        )
+    if rows:
+        db.execute(insert(models.TimeRollup), rows)
+    db.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание time_rollups")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill = subcommands.add_parser(
+        "backfill", help="пересчитать time_rollups по total_time задач"
+    )
+    backfill.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        count = backfill_rollups(db, user_id=args.user_id)
+    print(f"Записано строк time_rollups: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Периодические задачи, которые выполняются один раз на все процессы.
+
+    python -m app.scheduler
+
+Планировщик может работать в каждом воркере API (SCHEDULER_ENABLED=true,
+по умолчанию) или отдельным процессом — тогда у API ставят
+SCHEDULER_ENABLED=false. В обоих случаях срабатывание задачи сначала берёт
+аренду в таблице job_leases: строку обновляет только тот, у кого аренда
+истекла или уже своя, поэтому из нескольких процессов, проснувшихся на один
+интервал, задачу выполняет один. Аренда не снимается после выполнения и
+держится чуть меньше интервала — так повторный запуск другим процессом в
+том же интервале тоже пропускается. Часы процессов должны быть
+синхронизированы с точностью много меньше интервала.
+"""
+
+import argparse
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+from .metrics import track_job
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+
+# Автоостановка забытых таймеров
+AUTO_PAUSE_INTERVAL_MINUTES = float(os.getenv("AUTO_PAUSE_INTERVAL_MINUTES", "30"))
+AUTO_PAUSE_MAX_HOURS = float(os.getenv("AUTO_PAUSE_MAX_HOURS", "1"))
+AUTO_PAUSE_BATCH_SIZE = int(os.getenv("AUTO_PAUSE_BATCH_SIZE", "500"))
+
+# Доля интервала, на которую берётся аренда
+LEASE_FRACTION = 0.9
+
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ------------------------------------------------------------
+# Аренда
+# ------------------------------------------------------------
+def acquire_lease(
+    db: Session, name: str, seconds: float, holder: str = HOLDER, now=None
+) -> bool:
+    """Взять или продлить аренду задачи name на seconds секунд (с commit)."""
+    now = now or datetime.now()
+    expires_at = now + timedelta(seconds=seconds)
+    leases = models.JobLease.__table__
+    taken = db.execute(
+        update(leases)
+        .where(
+            leases.c.name == name,
+            or_(leases.c.holder == holder, leases.c.expires_at <= now),
+        )
+        .values(holder=holder, expires_at=expires_at)
+    ).rowcount
+    if not taken:
+        db.add(models.JobLease(name=name, holder=holder, expires_at=expires_at))
+        try:
+            db.flush()
+        except IntegrityError:
+            # Строка есть, и аренда у другого процесса
+            db.rollback()
+            return False
+    db.commit()
+    return True
+
+
+def run_exclusive(name: str, seconds: float, job, *args):
+    """Выполнить job, если удалось взять аренду; иначе пропустить срабатывание."""
+    with SessionLocal() as db:
+        if not acquire_lease(db, name, seconds):
+            logger.debug("Job %s is leased by another process", name)
+            return False
+    job(*args)
+    return True
+
+
+# ------------------------------------------------------------
+# Задачи
+# ------------------------------------------------------------
+def auto_pause_old_timers(on_paused=None):
+    """on_paused(db, user_id) — для уведомления клиентов этого процесса.
+
+    Подписчики других процессов (и все — при отдельном планировщике) узнают
+    об остановке по смене data_version, см. STREAM_SYNC_SECONDS в main.
+    """
+    with SessionLocal() as db:
+        try:
+            with track_job("auto_pause_timers"):
+                result = crud.auto_pause_old_timers(
+                    db,
+                    max_duration_hours=AUTO_PAUSE_MAX_HOURS,
+                    batch_size=AUTO_PAUSE_BATCH_SIZE,
+                )
+            if result["tasks"] or result["daily_sessions"]:
+                logger.info(
+                    "Автоматически остановлено %s старых таймеров "
+                    "и %s ежедневных таймеров",
+                    result["tasks"],
+                    result["daily_sessions"],
+                )
+                if on_paused is not None:
+                    for user_id in result["user_ids"]:
+                        on_paused(db, user_id)
+        except Exception:
+            logger.exception("Ошибка при автоматической остановке таймеров")
+
+
+def add_jobs(scheduler, on_timers_paused=None):
+    """Зарегистрировать периодические задачи в планировщике APScheduler."""
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    interval = AUTO_PAUSE_INTERVAL_MINUTES * 60
+    scheduler.add_job(
+        run_exclusive,
+        trigger=IntervalTrigger(seconds=interval),
+        args=(
+            "auto_pause_timers",
+            interval * LEASE_FRACTION,
+            auto_pause_old_timers,
+            on_timers_paused,
+        ),
+        id="auto_pause_timers",
+        name="auto_pause_timers",
+        replace_existing=True,
+    )
+    return scheduler
+
+
+def main():
+    argparse.ArgumentParser(
+        description="Планировщик периодических задач отдельно от API"
+    ).parse_args()
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    logging.basicConfig(level=logging.INFO)
+    scheduler = add_jobs(BlockingScheduler())
+    logger.info("Планировщик запущен (%s)", HOLDER)
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Планировщик остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from enum import Enum
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime, date
 from typing import Optional, List
@@ -121,6 +122,13 @@ class Task(TaskBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TaskSort(str, Enum):
+    id = "id"
+    created_at = "created_at"
+    priority = "priority"
+    due_date = "due_date"
+
+
 class UserBase(BaseModel):
     username: str
 
@@ -174,6 +182,45 @@ class DailyWorkSession(DailyWorkSessionBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class RunningTask(BaseModel):
+    id: int
+    project_id: Optional[int] = None
+    total_time: float
+    last_start_time: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TimerAction(str, Enum):
+    start = "start"
+    pause = "pause"
+    # Запустить task_ids, остановив все остальные запущенные задачи
+    switch = "switch"
+
+
+class TimerOperation(BaseModel):
+    action: TimerAction
+    task_ids: List[int]
+
+
+class TimerBatchRequest(BaseModel):
+    operations: List[TimerOperation]
+
+
+class TimerBatchResponse(BaseModel):
+    started: List[int]
+    paused: List[int]
+    daily_session: Optional[DailyWorkSession] = None
+
+
+class TimerState(BaseModel):
+    """Состояние таймеров, которое отправляется клиенту через /daily/stream."""
+
+    daily_session: Optional[DailyWorkSession] = None
+    running_tasks: List[RunningTask] = []
+    server_time: datetime
+
+
 class DailyStatsItem(BaseModel):
     date: str  # YYYY-MM-DD
     total_seconds: float
@@ -185,11 +232,145 @@ class DailyStatsResponse(BaseModel):
     month: List[DailyStatsItem]
 
 
+class StatsGroup(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+class DailyStatsRangeResponse(BaseModel):
+    start: date
+    end: date
+    group: StatsGroup
+    total_seconds: float
+    items: List[DailyStatsItem]  # date — начало периода
+
+
+# ---- Time entries ----
+class TimeEntry(BaseModel):
+    id: int
+    task_id: int
+    start_time: datetime
+    end_time: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# ---- Reports ----
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    xlsx = "xlsx"
+
+
+class ExportDetail(str, Enum):
+    task = "task"
+    project = "project"
+
+
+class SearchKind(str, Enum):
+    task = "task"
+    sub_task = "sub_task"
+    task_comment = "task_comment"
+    sub_task_comment = "sub_task_comment"
+
+
+class SearchResult(BaseModel):
+    kind: SearchKind
+    id: int
+    task_id: int
+    task_title: str
+    project_id: Optional[int] = None
+    snippet: str
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+# Строки импорта. ref — ключ строки внутри файла, на него ссылаются
+# следующие строки (project, task); родитель должен идти раньше детей
+class ImportProject(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    ref: Optional[str] = None
+    name: str
+    hourly_rate: Optional[float] = None
+
+
+class ImportTask(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    ref: Optional[str] = None
+    project: Optional[str] = None
+    project_id: Optional[int] = None  # уже существующий проект
+    title: str
+    priority: Optional[int] = 1
+    due_date: Optional[datetime] = None
+    is_completed: bool = False
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    total_time: float = 0.0  # секунды, если интервалов нет
+
+
+class ImportSubTask(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    task: str
+    title: str
+    is_completed: bool = False
+
+
+class ImportTimeEntry(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    task: str
+    start: datetime
+    end: datetime
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    committed: bool
+    created: dict
+    error_count: int
+    errors: List[ImportRowError]
+
+
+class RollupItem(BaseModel):
+    day: date
+    project_id: Optional[int] = None
+    seconds: float
+    earnings: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 # ---- Earnings ----
+class EarningsMonth(BaseModel):
+    month: str  # YYYY-MM
+    seconds: float
+    earned: float
+
+
+class EarningsProject(BaseModel):
+    project_id: Optional[int] = None
+    name: Optional[str] = None
+    seconds: float
+    earned: float
+
+
 class EarningsSummaryResponse(BaseModel):
     total_earned: float
     months_since_registration: int
     average_monthly: float
+    months: List[EarningsMonth] = []
+    projects: List[EarningsProject] = []
 
 
 class UpdateRateRequest(BaseModel):
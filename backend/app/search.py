@@ -0,0 +1,313 @@
+"""Полнотекстовый поиск по задачам, подзадачам и комментариям.
+
+    python -m app.search rebuild
+
+В SQLite используется FTS5-таблица search_index: одна строка на задачу,
+подзадачу или комментарий, rowid = id * 4 + код типа (KINDS). Владелец
+хранится индексируемым токеном u<id>, поэтому ограничение по пользователю —
+часть MATCH, а не фильтр по всем совпадениям всех пользователей. Индекс
+поддерживают триггеры, так что в него попадают и массовые UPDATE/DELETE
+мимо ORM. Без FTS5 (MySQL или сборка SQLite без расширения) поиск идёт
+через LIKE — медленнее и без ранжирования, но с тем же API.
+"""
+
+import argparse
+import hashlib
+import logging
+import re
+import weakref
+
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    and_,
+    exc,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    text,
+    type_coerce,
+    union_all,
+)
+from sqlalchemy.orm import Session
+
+from . import models, pagination
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "search_index"
+KINDS = ("task", "sub_task", "task_comment", "sub_task_comment")
+MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+
+# Таблица поиска вне Base.metadata: create_all её не создаёт
+search_index = Table(
+    FTS_TABLE,
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("body", Text),
+    Column("owner", Text),
+    Column("task_id", Integer),
+)
+
+# (таблица, код типа, колонка с текстом, владелец, task_id); {row} — NEW, OLD
+# или имя таблицы при перестроении индекса
+_SOURCES = (
+    ("tasks", 0, "title", "{row}.owner_id", "{row}.id"),
+    (
+        "sub_tasks",
+        1,
+        "title",
+        "(SELECT owner_id FROM tasks WHERE id = {row}.task_id)",
+        "{row}.task_id",
+    ),
+    (
+        "task_comments",
+        2,
+        "content",
+        "(SELECT owner_id FROM tasks WHERE id = {row}.task_id)",
+        "{row}.task_id",
+    ),
+    (
+        "sub_task_comments",
+        3,
+        "content",
+        "(SELECT tasks.owner_id FROM tasks JOIN sub_tasks"
+        " ON sub_tasks.task_id = tasks.id WHERE sub_tasks.id = {row}.sub_task_id)",
+        "(SELECT task_id FROM sub_tasks WHERE id = {row}.sub_task_id)",
+    ),
+)
+
+
+def _insert_values(code: int, column: str, owner: str, task_id: str, row: str):
+    return (
+        f"{row}.id * 4 + {code}, {row}.{column}, "
+        f"'u' || {owner.format(row=row)}, {task_id.format(row=row)}"
+    )
+
+
+def fts_schema() -> list:
+    """DDL таблицы FTS5 и триггеров синхронизации."""
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "body, owner, task_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    ]
+    for table, code, column, owner, task_id in _SOURCES:
+        values = _insert_values(code, column, owner, task_id, "NEW")
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} "
+            f"BEGIN INSERT INTO {FTS_TABLE} (rowid, body, owner, task_id) "
+            f"VALUES ({values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au "
+            f"AFTER UPDATE OF {column} ON {table} "
+            f"BEGIN UPDATE {FTS_TABLE} SET body = NEW.{column} "
+            f"WHERE rowid = NEW.id * 4 + {code}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} "
+            f"BEGIN DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id * 4 + {code}; END",
+        ]
+    return statements
+
+
+def drop_fts_schema() -> list:
+    statements = []
+    for table, *_ in _SOURCES:
+        for suffix in ("ai", "au", "ad"):
+            statements.append(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+    statements.append(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    return statements
+
+
+def rebuild_statements() -> list:
+    """Заполнить индекс заново по текущим данным."""
+    statements = [f"DELETE FROM {FTS_TABLE}"]
+    for table, code, column, owner, task_id in _SOURCES:
+        values = _insert_values(code, column, owner, task_id, table)
+        statements.append(
+            f"INSERT INTO {FTS_TABLE} (rowid, body, owner, task_id) "
+            f"SELECT {values} FROM {table}"
+        )
+    return statements
+
+
+# Движок -> есть ли в его БД search_index
+_fts_available = weakref.WeakKeyDictionary()
+
+
+def install(engine):
+    """Создать индекс в SQLite-базе, созданной create_all, а не миграциями."""
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                {"name": FTS_TABLE},
+            ).first()
+            for statement in fts_schema():
+                connection.execute(text(statement))
+            if not exists:
+                for statement in rebuild_statements():
+                    connection.execute(text(statement))
+    except exc.OperationalError as e:
+        # SQLite собран без FTS5 — остаётся поиск через LIKE
+        logger.warning("Full-text search index is not available: %s", e)
+
+
+def fts_enabled(db: Session) -> bool:
+    engine = db.get_bind()
+    if engine.dialect.name != "sqlite":
+        return False
+    if engine not in _fts_available:
+        _fts_available[engine] = (
+            db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                {"name": FTS_TABLE},
+            ).first()
+            is not None
+        )
+    return _fts_available[engine]
+
+
+# ------------------------------------------------------------
+# Поиск
+# ------------------------------------------------------------
+def parse_terms(query: str) -> list:
+    """Слова запроса; спецсимволы FTS5 и LIKE отбрасываются."""
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _fts_ranked(owner_id: int, terms: list):
+    table = literal_column(FTS_TABLE)
+    phrases = " AND ".join(f'"{term}"*' for term in terms)
+    match = f'owner : "u{owner_id}" AND body : ({phrases})'
+    return (
+        select(
+            search_index.c.rowid.label("key"),
+            search_index.c.task_id.label("task_id"),
+            func.snippet(table, 0, "", "", "…", SNIPPET_TOKENS).label("snippet"),
+            # Вес owner 0: токен владельца есть в каждой строке
+            type_coerce(func.bm25(table, 1.0, 0.0), Float).label("rank"),
+        )
+        .where(table.op("MATCH")(match))
+        .subquery()
+    )
+
+
+def _like_ranked(owner_id: int, terms: list):
+    def contains_all(column):
+        return and_(
+            *(
+                column.ilike(
+                    "%" + term.replace("\\", "\\\\").replace("_", "\\_") + "%",
+                    escape="\\",
+                )
+                for term in terms
+            )
+        )
+
+    Task, SubTask = models.Task, models.SubTask
+    TaskComment, SubTaskComment = models.TaskComment, models.SubTaskComment
+    rank = type_coerce(literal(0.0), Float).label("rank")
+    return union_all(
+        select(
+            (Task.id * 4).label("key"),
+            Task.id.label("task_id"),
+            Task.title.label("snippet"),
+            rank,
+        ).where(Task.owner_id == owner_id, contains_all(Task.title)),
+        select((SubTask.id * 4 + 1), SubTask.task_id, SubTask.title, rank)
+        .join(Task, Task.id == SubTask.task_id)
+        .where(Task.owner_id == owner_id, contains_all(SubTask.title)),
+        select((TaskComment.id * 4 + 2), TaskComment.task_id, TaskComment.content, rank)
+        .join(Task, Task.id == TaskComment.task_id)
+        .where(Task.owner_id == owner_id, contains_all(TaskComment.content)),
+        select(
+            (SubTaskComment.id * 4 + 3), SubTask.task_id, SubTaskComment.content, rank
+        )
+        .join(SubTask, SubTask.id == SubTaskComment.sub_task_id)
+        .join(Task, Task.id == SubTask.task_id)
+        .where(Task.owner_id == owner_id, contains_all(SubTaskComment.content)),
+    ).subquery()
+
+
+def _cursor_sort(terms: list) -> str:
+    """Метка порядка курсора с хешем слов: курсор годится только для своего запроса."""
+    digest = hashlib.blake2s(" ".join(terms).encode(), digest_size=6).hexdigest()
+    return f"rank:{digest}"
+
+
+def search(db: Session, owner_id: int, query: str, limit: int = 20, cursor: str = None):
+    """Результаты по релевантности и курсор следующей страницы.
+
+    ValueError — пустой запрос или курсор от другого запроса.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        raise ValueError("Empty search query")
+    if fts_enabled(db):
+        ranked = _fts_ranked(owner_id, terms)
+    else:
+        ranked = _like_ranked(owner_id, terms)
+
+    sort = _cursor_sort(terms)
+    keys = [(ranked.c.rank, False), (ranked.c.key, False)]
+    statement = (
+        select(
+            ranked.c.key,
+            ranked.c.rank,
+            ranked.c.task_id,
+            ranked.c.snippet,
+            models.Task.title.label("task_title"),
+            models.Task.project_id,
+        )
+        # JOIN отсекает строки задач, удалённых без каскада
+        .join(models.Task, models.Task.id == ranked.c.task_id)
+        .order_by(ranked.c.rank, ranked.c.key)
+        .limit(limit)
+    )
+    if cursor is not None:
+        rank, key = pagination.decode_cursor(cursor, sort, keys)
+        statement = statement.where(
+            or_(ranked.c.rank > rank, and_(ranked.c.rank == rank, ranked.c.key > key))
+        )
+    rows = db.execute(statement).all()
+    results = [
+        {
+            "kind": KINDS[row.key % 4],
+            "id": row.key // 4,
+            "task_id": row.task_id,
+            "task_title": row.task_title,
+            "project_id": row.project_id,
+            "snippet": row.snippet,
+        }
+        for row in rows
+    ]
+    return results, pagination.next_cursor(sort, keys, rows, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание поискового индекса")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("rebuild", help="перестроить search_index по данным")
+    parser.parse_args()
+
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name != "sqlite":
+            print("Поиск в этой БД работает без индекса (LIKE)")
+            return
+        for statement in fts_schema() + rebuild_statements():
+            db.execute(text(statement))
+        db.commit()
+        count = db.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+    print(f"Записей в {FTS_TABLE}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,671 @@
+"""Запущенные таймеры в памяти процесса с отложенной записью в БД.
+
+Включается TIMER_REGISTRY=true и рассчитан на один процесс API: состояние
+таймеров пользователя (запущенные задачи и сегодняшняя сессия) живёт в
+памяти, старт и пауза меняют его под блокировкой и сразу отвечают, а
+/daily/current читает его без запроса к БД. С несколькими воркерами у
+каждого была бы своя копия — там реестр не включают.
+
+Каждый переход — операция с порядковым номером (seq). Она дописывается в
+журнал (TIMER_JOURNAL_PATH, NDJSON) до ответа клиенту и ставится в
+очередь. Поток записи раз в TIMER_FLUSH_INTERVAL_MS применяет очередь
+пачками до BATCH_OPS операций, каждую одной транзакцией, и в ней же
+сохраняет номер последней операции в
+timer_journal_checkpoints. Записанные операции остаются в журнале, пока
+их не наберётся TIMER_JOURNAL_COMPACT_OPS: тогда журнал переписывается
+только с ещё не записанными. При старте операции журнала с номером больше
+сохранённого применяются заново, поэтому падение процесса не теряет
+переходов и не применяет их дважды. Журнал пишется в буфер ОС; fsync на
+каждую операцию — TIMER_JOURNAL_FSYNC=true.
+
+Остальные изменения таймеров (/timer/batch, stop-all, удаление задач,
+автоостановка) идут прямо в БД внутри bypass(): очередь сначала
+записывается, а состояние пользователя затем перечитывается из БД.
+Эндпоинты, которые читают время из БД, сначала ждут записи операций
+пользователя (sync). Если за TIMER_SYNC_TIMEOUT_SECONDS не записалась ни
+одна пачка, они получают TimerSyncTimeout (503), а не висят, пока БД
+недоступна. Изменения из других процессов (отдельный планировщик)
+поток записи замечает, раз в TIMER_RECONCILE_SECONDS сверяя запущенные
+таймеры в памяти с БД.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+logger = logging.getLogger(__name__)
+
+TIMER_REGISTRY = os.getenv("TIMER_REGISTRY", "false").lower() == "true"
+TIMER_JOURNAL_PATH = os.getenv("TIMER_JOURNAL_PATH", "timer_journal.ndjson")
+TIMER_FLUSH_INTERVAL_MS = float(os.getenv("TIMER_FLUSH_INTERVAL_MS", "50"))
+TIMER_JOURNAL_FSYNC = os.getenv("TIMER_JOURNAL_FSYNC", "false").lower() == "true"
+TIMER_RECONCILE_SECONDS = float(os.getenv("TIMER_RECONCILE_SECONDS", "10"))
+TIMER_SYNC_TIMEOUT_SECONDS = float(os.getenv("TIMER_SYNC_TIMEOUT_SECONDS", "5"))
+TIMER_JOURNAL_COMPACT_OPS = int(os.getenv("TIMER_JOURNAL_COMPACT_OPS", "10000"))
+# Пауза перед повтором, если БД недоступна
+RETRY_SECONDS = 1.0
+# Операций в одной транзакции записи: ждущие sync видят продвижение пачками
+BATCH_OPS = 500
+
+_DATETIME_FIELDS = ("start", "end")
+_SESSION_FIELDS = (
+    "id",
+    "user_id",
+    "date",
+    "total_time",
+    "is_timer_running",
+    "last_start_time",
+    "created_at",
+    "updated_at",
+)
+
+# Достаточно для crud._open_task_interval / _close_task_interval
+_TaskRef = namedtuple("_TaskRef", "id owner_id")
+
+
+class TimerSyncTimeout(Exception):
+    """Операции не записаны в БД за sync_timeout — скорее всего, БД недоступна."""
+
+
+class UserTimers:
+    """Таймеры пользователя: task_id -> время старта и сегодняшняя сессия."""
+
+    def __init__(self, day: datetime, running: dict, session: dict = None):
+        self.day = day
+        self.running = running
+        self.session = session
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _live(session: dict, now: datetime):
+    """Копия сессии с учётом текущего времени, если таймер запущен."""
+    if session is None:
+        return None
+    session = dict(session)
+    if session["is_timer_running"] and session["last_start_time"]:
+        session["total_time"] += (now - session["last_start_time"]).total_seconds()
+    return session
+
+
+def _encode(op: dict) -> str:
+    return json.dumps(
+        {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in op.items()
+        }
+    )
+
+
+def _decode(line: str) -> dict:
+    op = json.loads(line)
+    for key in _DATETIME_FIELDS:
+        if op.get(key) is not None:
+            op[key] = datetime.fromisoformat(op[key])
+    return op
+
+
+# ------------------------------------------------------------
+# Применение операций к БД
+# ------------------------------------------------------------
+def _apply_op(db: Session, op: dict, closed: list):
+    kind, user_id = op["op"], op["user"]
+    if kind == "open":
+        crud._open_task_interval(db, _TaskRef(op["task"], user_id), op["start"])
+        # Интервал должен быть в БД до close той же пачки (autoflush выключен)
+        db.flush()
+    elif kind == "close":
+        if op["start"] is None:
+            # Таймер, запущенный без last_start_time: время не учитывается
+            db.execute(
+                update(models.Task)
+                .where(models.Task.id == op["task"])
+                .values(is_timer_running=False)
+            )
+        elif crud._close_task_interval(
+            db, _TaskRef(op["task"], user_id), op["start"], op["end"], record=False
+        ):
+            closed.append(op)
+    elif kind == "daily_start":
+        daily = models.DailyWorkSession
+        db.execute(
+            update(daily)
+            .where(daily.id == op["session"], daily.is_timer_running == False)
+            .values(is_timer_running=True, last_start_time=op["start"])
+        )
+    elif kind == "daily_pause":
+        daily = models.DailyWorkSession
+        db.execute(
+            update(daily)
+            .where(
+                daily.id == op["session"],
+                daily.is_timer_running == True,
+                daily.last_start_time == op["start"],
+            )
+            .values(
+                total_time=func.coalesce(daily.total_time, 0.0)
+                + (op["end"] - op["start"]).total_seconds(),
+                is_timer_running=False,
+                last_start_time=None,
+                updated_at=op["end"],
+            )
+        )
+    else:
+        raise ValueError(f"Unknown timer operation: {kind}")
+
+
+def _record_closed(db: Session, closed: list):
+    """Закрытые интервалы — в time_rollups по текущему проекту задачи."""
+    if not closed:
+        return
+    project_ids = dict(
+        db.execute(
+            select(models.Task.id, models.Task.project_id).where(
+                models.Task.id.in_({op["task"] for op in closed})
+            )
+        ).all()
+    )
+    crud.record_intervals(
+        db,
+        [
+            (op["user"], project_ids.get(op["task"]), op["start"], op["end"])
+            for op in closed
+        ],
+    )
+
+
+def _save_checkpoint(db: Session, name: str, seq: int):
+    checkpoint = db.get(models.TimerJournalCheckpoint, name)
+    if checkpoint is None:
+        db.add(models.TimerJournalCheckpoint(name=name, seq=seq))
+    else:
+        checkpoint.seq = seq
+
+
+def apply_ops(db: Session, name: str, ops: list):
+    """Применить операции одной транзакцией вместе с контрольной точкой.
+
+    Если транзакция не прошла (например, задачу удалили и сработал внешний
+    ключ), операции применяются по одной, а неприменимые пропускаются.
+    Исключение — только если не удаётся записать даже контрольную точку.
+    """
+    if not ops:
+        return
+    try:
+        closed = []
+        for op in ops:
+            _apply_op(db, op, closed)
+        _record_closed(db, closed)
+        for user_id in {op["user"] for op in ops}:
+            crud.bump_data_version(db, user_id)
+        _save_checkpoint(db, name, ops[-1]["seq"])
+        db.commit()
+        return
+    except SQLAlchemyError as e:
+        db.rollback()
+        if len(ops) == 1:
+            logger.warning("Timer operation %s failed: %s", ops[0], e)
+            _save_checkpoint(db, name, ops[0]["seq"])
+            db.commit()
+            return
+    for op in ops:
+        apply_ops(db, name, [op])
+
+
+# ------------------------------------------------------------
+# Реестр
+# ------------------------------------------------------------
+class TimerRegistry:
+    def __init__(
+        self,
+        session_factory,
+        journal_path: str = TIMER_JOURNAL_PATH,
+        flush_interval: float = TIMER_FLUSH_INTERVAL_MS / 1000,
+        fsync: bool = TIMER_JOURNAL_FSYNC,
+        on_flushed=None,
+        reconcile_interval: float = TIMER_RECONCILE_SECONDS,
+        sync_timeout: float = TIMER_SYNC_TIMEOUT_SECONDS,
+        compact_ops: int = TIMER_JOURNAL_COMPACT_OPS,
+    ):
+        self.session_factory = session_factory
+        self.journal_path = journal_path
+        self.name = os.path.abspath(journal_path)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.reconcile_interval = reconcile_interval
+        self.sync_timeout = sync_timeout
+        self.compact_ops = compact_ops
+        # on_flushed(user_ids) — после commit пачки, в потоке записи
+        self.on_flushed = on_flushed
+        self._users = {}
+        self._queue = []
+        # user_id -> число его операций в очереди, ещё не записанных в БД
+        self._pending = Counter()
+        self._seq = 0
+        self._applied_seq = 0
+        self._lock = threading.Lock()
+        # _wake будит поток записи (flush, stop), _applied — ждущих flush
+        self._wake = threading.Condition(self._lock)
+        self._applied = threading.Condition(self._lock)
+        self._flush_requested = False
+        self._journal = None
+        # Операций в файле журнала, включая уже записанные в БД
+        self._journal_ops = 0
+        self._thread = None
+        self._stopping = False
+
+    # -- запуск и остановка ---------------------------------------
+    def start(self):
+        self._recover()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(
+            target=self._run, name="timer-registry", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._journal is not None:
+            self._journal.close()
+
+    def _recover(self):
+        ops = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        ops.append(_decode(line))
+                    except ValueError:
+                        # Недописанная строка при падении — дальше ничего нет
+                        break
+        with self.session_factory() as db:
+            checkpoint = db.get(models.TimerJournalCheckpoint, self.name)
+            done = checkpoint.seq if checkpoint else 0
+            pending = [op for op in ops if op["seq"] > done]
+            apply_ops(db, self.name, pending)
+        if pending:
+            logger.info("Recovered %d timer operations from journal", len(pending))
+        self._seq = self._applied_seq = max([done, *(op["seq"] for op in ops)])
+        open(self.journal_path, "w").close()
+
+    # -- состояние пользователя -------------------------------------
+    def _load(self, user_id: int) -> UserTimers:
+        day = _today()
+        with self.session_factory() as db:
+            running = dict(
+                db.execute(
+                    select(models.Task.id, models.Task.last_start_time).where(
+                        models.Task.owner_id == user_id,
+                        models.Task.is_timer_running == True,
+                    )
+                ).all()
+            )
+            session = crud.get_today_daily_session(db, user_id)
+            return UserTimers(day, running, self._session_dict(session))
+
+    @staticmethod
+    def _session_dict(session):
+        if session is None:
+            return None
+        return {field: getattr(session, field) for field in _SESSION_FIELDS}
+
+    def _state(self, user_id: int) -> UserTimers:
+        with self._lock:
+            state = self._users.get(user_id)
+        if state is not None and state.day == _today():
+            return state
+        if state is not None:
+            # Новый день: вчерашняя сессия остаётся в БД как есть
+            self.forget(user_id)
+        # Операции, поставленные до forget, должны попасть в БД до загрузки
+        self.sync(user_id)
+        loaded = self._load(user_id)
+        with self._lock:
+            return self._users.setdefault(user_id, loaded)
+
+    def _ensure_session(self, user_id: int, state: UserTimers):
+        if state.session is not None:
+            return
+        with self.session_factory() as db:
+            created = crud.get_or_create_daily_session(db, user_id)
+            db.commit()
+            session = self._session_dict(created)
+        with self._lock:
+            if state.session is None:
+                state.session = session
+
+    def peek(self, user_id: int):
+        """(загружен ли пользователь, сегодняшняя сессия из памяти)."""
+        now = datetime.now()
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None or state.day != _today():
+                return False, None
+            return True, _live(state.session, now)
+
+    def forget(self, user_id: int):
+        """Забыть пользователя: он перечитается из БД после записи его очереди."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def has_pending(self, user_id: int) -> bool:
+        with self._lock:
+            return bool(self._pending[user_id])
+
+    def sync(self, user_id: int):
+        """Дождаться, пока операции пользователя из очереди будут записаны в БД."""
+        with self._lock:
+            self._wait_applied(lambda: not self._pending[user_id])
+
+    def _wait_applied(self, done):
+        """Под блокировкой: будить поток записи, пока не done().
+
+        TimerSyncTimeout, если за sync_timeout не записалось ни одной пачки:
+        длинная очередь при живой БД ожидание не обрывает.
+        """
+        deadline = time.monotonic() + self.sync_timeout
+        applied_seq = self._applied_seq
+        while not done() and self._thread is not None:
+            if self._applied_seq != applied_seq:
+                applied_seq = self._applied_seq
+                deadline = time.monotonic() + self.sync_timeout
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimerSyncTimeout("Timer operations are not saved yet")
+            self._flush_requested = True
+            self._wake.notify()
+            self._applied.wait(remaining)
+
+    # -- переходы ----------------------------------------------------
+    def _append(self, ops: list):
+        """Пронумеровать операции, дописать в журнал и поставить в очередь."""
+        lines = []
+        for op in ops:
+            self._seq += 1
+            op["seq"] = self._seq
+            lines.append(_encode(op) + "\n")
+            self._pending[op["user"]] += 1
+        self._journal.write("".join(lines))
+        self._journal.flush()
+        self._journal_ops += len(lines)
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._queue.extend(ops)
+
+    def start_task(self, user_id: int, task_id: int):
+        """Запустить таймер задачи и сегодняшний. Возвращает сессию (dict)."""
+        while True:
+            state = self._state(user_id)
+            self._ensure_session(user_id, state)
+            now = datetime.now()
+            with self._lock:
+                # Пользователя забыли, пока он загружался, — берём заново
+                if self._users.get(user_id) is state:
+                    return self._start_locked(user_id, task_id, state, now)
+
+    def _start_locked(self, user_id: int, task_id: int, state: UserTimers, now):
+        """Переход старта; вызывается под self._lock."""
+        ops = []
+        if task_id in state.running:
+            # Повторный старт: закрываем текущий интервал и открываем новый
+            ops.append(
+                {
+                    "op": "close",
+                    "user": user_id,
+                    "task": task_id,
+                    "start": state.running[task_id],
+                    "end": now,
+                }
+            )
+        state.running[task_id] = now
+        ops.append({"op": "open", "user": user_id, "task": task_id, "start": now})
+        session = state.session
+        if not session["is_timer_running"]:
+            session["is_timer_running"] = True
+            session["last_start_time"] = now
+            ops.append(
+                {
+                    "op": "daily_start",
+                    "user": user_id,
+                    "session": session["id"],
+                    "start": now,
+                }
+            )
+        self._append(ops)
+        return _live(session, now)
+
+    def pause_task(self, user_id: int, task_id: int):
+        """Остановить таймер задачи; сегодняшний — если задач больше не идёт."""
+        while True:
+            state = self._state(user_id)
+            now = datetime.now()
+            with self._lock:
+                if self._users.get(user_id) is state:
+                    return self._pause_locked(user_id, task_id, state, now)
+
+    def _pause_locked(self, user_id: int, task_id: int, state: UserTimers, now):
+        """Переход паузы; вызывается под self._lock."""
+        session = state.session
+        if task_id not in state.running:
+            return _live(session, now)
+        start = state.running.pop(task_id)
+        ops = [
+            {
+                "op": "close",
+                "user": user_id,
+                "task": task_id,
+                "start": start,
+                "end": now,
+            }
+        ]
+        if not state.running and session and session["is_timer_running"]:
+            started = session["last_start_time"]
+            if started:
+                session["total_time"] += (now - started).total_seconds()
+                ops.append(
+                    {
+                        "op": "daily_pause",
+                        "user": user_id,
+                        "session": session["id"],
+                        "start": started,
+                        "end": now,
+                    }
+                )
+            session["is_timer_running"] = False
+            session["last_start_time"] = None
+        self._append(ops)
+        return _live(session, now)
+
+    # -- запись ------------------------------------------------------
+    def flush(self):
+        """Дождаться, пока всё, что уже в очереди, будет записано в БД."""
+        with self._lock:
+            target = self._seq
+            self._wait_applied(lambda: self._applied_seq >= target)
+
+    def _run(self):
+        retrying = False
+        next_reconcile = time.monotonic() + self.reconcile_interval
+        while True:
+            if self.reconcile_interval and time.monotonic() >= next_reconcile:
+                next_reconcile = time.monotonic() + self.reconcile_interval
+                try:
+                    self._reconcile()
+                except Exception as e:
+                    logger.warning("Timer state reconcile failed: %s", e)
+            with self._lock:
+                # Операции копятся flush_interval и уходят одной транзакцией
+                if not (self._stopping or self._flush_requested):
+                    self._wake.wait(self.flush_interval)
+                self._flush_requested = False
+                if not self._queue:
+                    if self._stopping:
+                        return
+                    continue
+                batch = self._queue[:BATCH_OPS]
+                self._queue = self._queue[BATCH_OPS:]
+                more = bool(self._queue)
+            ops = batch
+            last_seq = batch[-1]["seq"]
+            try:
+                with self.session_factory() as db:
+                    if retrying:
+                        # Часть пачки могла записаться по одной операции
+                        done = db.scalar(
+                            select(models.TimerJournalCheckpoint.seq).where(
+                                models.TimerJournalCheckpoint.name == self.name
+                            )
+                        )
+                        ops = [op for op in ops if op["seq"] > (done or 0)]
+                    apply_ops(db, self.name, ops)
+                retrying = False
+            except Exception as e:
+                logger.error("Timer journal flush failed, will retry: %s", e)
+                retrying = True
+                with self._lock:
+                    self._queue[:0] = batch
+                    self._wake.wait(RETRY_SECONDS)
+                continue
+            user_ids = {op["user"] for op in batch}
+            with self._lock:
+                self._applied_seq = last_seq
+                self._pending.subtract(op["user"] for op in batch)
+                for user_id in user_ids:
+                    if self._pending[user_id] <= 0:
+                        del self._pending[user_id]
+                # Записанные операции при восстановлении пропускаются по
+                # checkpoint, так что журнал переписывается лишь изредка
+                if self._journal_ops - len(self._queue) >= self.compact_ops:
+                    self._compact()
+                # Остаток очереди — следующей пачкой, без ожидания
+                self._flush_requested = self._flush_requested or more
+                self._applied.notify_all()
+            if self.on_flushed is not None and ops:
+                try:
+                    self.on_flushed(user_ids)
+                except Exception as e:
+                    logger.warning("Timer state publish failed: %s", e)
+
+    def _reconcile(self):
+        """Забыть пользователей, чьи запущенные таймеры в БД изменили мимо реестра.
+
+        Например, автоостановка в отдельном процессе планировщика. Сверяются
+        пользователи без операций в очереди, у которых в памяти идёт таймер.
+        """
+        day = _today()
+        with self._lock:
+            expected = {
+                user_id: (
+                    set(state.running),
+                    bool(state.session and state.session["is_timer_running"]),
+                )
+                for user_id, state in self._users.items()
+                if state.day == day
+                and not self._pending[user_id]
+                and (
+                    state.running
+                    or (state.session and state.session["is_timer_running"])
+                )
+            }
+        if not expected:
+            return
+        with self.session_factory() as db:
+            tasks = db.execute(
+                select(models.Task.owner_id, models.Task.id).where(
+                    models.Task.owner_id.in_(expected),
+                    models.Task.is_timer_running == True,
+                )
+            ).all()
+            daily = models.DailyWorkSession
+            sessions = set(
+                db.scalars(
+                    select(daily.user_id).where(
+                        daily.user_id.in_(expected),
+                        daily.date == day,
+                        daily.is_timer_running == True,
+                    )
+                )
+            )
+        running = defaultdict(set)
+        for user_id, task_id in tasks:
+            running[user_id].add(task_id)
+        for user_id, (task_ids, session_running) in expected.items():
+            if running[user_id] != task_ids or (user_id in sessions) != session_running:
+                logger.info("Timers of user %s changed outside the registry", user_id)
+                self.forget(user_id)
+
+    def _compact(self):
+        """Оставить в журнале только операции, ещё не записанные в БД."""
+        temporary = self.journal_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as journal:
+            journal.writelines(_encode(op) + "\n" for op in self._queue)
+            if self.fsync:
+                journal.flush()
+                os.fsync(journal.fileno())
+        self._journal.close()
+        os.replace(temporary, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_ops = len(self._queue)
+
+
+registry = None
+
+
+def start(session_factory, on_flushed=None):
+    """Поднять реестр (с восстановлением по журналу), если он включён."""
+    global registry
+    if TIMER_REGISTRY:
+        registry = TimerRegistry(session_factory, on_flushed=on_flushed)
+        registry.start()
+    return registry
+
+
+def sync(user_id: int):
+    """Перед чтением таймеров из БД: дождаться записи операций пользователя."""
+    if registry is not None:
+        registry.sync(user_id)
+
+
+def has_pending(user_id: int) -> bool:
+    return registry is not None and registry.has_pending(user_id)
+
+
+def stop():
+    global registry
+    if registry is not None:
+        registry.stop()
+        registry = None
+
+
+@contextmanager
+def bypass(user_ids):
+    """Изменение таймеров мимо реестра: до него — запись очереди, после —
+    перечитывание пользователей из БД."""
+    if registry is None:
+        yield
+        return
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    registry.flush()
+    try:
+        yield
+    finally:
+        for user_id in user_ids:
+            registry.forget(user_id)
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import models
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+
+# Кэшируются только неизменяемые поля. Хеш пароля в памяти не держим, а
+# ставку и data_version объект сессии дочитает из БД при первом обращении:
+# в начисления не попадает ставка, изменённая в другом процессе до TTL
+CACHED_FIELDS = ("id", "username", "created_at")
+
+
+class UserCache:
+    """TTL/LRU-кэш: проверенный токен -> неизменяемые поля пользователя.
+
+    Кэш живёт внутри процесса. Записи сбрасываются при изменении или удалении
+    пользователя (см. события ниже), в других процессах — по истечении TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, token: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, fields = entry
+            if expires_at <= now:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return fields
+
+    def put(self, token: str, user: models.User, token_expires_at: float):
+        fields = {key: getattr(user, key) for key in CACHED_FIELDS}
+        # Запись не должна пережить сам токен
+        expires_at = time.monotonic() + min(self.ttl, token_expires_at - time.time())
+        with self._lock:
+            self._entries[token] = (expires_at, fields)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [
+                token
+                for token, (_, fields) in self._entries.items()
+                if fields["id"] == user_id
+            ]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def attach_user(db: Session, fields: dict) -> models.User:
+    """Вернуть пользователя из кэша как persistent-объект сессии без SELECT.
+
+    Поля вне CACHED_FIELDS не загружены и читаются из БД при обращении.
+    """
+    user = models.User(**fields)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+user_cache = UserCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate_user(target.id)
@@ -0,0 +1,73 @@
+"""Ошибки и задержки эндпоинтов чтения при большом числе клиентов.
+
+    cd backend
+    python -m benchmarks.concurrency --clients 200 --requests 5000
+
+Запросы идут в приложение напрямую через ASGI-транспорт httpx, без сети.
+База — временный SQLite-файл, если не задан DATABASE_URL.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+DEFAULT_PATHS = ["/users/me", "/daily/current", "/daily/stats?days=30"]
+
+
+async def run(app, paths, clients: int, total: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await c.post("/register", json={"username": "bench", "password": "bench"})
+        token = (
+            await c.post("/login", json={"username": "bench", "password": "bench"})
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        remaining = iter(range(total))
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            for i in remaining:
+                started = time.perf_counter()
+                response = await c.get(paths[i % len(paths)], headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"клиентов: {clients}, запросов: {total}, ошибок: {errors}")
+    print(f"пропускная способность: {total / elapsed:.0f} req/s")
+    for q in (0.5, 0.95, 0.99):
+        print(
+            f"p{int(q * 100)}: {latencies[int(q * (len(latencies) - 1))] * 1000:.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--path", action="append", dest="paths")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        db_dir = tempfile.mkdtemp(prefix="timer-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_dir}/bench.db"
+
+    from app.main import app
+
+    asyncio.run(run(app, args.paths or DEFAULT_PATHS, args.clients, args.requests))
+
+
+if __name__ == "__main__":
+    main()
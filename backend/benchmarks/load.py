@@ -0,0 +1,173 @@
+"""Нагрузочный прогон по реальным маршрутам приложения.
+
+    cd backend
+    python -m benchmarks.seed --users 20
+    python -m benchmarks.load --clients 50 --seconds 30 --json run.json
+    python -m benchmarks.load --clients 50 --seconds 30 --baseline run.json
+
+Каждый клиент входит под своим пользователем bench* (см. benchmarks.seed)
+и по кругу выполняет сценарий: опрос /daily/current, старт и пауза
+таймера, /tasks-with-details/, /daily/stats и /earnings/summary. Запросы
+идут в приложение напрямую через ASGI-транспорт httpx. Запросы к БД
+считаются событиями SQLAlchemy на sync- и async-движках.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+from sqlalchemy import event
+
+from app.database import async_engine, engine
+
+from .report import (
+    RouteStats,
+    build_report,
+    compare,
+    load_report,
+    print_report,
+    save_report,
+)
+from .seed import BENCH_PASSWORD
+
+# Счётчик запросов к БД текущего HTTP-запроса. Контекст копируется
+# в threadpool sync-эндпоинтов, а список остаётся тем же объектом
+_query_counter = contextvars.ContextVar("query_counter", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install_query_counter():
+    for target in (engine, async_engine.sync_engine):
+        if not event.contains(target, "before_cursor_execute", _count_query):
+            event.listen(target, "before_cursor_execute", _count_query)
+
+
+async def _timed(client, stats, name: str, method: str, url: str, **kwargs):
+    counter = [0]
+    token = _query_counter.set(counter)
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    finally:
+        _query_counter.reset(token)
+    stats[name].record(time.perf_counter() - started, counter[0], response.is_success)
+    return response
+
+
+async def _login(client, username: str) -> dict:
+    response = await client.post(
+        "/login", json={"username": username, "password": BENCH_PASSWORD}
+    )
+    if not response.is_success:
+        sys.exit(f"Не удалось войти как {username}: запустите benchmarks.seed")
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def virtual_client(client, stats, username: str, deadline: float, stats_days):
+    headers = await _login(client, username)
+    tasks = (await client.get("/tasks/?limit=100", headers=headers)).json()
+    task_ids = [task["id"] for task in tasks] or [None]
+    step = 0
+    while time.monotonic() < deadline:
+        task_id = task_ids[step % len(task_ids)]
+        step += 1
+        await _timed(
+            client, stats, "daily_current", "GET", "/daily/current", headers=headers
+        )
+        if task_id is not None:
+            await _timed(
+                client,
+                stats,
+                "timer_start",
+                "POST",
+                f"/timer/start/{task_id}",
+                headers=headers,
+            )
+            await _timed(
+                client,
+                stats,
+                "timer_pause",
+                "POST",
+                f"/timer/pause/{task_id}",
+                headers=headers,
+            )
+        await _timed(
+            client,
+            stats,
+            "tasks_details",
+            "GET",
+            "/tasks-with-details/",
+            headers=headers,
+        )
+        await _timed(
+            client,
+            stats,
+            "daily_stats",
+            "GET",
+            f"/daily/stats?days={stats_days}",
+            headers=headers,
+        )
+        await _timed(
+            client, stats, "earnings", "GET", "/earnings/summary", headers=headers
+        )
+
+
+async def run(app, clients: int, users: int, seconds: float, stats_days: int) -> dict:
+    install_query_counter()
+    stats = defaultdict(RouteStats)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        started = time.perf_counter()
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(
+            *(
+                virtual_client(client, stats, f"bench{n % users}", deadline, stats_days)
+                for n in range(clients)
+            )
+        )
+        elapsed = time.perf_counter() - started
+    return build_report(stats, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument(
+        "--users", type=int, default=10, help="сколько bench* задействовать"
+    )
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--stats-days", type=int, default=30)
+    parser.add_argument("--json", help="сохранить отчёт в файл")
+    parser.add_argument("--baseline", help="сравнить p95 с сохранённым отчётом")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from app.main import app
+
+    report = asyncio.run(
+        run(app, args.clients, args.users, args.seconds, args.stats_days)
+    )
+    print_report(report)
+    if args.json:
+        save_report(report, args.json)
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), args.tolerance)
+        for line in regressions:
+            print(f"Регрессия {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Пропускная способность /login при заданной стоимости хеша паролей.
+
+    cd backend
+    python -m benchmarks.login --users 200 --clients 50 --logins 1000
+    PASSWORD_HASH_TIME_COST=2 PASSWORD_HASH_MEMORY_KIB=19456 python -m benchmarks.login
+
+Запросы идут в приложение через ASGI-транспорт httpx, база — временный
+SQLite-файл. Пока клиенты логинятся, отдельный клиент раз в 10 мс
+запрашивает /users/me: его задержка показывает, не стоит ли event loop,
+пока считаются хеши. С --legacy пароли пользователей лежат открытым
+текстом и каждый первый вход ещё и пересчитывает хеш.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+PASSWORD = "morning-spike"
+PROBE_INTERVAL = 0.01
+
+
+def _percentiles(latencies):
+    latencies = sorted(latencies)
+    return " ".join(
+        f"p{int(q * 100)} {latencies[int(q * (len(latencies) - 1))] * 1000:.1f} ms"
+        for q in (0.5, 0.95, 0.99)
+    )
+
+
+def seed(users: int, legacy: bool):
+    from sqlalchemy import insert
+
+    from app import auth, models
+    from app.database import engine
+
+    password = PASSWORD if legacy else auth.get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [{"username": f"login{i}", "password": password} for i in range(users)],
+        )
+
+
+async def run(app, users: int, clients: int, total: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        token = (
+            await c.post("/login", json={"username": "login0", "password": PASSWORD})
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        remaining = iter(range(total))
+        latencies = []
+        probes = []
+        errors = 0
+        done = False
+
+        async def client():
+            nonlocal errors
+            for i in remaining:
+                started = time.perf_counter()
+                response = await c.post(
+                    "/login",
+                    json={"username": f"login{i % users}", "password": PASSWORD},
+                )
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        async def probe():
+            while not done:
+                started = time.perf_counter()
+                await c.get("/users/me", headers=headers)
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(PROBE_INTERVAL)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+        done = True
+        await prober
+
+    print(f"входов: {total}, клиентов: {clients}, ошибок: {errors}")
+    print(f"пропускная способность: {total / elapsed:.0f} логинов/с")
+    print(f"/login: {_percentiles(latencies)}")
+    print(f"/users/me во время входов: {_percentiles(probes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=1000)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="timer-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_dir}/login.db"
+
+    from app import auth
+    from app.main import app
+
+    started = time.perf_counter()
+    auth.get_password_hash(PASSWORD)
+    print(
+        f"argon2id t={auth.PASSWORD_HASH_TIME_COST} m={auth.PASSWORD_HASH_MEMORY_KIB} KiB "
+        f"p={auth.PASSWORD_HASH_PARALLELISM}, потоков: {auth.PASSWORD_HASH_WORKERS}, "
+        f"один хеш: {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    seed(args.users, args.legacy)
+    asyncio.run(run(app, args.users, args.clients, args.logins))
+
+
+if __name__ == "__main__":
+    main()
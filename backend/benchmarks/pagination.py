@@ -0,0 +1,128 @@
+"""Обход списков задач по курсору: каждая задача ровно один раз.
+
+    cd backend
+    python -m benchmarks.pagination
+
+Поднимает приложение на временной SQLite-базе, создаёт задачи в одну
+секунду (created_at из CURRENT_TIMESTAMP) и задачи с долями секунды (как
+при импорте) и проходит /tasks/ и /tasks-with-details/ страницами по две
+для каждой сортировки на обоих путях ответа. Код выхода 1, если обход
+зациклился, пропустил или повторил задачу либо испорченный курсор дал не 400.
+"""
+
+import base64
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+_db_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir.name}/pagination.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app import fast_json, models, schemas  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+
+PAGE_SIZE = 2
+API_TASKS = 5
+IMPORTED_TASKS = 4
+PATHS = ["/tasks/", "/tasks-with-details/"]
+
+
+def _cursor(payload) -> str:
+    raw = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Курсоры, которые должны давать 400, а не 500
+BAD_CURSORS = [
+    ("created_at", _cursor({"s": "created_at", "v": [123, 1]})),
+    ("created_at", _cursor({"s": "created_at", "v": ["not a date", 1]})),
+    ("id", _cursor({"s": "id", "v": [{"id": 1}]})),
+    ("priority", _cursor({"s": "priority", "v": [True, 1]})),
+]
+
+
+def _login(client) -> dict:
+    client.post("/register", json={"username": "pages", "password": "pw"})
+    token = client.post("/login", json={"username": "pages", "password": "pw"}).json()[
+        "access_token"
+    ]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def seed(client, headers: dict) -> set:
+    for i in range(API_TASKS):
+        client.post(
+            "/tasks/", json={"title": f"T{i}", "priority": i % 2 + 1}, headers=headers
+        ).raise_for_status()
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    base = datetime.now().replace(microsecond=0) - timedelta(seconds=1)
+    with SessionLocal() as db:
+        db.execute(
+            insert(models.Task),
+            [
+                {
+                    "title": f"imported {i}",
+                    "owner_id": user_id,
+                    "created_at": base + timedelta(microseconds=250000 * i),
+                    "due_date": base if i % 2 else None,
+                }
+                for i in range(IMPORTED_TASKS)
+            ],
+        )
+        db.commit()
+    return {task["id"] for task in client.get("/tasks/", headers=headers).json()}
+
+
+def walk(client, headers: dict, path: str, sort: str, expected: set) -> str:
+    """Пройти все страницы; строка с ошибкой или пустая строка."""
+    seen = []
+    cursor = None
+    for _ in range(len(expected) + 2):
+        params = {"limit": PAGE_SIZE, "sort": sort}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get(path, params=params, headers=headers)
+        if response.status_code != 200:
+            return f"HTTP {response.status_code} {response.text}"
+        seen += [task["id"] for task in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    else:
+        return f"не закончился, задачи: {seen}"
+    if sorted(seen) != sorted(expected):
+        return f"задачи {seen}, ожидались {sorted(expected)}"
+    return ""
+
+
+def main() -> int:
+    failed = 0
+    with TestClient(app) as client:
+        headers = _login(client)
+        expected = seed(client, headers)
+        for fast in (True, False):
+            fast_json.FAST_JSON = fast
+            for path in PATHS:
+                for sort in schemas.TaskSort:
+                    error = walk(client, headers, path, sort.value, expected)
+                    failed += bool(error)
+                    name = f"{path} sort={sort.value}{' (fast)' if fast else ''}"
+                    print(f"{name:<48} {error or 'ok'}")
+        for sort, cursor in BAD_CURSORS:
+            response = client.get(
+                "/tasks/", params={"sort": sort, "cursor": cursor}, headers=headers
+            )
+            failed += response.status_code != 400
+            print(f"{'bad cursor sort=' + sort:<48} HTTP {response.status_code}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
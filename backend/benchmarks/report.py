@@ -0,0 +1,85 @@
+"""Сводка по замерам нагрузочного прогона: перцентили, RPS, запросы к БД."""
+
+import json
+from dataclasses import dataclass, field
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль по ближайшему рангу; values должны быть отсортированы."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+@dataclass
+class RouteStats:
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+    def record(self, latency: float, queries: int, ok: bool):
+        self.latencies.append(latency)
+        self.queries.append(queries)
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "queries_per_request": sum(self.queries) / count if count else 0.0,
+        }
+
+
+def build_report(stats: dict, elapsed: float) -> dict:
+    total = RouteStats()
+    for route in stats.values():
+        total.latencies += route.latencies
+        total.queries += route.queries
+        total.errors += route.errors
+    routes = {name: route.summary(elapsed) for name, route in sorted(stats.items())}
+    return {"elapsed_s": elapsed, "routes": routes, "total": total.summary(elapsed)}
+
+
+def print_report(report: dict):
+    header = (
+        f"{'route':<16}{'req':>8}{'err':>6}{'rps':>9}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    rows = list(report["routes"].items()) + [("total", report["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<16}{row['requests']:>8}{row['errors']:>6}{row['rps']:>9.1f}"
+            f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+            f"{row['queries_per_request']:>8.1f}"
+        )
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Маршруты, у которых p95 вырос больше чем в (1 + tolerance) раз."""
+    regressions = []
+    for name, row in report["routes"].items():
+        before = baseline["routes"].get(name)
+        if before and row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms"
+            )
+    return regressions
+
+
+def save_report(report: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,228 @@
+"""Синтетические данные для нагрузочных тестов.
+
+    cd backend
+    python -m benchmarks.seed --users 50 --projects 10 --tasks 100 --days 365
+
+Количество проектов, задач, подзадач и комментариев задаётся на одного
+родителя, так что 100 пользователей x 10 проектов x 1000 задач дают миллион
+задач. Пользователи создаются как bench0, bench1, ... с паролем
+BENCH_PASSWORD. Строки вставляются пачками через executemany, после чего
+пересчитываются time_rollups.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app import models
+from app.database import SessionLocal, engine
+from app.rollups import backfill_rollups
+
+BENCH_PASSWORD = "bench"
+WORDS = (
+    "api report fix deploy review meeting design refactor invoice client "
+    "migration backup release docs support estimate"
+).split()
+
+
+def _title(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _next_id(db, model) -> int:
+    return (db.scalar(select(func.max(model.id))) or 0) + 1
+
+
+class _Batcher:
+    """Копит строки и вставляет их пачками по batch_size.
+
+    Таблицы сбрасываются все сразу в порядке первого появления, а родители
+    всегда появляются раньше детей — внешние ключи не нарушаются.
+    """
+
+    def __init__(self, db, batch_size: int):
+        self.db = db
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, model, row: dict):
+        rows = self.pending.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model, rows in self.pending.items():
+            if rows:
+                self.db.execute(insert(model), rows)
+                name = model.__tablename__
+                self.counts[name] = self.counts.get(name, 0) + len(rows)
+                rows.clear()
+
+
+def seed(
+    db,
+    users: int,
+    projects: int,
+    tasks: int,
+    subtasks: int,
+    comments: int,
+    days: int,
+    batch_size: int = 5000,
+    rng_seed: int = 0,
+) -> dict:
+    rng = random.Random(rng_seed)
+    now = datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    batcher = _Batcher(db, batch_size)
+    # Явные id, чтобы не перечитывать вставленные строки
+    ids = {
+        model: _next_id(db, model)
+        for model in (
+            models.User,
+            models.Project,
+            models.Task,
+            models.SubTask,
+            models.TaskComment,
+            models.SubTaskComment,
+        )
+    }
+    first_user = db.scalar(select(func.count(models.User.id)))
+
+    def next_id(model):
+        ids[model] += 1
+        return ids[model] - 1
+
+    for n in range(users):
+        user_id = next_id(models.User)
+        batcher.add(
+            models.User,
+            {
+                "id": user_id,
+                "username": f"bench{first_user + n}",
+                "password": BENCH_PASSWORD,
+                "default_hourly_rate": rng.choice((0.0, 15.0, 30.0)),
+            },
+        )
+
+        for offset in range(days):
+            worked = rng.random() < 5 / 7
+            batcher.add(
+                models.DailyWorkSession,
+                {
+                    "user_id": user_id,
+                    "date": today - timedelta(days=offset),
+                    "total_time": rng.uniform(1, 9) * 3600 if worked else 0.0,
+                    "is_timer_running": False,
+                },
+            )
+
+        # Последний «проект» — задачи без проекта
+        for p in range(projects + 1):
+            project_id = None
+            if p < projects:
+                project_id = next_id(models.Project)
+                batcher.add(
+                    models.Project,
+                    {
+                        "id": project_id,
+                        "name": _title(rng, 2),
+                        "owner_id": user_id,
+                        "hourly_rate": rng.choice((0.0, 20.0, 50.0)),
+                    },
+                )
+            for _ in range(tasks if project_id else max(tasks // 10, 1)):
+                task_id = next_id(models.Task)
+                created_at = now - timedelta(minutes=rng.randrange(days * 24 * 60))
+                completed = rng.random() < 0.6
+                batcher.add(
+                    models.Task,
+                    {
+                        "id": task_id,
+                        "title": _title(rng, 4),
+                        "project_id": project_id,
+                        "owner_id": user_id,
+                        "created_at": created_at,
+                        "is_completed": completed,
+                        "completed_at": (
+                            created_at + timedelta(hours=rng.randrange(1, 72))
+                            if completed
+                            else None
+                        ),
+                        "priority": rng.randint(1, 3),
+                        "total_time": rng.uniform(0, 8) * 3600,
+                        "is_timer_running": False,
+                    },
+                )
+                for _ in range(comments):
+                    batcher.add(
+                        models.TaskComment,
+                        {
+                            "id": next_id(models.TaskComment),
+                            "task_id": task_id,
+                            "content": _title(rng, 12),
+                        },
+                    )
+                for _ in range(subtasks):
+                    sub_task_id = next_id(models.SubTask)
+                    batcher.add(
+                        models.SubTask,
+                        {
+                            "id": sub_task_id,
+                            "task_id": task_id,
+                            "title": _title(rng, 3),
+                            "is_completed": rng.random() < 0.5,
+                        },
+                    )
+                    for _ in range(comments):
+                        batcher.add(
+                            models.SubTaskComment,
+                            {
+                                "id": next_id(models.SubTaskComment),
+                                "sub_task_id": sub_task_id,
+                                "content": _title(rng, 8),
+                            },
+                        )
+    batcher.flush()
+    db.commit()
+    return batcher.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--projects", type=int, default=5, help="на пользователя")
+    parser.add_argument("--tasks", type=int, default=50, help="на проект")
+    parser.add_argument("--subtasks", type=int, default=2, help="на задачу")
+    parser.add_argument("--comments", type=int, default=1, help="на задачу/подзадачу")
+    parser.add_argument("--days", type=int, default=365, help="история сессий")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        counts = seed(
+            db,
+            users=args.users,
+            projects=args.projects,
+            tasks=args.tasks,
+            subtasks=args.subtasks,
+            comments=args.comments,
+            days=args.days,
+            batch_size=args.batch_size,
+            rng_seed=args.seed,
+        )
+        counts["time_rollups"] = backfill_rollups(db)
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"за {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
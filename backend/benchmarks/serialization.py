@@ -0,0 +1,150 @@
+"""Выборка и сериализация списка задач: путь response_model против FAST_JSON.
+
+    cd backend
+    python -m benchmarks.serialization --tasks 1000 10000
+
+Для каждого размера заполняет временную SQLite-базу задачами с
+комментариями и подзадачами и меряет два пути /tasks-with-details/:
+ORM + selectinload + валидация schemas.Task + json.dumps (как FastAPI с
+response_model) и crud.get_task_dicts + fast_json.dumps. Печатает лучшее
+время из --repeat запусков для выборки и для сериализации отдельно и
+проверяет, что JSON у обоих путей одинаковый.
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app import crud, fast_json, models, schemas
+from app.database import create_db_engine
+
+COMMENTS_PER_TASK = 2
+SUB_TASKS_PER_TASK = 3
+COMMENTS_PER_SUB_TASK = 1
+
+
+def seed(engine, tasks: int) -> int:
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.now()
+    with Session(engine) as db:
+        user = models.User(username="bench", password="bench")
+        db.add(user)
+        db.flush()
+        db.execute(
+            insert(models.Task),
+            [
+                {
+                    "title": f"task {i}",
+                    "owner_id": user.id,
+                    "total_time": float(i % 3600),
+                    "priority": i % 3 + 1,
+                    "created_at": now - timedelta(minutes=i),
+                    "due_date": now + timedelta(days=i % 30) if i % 2 else None,
+                }
+                for i in range(tasks)
+            ],
+        )
+        task_ids = db.scalars(select(models.Task.id)).all()
+        db.execute(
+            insert(models.TaskComment),
+            [
+                {"task_id": task_id, "content": f"comment {n} to {task_id}"}
+                for task_id in task_ids
+                for n in range(COMMENTS_PER_TASK)
+            ],
+        )
+        db.execute(
+            insert(models.SubTask),
+            [
+                {"task_id": task_id, "title": f"sub task {n}", "is_completed": n == 0}
+                for task_id in task_ids
+                for n in range(SUB_TASKS_PER_TASK)
+            ],
+        )
+        sub_task_ids = db.scalars(select(models.SubTask.id)).all()
+        db.execute(
+            insert(models.SubTaskComment),
+            [
+                {"sub_task_id": sub_task_id, "content": "note"}
+                for sub_task_id in sub_task_ids
+                for _ in range(COMMENTS_PER_SUB_TASK)
+            ],
+        )
+        db.commit()
+        return user.id
+
+
+_response_field = create_response_field(
+    name="Response_Read_Tasks_With_Details", type_=List[schemas.Task]
+)
+
+
+def model_path(engine, user_id: int, limit: int):
+    with Session(engine) as db:
+        started = time.perf_counter()
+        tasks = crud.get_tasks_with_details(db, user_id, limit=limit)
+        loaded = time.perf_counter()
+        content = asyncio.run(
+            serialize_response(
+                field=_response_field, response_content=tasks, is_coroutine=False
+            )
+        )
+        body = JSONResponse(content).body
+        return loaded - started, time.perf_counter() - loaded, body
+
+
+def fast_path(engine, user_id: int, limit: int):
+    with Session(engine) as db:
+        started = time.perf_counter()
+        tasks = crud.get_task_dicts(db, user_id, limit=limit)
+        loaded = time.perf_counter()
+        body = fast_json.dumps(tasks)
+        return loaded - started, time.perf_counter() - loaded, body
+
+
+def best_of(repeat: int, path, *args):
+    runs = [path(*args) for _ in range(repeat)]
+    return min(run[0] for run in runs), min(run[1] for run in runs), runs[-1][2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="timer-bench-")
+    encoder = "orjson" if fast_json.orjson is not None else "json"
+    print(f"{'tasks':>6} {'path':>14} {'load ms':>9} {'json ms':>9} {'total ms':>9}")
+    for tasks in args.tasks:
+        engine = create_db_engine(f"sqlite:///{db_dir}/serialization_{tasks}.db")
+        user_id = seed(engine, tasks)
+        results = {
+            "response_model": best_of(args.repeat, model_path, engine, user_id, tasks),
+            f"fast ({encoder})": best_of(
+                args.repeat, fast_path, engine, user_id, tasks
+            ),
+        }
+        bodies = [json.loads(body) for _, _, body in results.values()]
+        if bodies[0] != bodies[1]:
+            raise SystemExit(f"Ответы путей различаются ({tasks} задач)")
+        for name, (load, dump, _) in results.items():
+            print(
+                f"{tasks:>6} {name:>14} {load * 1000:>9.1f} {dump * 1000:>9.1f} "
+                f"{(load + dump) * 1000:>9.1f}"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
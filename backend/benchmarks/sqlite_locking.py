@@ -0,0 +1,129 @@
+"""Чтение отчётов и запись таймеров в SQLite одновременно.
+
+    cd backend
+    python -m benchmarks.sqlite_locking --readers 8 --writers 4 --seconds 10
+
+Сравнивает голый create_engine (как было) с database.create_db_engine:
+писатели обновляют задачи короткими транзакциями, читатели в это время
+считают агрегаты по задачам. Настройки берутся из тех же переменных
+окружения, что и в приложении (SQLITE_JOURNAL_MODE и т.д.).
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, exc, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import create_db_engine
+
+SEED_TASKS = 20000
+
+
+def seed(engine):
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        user = models.User(username="bench", password="bench")
+        db.add(user)
+        db.flush()
+        db.execute(
+            insert(models.Task),
+            [
+                {
+                    "title": f"task {i}",
+                    "owner_id": user.id,
+                    "total_time": float(i % 3600),
+                    "created_at": datetime.now(),
+                }
+                for i in range(SEED_TASKS)
+            ],
+        )
+        db.commit()
+
+
+def run(engine, readers: int, writers: int, seconds: float) -> dict:
+    stop = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {"reads": 0, "writes": 0, "locked": 0, "write_latencies": []}
+
+    def reader():
+        while time.monotonic() < stop:
+            with Session(engine) as db:
+                db.execute(
+                    select(
+                        models.Task.owner_id,
+                        func.count(),
+                        func.sum(models.Task.total_time),
+                    ).group_by(models.Task.owner_id)
+                ).all()
+                db.execute(select(func.avg(models.Task.total_time))).scalar()
+            with lock:
+                stats["reads"] += 1
+
+    def writer(n: int):
+        task_id = n + 1
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                with Session(engine) as db:
+                    db.execute(
+                        update(models.Task)
+                        .where(models.Task.id == task_id)
+                        .values(total_time=models.Task.total_time + 1)
+                    )
+                    db.commit()
+            except exc.OperationalError:
+                with lock:
+                    stats["locked"] += 1
+                continue
+            with lock:
+                stats["writes"] += 1
+                stats["write_latencies"].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def report(name: str, stats: dict, seconds: float):
+    latencies = sorted(stats["write_latencies"]) or [0.0]
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(
+        f"{name:>8}: чтений {stats['reads'] / seconds:.0f}/s, "
+        f"записей {stats['writes'] / seconds:.0f}/s, "
+        f"database is locked: {stats['locked']}, "
+        f"p99 записи {p99 * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="timer-bench-")
+    engines = {
+        "bare": create_engine(
+            f"sqlite:///{db_dir}/bare.db", connect_args={"check_same_thread": False}
+        ),
+        "tuned": create_db_engine(f"sqlite:///{db_dir}/tuned.db"),
+    }
+    for name, engine in engines.items():
+        seed(engine)
+        stats = run(engine, args.readers, args.writers, args.seconds)
+        report(name, stats, args.seconds)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Общая временная база для тестов.
+
+    cd backend
+    pip install -r tests/requirements.txt
+    python -m pytest
+
+Схема накатывается миграциями, как в проде, до импорта приложения:
+create_all в app.main тогда ничего не создаёт, а индексы и FTS-таблица —
+ровно те, что дают миграции.
+"""
+
+import os
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+_db_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir.name}/tests.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["SCHEDULER_ENABLED"] = "false"
+os.environ["TIMER_REGISTRY"] = "false"
+
+import pytest  # noqa: E402
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _migrate():
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+
+
+_migrate()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import async_engine, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    """login(username) -> заголовки авторизации нового пользователя."""
+
+    def login(username: str) -> dict:
+        client.post("/register", json={"username": username, "password": "pw"})
+        token = client.post(
+            "/login", json={"username": username, "password": "pw"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # Прогрев user_cache: дальше в счёт идут только запросы эндпоинта
+        client.get("/users/me", headers=headers)
+        return headers
+
+    return login
+
+
+@contextmanager
+def count_queries():
+    """Счётчик SQL по первому слову (SELECT, UPDATE, ...) на sync и async движке."""
+    counts = Counter()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        counts[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    engines = (engine, async_engine.sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counts
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,54 @@
+"""crud_async возвращает то же, что и crud: два слоя над одними запросами."""
+
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, crud_async, models
+from app.database import ASYNC_DATABASE_URL, SessionLocal, create_async_db_engine
+
+
+def _session_fields(session) -> tuple:
+    return (
+        session.id,
+        session.date,
+        session.total_time,
+        session.is_timer_running,
+        session.last_start_time,
+    )
+
+
+async def _read_async(user_id: int, username: str) -> dict:
+    # Своё соединение: пул async_engine привязан к циклу событий TestClient
+    engine = create_async_db_engine(ASYNC_DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as db:
+            return {
+                "user": (await crud_async.get_user(db, user_id)).id,
+                "by_username": (await crud_async.get_user_by_username(db, username)).id,
+                "data_version": tuple(await crud_async.get_data_version(db, user_id)),
+                "today": _session_fields(
+                    await crud_async.get_today_daily_session(db, user_id)
+                ),
+                "stats": await crud_async.get_daily_stats(db, user_id, days=7),
+            }
+    finally:
+        await engine.dispose()
+
+
+def test_async_reads_match_sync(client, login):
+    headers = login("crud_async_parity")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    task_id = client.post("/tasks/", json={"title": "T"}, headers=headers).json()["id"]
+    for action in ("start", "pause"):
+        client.post(f"/timer/{action}/{task_id}", headers=headers).raise_for_status()
+
+    with SessionLocal() as db:
+        expected = {
+            "user": db.get(models.User, user_id).id,
+            "by_username": crud.get_user_by_username(db, "crud_async_parity").id,
+            "data_version": tuple(crud.get_data_version(db, user_id)),
+            "today": _session_fields(crud.get_today_daily_session(db, user_id)),
+            "stats": crud.get_daily_stats(db, user_id, days=7),
+        }
+    assert asyncio.run(_read_async(user_id, "crud_async_parity")) == expected
@@ -0,0 +1,93 @@
+"""/earnings/summary после переноса и удаления задачи с учтённым временем.
+
+Месяцы считаются по time_rollups, проекты — по тем же строкам: суммы
+должны совпадать, а прошлые месяцы — не уходить в минус.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from app import crud, models
+from app.database import SessionLocal
+
+HOUR = 3600
+
+
+def _summary(client, headers) -> dict:
+    response = client.get("/earnings/summary", headers=headers)
+    assert response.status_code == 200, response.text
+    summary = response.json()
+    for key in ("seconds", "earned"):
+        months = sum(month[key] for month in summary["months"])
+        projects = sum(project[key] for project in summary["projects"])
+        assert months == pytest.approx(projects), (key, summary)
+        assert all(month[key] >= -1e-6 for month in summary["months"]), summary
+    assert summary["total_earned"] == pytest.approx(
+        sum(month["earned"] for month in summary["months"])
+    )
+    return summary
+
+
+def _month(summary: dict, day: date) -> dict:
+    month = day.strftime("%Y-%m")
+    return next(row for row in summary["months"] if row["month"] == month)
+
+
+@pytest.fixture
+def logged_hour(client, login):
+    """Задача в проекте P с часом, отработанным 40 дней назад (в другом месяце)."""
+    headers = login(f"earnings_{datetime.now().timestamp()}")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    projects = [
+        client.post(
+            "/projects/", json={"name": name, "hourly_rate": rate}, headers=headers
+        ).json()["id"]
+        for name, rate in (("P", 100), ("Q", 200))
+    ]
+    task_id = client.post(
+        "/tasks/", json={"title": "T", "project_id": projects[0]}, headers=headers
+    ).json()["id"]
+    start = datetime.combine(date.today().replace(day=1), time(10)) - timedelta(days=40)
+    with SessionLocal() as db:
+        db.add(
+            models.TimeEntry(
+                task_id=task_id,
+                owner_id=user_id,
+                start_time=start,
+                end_time=start + timedelta(hours=1),
+            )
+        )
+        db.query(models.Task).filter(models.Task.id == task_id).update(
+            {"total_time": HOUR}
+        )
+        crud.record_intervals(
+            db, [(user_id, projects[0], start, start + timedelta(hours=1))]
+        )
+        crud.bump_data_version(db, user_id)
+        db.commit()
+    return headers, projects, task_id, start.date()
+
+
+def test_moved_task_keeps_months_consistent(client, logged_hour):
+    headers, (p, q), task_id, day = logged_hour
+    assert _month(_summary(client, headers), day)["earned"] == pytest.approx(100)
+
+    response = client.put(f"/tasks/{task_id}", json={"project_id": q}, headers=headers)
+    assert response.status_code == 200, response.text
+    summary = _summary(client, headers)
+    # Час остаётся в своём месяце, но уже по ставке Q
+    assert _month(summary, day)["seconds"] == pytest.approx(HOUR)
+    assert _month(summary, day)["earned"] == pytest.approx(200)
+    by_project = {row["project_id"]: row for row in summary["projects"]}
+    assert by_project.get(p, {"seconds": 0})["seconds"] == pytest.approx(0)
+    assert by_project[q]["seconds"] == pytest.approx(HOUR)
+
+
+def test_deleted_task_leaves_no_time(client, logged_hour):
+    headers, _, task_id, day = logged_hour
+    response = client.delete(f"/tasks/{task_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    summary = _summary(client, headers)
+    assert sum(month["seconds"] for month in summary["months"]) == pytest.approx(0)
+    assert all(row["seconds"] == pytest.approx(0) for row in summary["projects"])
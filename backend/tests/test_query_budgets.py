@@ -0,0 +1,223 @@
+"""Число SQL-запросов на эндпоинт против бюджета.
+
+Бюджеты собраны из того, что эндпоинту нужно сделать, а не из замеров:
+лишняя проверка владельца, ленивая загрузка или N+1 превышают их.
+"""
+
+import pytest
+from conftest import count_queries
+
+from app import fast_json
+
+# Составляющие бюджетов
+OWNED = 1  # get_owned_*: сущность вместе с проверкой владельца, одним SELECT
+BUMP = 1  # data_version: один UPDATE на транзакцию
+REFRESH = 1  # перечитывание изменённой строки для ответа
+ETAG = 1  # conditional_get: версия данных и «идёт ли таймер»
+# Задачи, комментарии, подзадачи, комментарии подзадач — по IN-запросу на
+# уровень, сколько бы задач ни было на странице
+TASK_DETAILS = 4
+# Вложенные списки одной задачи или подзадачи в ответе
+TASK_CHILDREN = 3  # комментарии, подзадачи, комментарии подзадач
+SUB_TASK_CHILDREN = 1  # комментарии подзадачи
+
+# Переход таймера: одна запись на каждую затронутую строку
+START_WRITES = {
+    "UPDATE": 3,  # tasks, daily_work_sessions, users.data_version
+    "INSERT": 1,  # открытый интервал time_entries
+}
+PAUSE_WRITES = {
+    "UPDATE": 5,  # tasks, time_entries, time_rollups, сессия дня, data_version
+}
+# Чтения перехода: задача владельца и сессия дня (для паузы — вместе с
+# проверкой, идут ли другие задачи)
+TIMER_READS = OWNED + 1
+
+# Удаление: снять время задачи с дней в time_rollups (интервалы, остатки по
+# дням, UPDATE на каждый день — здесь один день)
+ROLLUP_WITHDRAWAL = 3
+
+# (метод, путь, тело, ожидаемый статус, бюджет). В путях подставляются id
+# созданных заранее сущностей
+SCENARIO = [
+    ("PUT", "/projects/{project}", {"name": "P2"}, 200, OWNED + 1 + BUMP + REFRESH),
+    (
+        "PUT",
+        "/tasks/{task}",
+        {"title": "T2"},
+        200,
+        OWNED + 1 + BUMP + REFRESH + TASK_CHILDREN,
+    ),
+    (
+        "POST",
+        "/timer/start/{task}",
+        None,
+        200,
+        TIMER_READS + sum(START_WRITES.values()),
+    ),
+    (
+        "POST",
+        "/timer/pause/{task}",
+        None,
+        200,
+        TIMER_READS + sum(PAUSE_WRITES.values()),
+    ),
+    (
+        "POST",
+        "/tasks/{task}/comments",
+        {"content": "c"},
+        200,
+        OWNED + 1 + BUMP + REFRESH,
+    ),
+    ("GET", "/tasks/{task}/comments", None, 200, OWNED + 1),
+    (
+        "POST",
+        "/tasks/{task}/subtasks",
+        {"title": "s"},
+        200,
+        OWNED + 1 + BUMP + REFRESH + SUB_TASK_CHILDREN,
+    ),
+    ("GET", "/tasks/{task}/subtasks", None, 200, OWNED + 1 + SUB_TASK_CHILDREN),
+    (
+        "PUT",
+        "/subtasks/{sub_task}",
+        {"title": "s2"},
+        200,
+        OWNED + 1 + BUMP + REFRESH + SUB_TASK_CHILDREN,
+    ),
+    (
+        "POST",
+        "/subtasks/{sub_task}/comments",
+        {"content": "c"},
+        200,
+        OWNED + 1 + BUMP + REFRESH,
+    ),
+    ("GET", "/subtasks/{sub_task}/comments", None, 200, OWNED + 1),
+    ("DELETE", "/subtask-comments/{sub_task_comment}", None, 200, OWNED + 1 + BUMP),
+    ("DELETE", "/comments/{comment}", None, 200, OWNED + 1 + BUMP),
+    # Каскад ORM: загрузить комментарии подзадачи и удалить их вместе с ней
+    (
+        "DELETE",
+        "/subtasks/{sub_task}",
+        None,
+        200,
+        OWNED + SUB_TASK_CHILDREN + BUMP + 2,
+    ),
+    # Чужая задача: 404 после одного SELECT
+    ("GET", "/tasks/{other_task}/comments", None, 404, OWNED),
+    # Интервалы, каскад ORM по вложенным спискам и DELETE подзадач,
+    # комментариев и самой задачи
+    (
+        "DELETE",
+        "/tasks/{task}",
+        None,
+        200,
+        OWNED + ROLLUP_WITHDRAWAL + 1 + TASK_CHILDREN + BUMP + 3,
+    ),
+    # Массовые DELETE time_rollups, time_entries и задач, каскад ORM по
+    # project.tasks и DELETE проекта
+    ("DELETE", "/projects/{project}", None, 200, OWNED + 3 + BUMP + 1 + 1),
+]
+
+LIST_PATHS = ["/tasks-with-details/", "/tasks-with-details/?limit=1&sort=created_at"]
+LIST_BUDGET = ETAG + TASK_DETAILS
+
+
+def _post(client, headers, path, body) -> int:
+    response = client.post(path, json=body, headers=headers)
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def _add_task_with_children(client, headers, project_id=None) -> int:
+    """Задача с комментарием и подзадачей с комментарием: N+1 даст лишние запросы."""
+    task_id = _post(
+        client, headers, "/tasks/", {"title": "T", "project_id": project_id}
+    )
+    _post(client, headers, f"/tasks/{task_id}/comments", {"content": "c"})
+    sub_task_id = _post(client, headers, f"/tasks/{task_id}/subtasks", {"title": "s"})
+    _post(client, headers, f"/subtasks/{sub_task_id}/comments", {"content": "c"})
+    return task_id
+
+
+@pytest.fixture(scope="module")
+def headers(login):
+    return login("query_budgets")
+
+
+@pytest.fixture(scope="module")
+def ids(client, headers, login):
+    ids = {
+        "project": _post(
+            client, headers, "/projects/", {"name": "P", "hourly_rate": 10}
+        )
+    }
+    ids["task"] = _post(
+        client, headers, "/tasks/", {"title": "T", "project_id": ids["project"]}
+    )
+    ids["comment"] = _post(
+        client, headers, f"/tasks/{ids['task']}/comments", {"content": "c"}
+    )
+    ids["sub_task"] = _post(
+        client, headers, f"/tasks/{ids['task']}/subtasks", {"title": "s"}
+    )
+    ids["sub_task_comment"] = _post(
+        client, headers, f"/subtasks/{ids['sub_task']}/comments", {"content": "c"}
+    )
+    _add_task_with_children(client, headers)
+    ids["other_task"] = _post(
+        client, login("query_budgets_other"), "/tasks/", {"title": "X"}
+    )
+    # Сессия дня и строка time_rollups уже есть: в счёт идут обычные старт и пауза
+    for action in ("start", "pause"):
+        client.post(f"/timer/{action}/{ids['task']}", headers=headers)
+    return ids
+
+
+def _request(client, headers, method, path, body=None):
+    with count_queries() as counts:
+        response = client.request(method, path, json=body, headers=headers)
+    return response, counts
+
+
+@pytest.mark.parametrize("fast", [True, False], ids=["fast_json", "response_model"])
+def test_task_list_queries_do_not_grow_with_tasks(
+    client, headers, ids, fast, monkeypatch
+):
+    """Страница задач — ETag и 4 IN-запроса, сколько бы задач в ней ни было."""
+    monkeypatch.setattr(fast_json, "FAST_JSON", fast)
+    for path in LIST_PATHS:
+        response, counts = _request(client, headers, "GET", path)
+        assert response.status_code == 200, response.text
+        assert sum(counts.values()) <= LIST_BUDGET, (path, counts)
+
+    before = len(client.get("/tasks-with-details/", headers=headers).json())
+    for _ in range(10):
+        _add_task_with_children(client, headers)
+    response, counts = _request(client, headers, "GET", "/tasks-with-details/")
+    assert len(response.json()) == before + 10
+    assert sum(counts.values()) <= LIST_BUDGET, counts
+
+
+def test_timer_transition_writes_each_row_once(client, headers, ids):
+    response, counts = _request(client, headers, "POST", f"/timer/start/{ids['task']}")
+    assert response.status_code == 200, response.text
+    assert {kind: counts[kind] for kind in START_WRITES} == START_WRITES
+    assert counts["SELECT"] <= TIMER_READS, counts
+
+    response, counts = _request(client, headers, "POST", f"/timer/pause/{ids['task']}")
+    assert response.status_code == 200, response.text
+    assert {kind: counts[kind] for kind in PAUSE_WRITES} == PAUSE_WRITES
+    assert counts["INSERT"] == 0 and counts["SELECT"] <= TIMER_READS, counts
+
+
+def test_endpoint_query_budgets(client, headers, ids):
+    over = []
+    for method, path, body, expected_status, budget in SCENARIO:
+        response, counts = _request(client, headers, method, path.format(**ids), body)
+        assert response.status_code == expected_status, (path, response.text)
+        if sum(counts.values()) > budget:
+            over.append(
+                f"{method} {path}: {sum(counts.values())} > {budget} {dict(counts)}"
+            )
+    assert not over, "\n".join(over)
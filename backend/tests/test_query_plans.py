@@ -0,0 +1,190 @@
+"""Планы горячих запросов: без полного просмотра таблиц.
+
+Для каждого сценария вызываются функции crud (и зависимости эндпоинта, если
+сценарий — целый запрос), и для всех их SELECT/UPDATE/DELETE берётся EXPLAIN
+QUERY PLAN на базе после миграций. SCAN таблицы без индекса — провал: так
+пропавший или неподходящий индекс виден без нагрузочного теста.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud, deps, models, pagination
+from app.database import engine
+
+# «SCAN tasks» без «USING ... INDEX» — полный просмотр таблицы
+FULL_SCAN = re.compile(r"^SCAN \w+( AS \w+)?$")
+# Сортировка не по индексу: вся выборка владельца сортируется на каждую страницу
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+
+def _timer_start(db, ids):
+    """POST /timer/start: задача владельца, затем переход таймера."""
+    user = db.get(models.User, ids["user"])
+    task = deps.get_owned_task(ids["idle_task"], db, user)
+    crud.start_timer(db, task)
+
+
+def _timer_pause(db, ids):
+    user = db.get(models.User, ids["user"])
+    task = deps.get_owned_task(ids["idle_task"], db, user)
+    crud.pause_timer(db, task)
+
+
+def _task_page(sort: str, with_details: bool):
+    """Вторая страница списка задач по курсору — то, что обслуживает индекс."""
+    get_tasks = crud.get_tasks_with_details if with_details else crud.get_tasks_by_owner
+
+    def call(db, ids):
+        get_tasks(db, ids["user"], limit=20, sort=sort, after=ids["after"][sort])
+
+    return call
+
+
+# (название, вызов). ids — id созданных заранее строк и курсоры
+SCENARIO = [
+    ("running-timer lookup", lambda db, ids: crud.get_running_tasks(db, ids["user"])),
+    (
+        "any running task",
+        lambda db, ids: crud.check_any_task_running(db, ids["user"]),
+    ),
+    (
+        "auto-pause scan",
+        lambda db, ids: crud.auto_pause_old_timers(db, max_duration_hours=1),
+    ),
+    (
+        "daily-session lookup",
+        lambda db, ids: crud.get_today_daily_session(db, ids["user"]),
+    ),
+    ("timer start", _timer_start),
+    ("timer pause", _timer_pause),
+    (
+        "projects by owner",
+        lambda db, ids: crud.get_projects_by_owner(db, ids["user"], limit=20),
+    ),
+    (
+        "projects by owner, next page",
+        lambda db, ids: crud.get_projects_by_owner(
+            db, ids["user"], limit=20, after_id=ids["project"]
+        ),
+    ),
+    *[
+        (f"task page by {sort}", _task_page(sort, with_details=False))
+        for sort in pagination.TASK_SORTS
+    ],
+    ("task page with details", _task_page("id", with_details=True)),
+    (
+        "task comments",
+        lambda db, ids: crud.get_task_comments(db, ids["task"], limit=20),
+    ),
+    (
+        "sub-task comments",
+        lambda db, ids: crud.get_sub_task_comments(db, ids["sub_task"], limit=20),
+    ),
+    ("sub-tasks", lambda db, ids: crud.get_sub_tasks(db, ids["task"], limit=20)),
+]
+
+# Списки, где порядок страницы должен давать индекс, а не сортировка выборки
+INDEX_ORDERED = {
+    "projects by owner",
+    "projects by owner, next page",
+    "task page with details",
+    *[f"task page by {sort}" for sort in pagination.TASK_SORTS],
+}
+
+
+@pytest.fixture(scope="module")
+def ids():
+    now = datetime.now()
+    with Session(engine) as db:
+        user = models.User(username="plans", password="plans")
+        db.add(user)
+        db.flush()
+        project = models.Project(name="P", owner_id=user.id)
+        db.add(project)
+        db.flush()
+        task = models.Task(
+            title="T",
+            owner_id=user.id,
+            project_id=project.id,
+            priority=1,
+            due_date=now,
+            is_timer_running=True,
+            last_start_time=now - timedelta(hours=2),
+        )
+        idle_task = models.Task(title="I", owner_id=user.id, project_id=project.id)
+        db.add_all([task, idle_task])
+        db.flush()
+        sub_task = models.SubTask(title="S", task_id=task.id)
+        db.add(sub_task)
+        db.flush()
+        db.add(models.TaskComment(task_id=task.id, content="c"))
+        db.add(models.SubTaskComment(sub_task_id=sub_task.id, content="c"))
+        db.add(
+            models.DailyWorkSession(
+                user_id=user.id,
+                date=now.replace(hour=0, minute=0, second=0, microsecond=0),
+                is_timer_running=True,
+                last_start_time=now - timedelta(hours=2),
+            )
+        )
+        db.commit()
+        # Курсор после первой задачи для каждой сортировки
+        after = {
+            sort: [getattr(task, column.key) for column, _ in keys]
+            for sort, keys in pagination.TASK_SORTS.items()
+        }
+        return {
+            "after": after,
+            "user": user.id,
+            "project": project.id,
+            "task": task.id,
+            "idle_task": idle_task.id,
+            "sub_task": sub_task.id,
+        }
+
+
+def _capture(run) -> list:
+    """Выполнить run() и вернуть его запросы чтения и изменения с параметрами."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().split(None, 1)[0].upper() in (
+            "SELECT",
+            "UPDATE",
+            "DELETE",
+        ):
+            statements.append((statement, parameters[0] if many else parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+@pytest.mark.parametrize("name, call", SCENARIO, ids=[name for name, _ in SCENARIO])
+def test_query_plan_uses_indexes(ids, name, call):
+    problems = []
+    with Session(engine) as db:
+        statements = _capture(lambda: call(db, ids))
+        db.rollback()
+        assert statements, "сценарий не выполнил ни одного запроса"
+        for statement, parameters in statements:
+            plan = [
+                row[-1]
+                for row in db.connection().exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            bad = [line for line in plan if FULL_SCAN.match(line)]
+            if name in INDEX_ORDERED:
+                bad += [line for line in plan if line.startswith(TEMP_SORT)]
+            if bad:
+                problems.append(f"{'; '.join(plan)}\n    {' '.join(statement.split())}")
+    assert not problems, "\n".join(problems)
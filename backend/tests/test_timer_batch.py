@@ -0,0 +1,59 @@
+"""Пачечная остановка таймеров при гонке с параллельной паузой."""
+
+from datetime import datetime, timedelta
+
+from app import crud, models
+from app.database import SessionLocal
+
+
+def test_race_keeps_callers_work(client, login):
+    headers = login("timer_batch_race")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    start = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+    with SessionLocal() as db:
+        tasks = [
+            models.Task(
+                title=title,
+                owner_id=user_id,
+                is_timer_running=True,
+                last_start_time=start,
+            )
+            for title in ("A", "B")
+        ]
+        idle = models.Task(title="C", owner_id=user_id)
+        db.add_all([*tasks, idle])
+        db.commit()
+        idle_id = idle.id
+        rows = (
+            db.query(
+                models.Task.id,
+                models.Task.owner_id,
+                models.Task.project_id,
+                models.Task.last_start_time,
+            )
+            .filter(models.Task.id.in_([task.id for task in tasks]))
+            .order_by(models.Task.id)
+            .all()
+        )
+
+    # B успели остановить и перезапустить параллельно: его строка в пачке устарела
+    with SessionLocal() as db:
+        db.query(models.Task).filter(models.Task.id == rows[1][0]).update(
+            {"last_start_time": start + timedelta(minutes=30)}
+        )
+        db.commit()
+
+    now = datetime.now()
+    with SessionLocal() as db:
+        # Работа вызывающего до остановки пачки
+        crud._open_task_batch(db, user_id, [idle_id], now)
+        closed = crud._close_task_batch(db, rows, end=now)
+        db.commit()
+        assert [interval[0] for interval in closed] == [rows[0][0]]
+
+        running = dict(
+            db.query(models.Task.id, models.Task.is_timer_running).filter(
+                models.Task.owner_id == user_id
+            )
+        )
+    assert running == {rows[0][0]: False, rows[1][0]: True, idle_id: True}
@@ -0,0 +1,100 @@
+"""Реестр таймеров: ожидание записи при недоступной БД и сокращение журнала."""
+
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import models, timer_registry
+from app.database import SessionLocal
+from app.timer_registry import TimerRegistry, TimerSyncTimeout
+
+
+class FlakyDatabase:
+    """Фабрика сессий, которую можно «выключить»."""
+
+    down = False
+
+    def __call__(self):
+        if self.down:
+            raise OperationalError("SELECT 1", {}, Exception("database is down"))
+        return SessionLocal()
+
+
+@pytest.fixture
+def task(client, login, request):
+    headers = login(f"registry_{request.node.name}")
+    task_id = client.post("/tasks/", json={"title": "T"}, headers=headers).json()["id"]
+    with SessionLocal() as db:
+        return task_id, db.get(models.Task, task_id).owner_id
+
+
+def _registry(tmp_path, database, **options) -> TimerRegistry:
+    registry = TimerRegistry(
+        database,
+        journal_path=str(tmp_path / "journal.ndjson"),
+        reconcile_interval=0,
+        **options,
+    )
+    registry.start()
+    return registry
+
+
+def _journal_lines(registry) -> int:
+    with open(registry.journal_path, encoding="utf-8") as journal:
+        return sum(1 for _ in journal)
+
+
+def test_sync_gives_up_while_database_is_down(tmp_path, task):
+    task_id, user_id = task
+    database = FlakyDatabase()
+    # Поток записи сам не просыпается: пишет только по запросу sync
+    registry = _registry(tmp_path, database, flush_interval=60, sync_timeout=0.3)
+    try:
+        registry.start_task(user_id, task_id)
+        database.down = True
+        started = time.monotonic()
+        with pytest.raises(TimerSyncTimeout):
+            registry.sync(user_id)
+        assert time.monotonic() - started < 2
+        assert registry.has_pending(user_id)
+
+        database.down = False
+        registry.sync_timeout = 5
+        registry.sync(user_id)
+        assert not registry.has_pending(user_id)
+    finally:
+        database.down = False
+        registry.stop()
+    with SessionLocal() as db:
+        assert db.get(models.Task, task_id).is_timer_running
+
+
+def test_journal_is_compacted_only_past_threshold(tmp_path, task):
+    task_id, user_id = task
+    registry = _registry(tmp_path, FlakyDatabase(), flush_interval=60, compact_ops=6)
+    try:
+        sizes = []
+        for _ in range(4):
+            registry.start_task(user_id, task_id)
+            registry.pause_task(user_id, task_id)
+            registry.flush()
+            sizes.append(_journal_lines(registry))
+    finally:
+        registry.stop()
+    # Журнал растёт записанными операциями и переписывается, лишь когда их
+    # набирается compact_ops
+    assert 0 < sizes[0] < 6 <= sizes[0] * 2
+    assert sizes == [sizes[0], 0, sizes[0], 0]
+
+
+def test_sync_timeout_is_service_unavailable(client, login, monkeypatch):
+    headers = login("registry_503")
+
+    def sync(user_id):
+        raise TimerSyncTimeout("Timer operations are not saved yet")
+
+    monkeypatch.setattr(timer_registry, "sync", sync)
+    response = client.get("/tasks-with-details/", headers=headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,58 @@
+"""Кэш пользователей: без хеша пароля и без устаревшей ставки в начислениях."""
+
+import time
+
+import pytest
+from sqlalchemy import update
+
+from app import models
+from app.database import SessionLocal
+from app.user_cache import user_cache
+
+
+def _token(headers: dict) -> str:
+    return headers["Authorization"].split()[1]
+
+
+def test_cache_holds_no_password_hash(login):
+    headers = login("user_cache_fields")
+    fields = user_cache.get(_token(headers))
+    assert fields is not None
+    assert "password" not in fields
+    assert "default_hourly_rate" not in fields
+
+
+def test_timer_books_rate_changed_in_another_process(client, login):
+    headers = login("user_cache_rate")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    # Проект без своей ставки: начисляется ставка пользователя
+    project_id = client.post(
+        "/projects/", json={"name": "P", "hourly_rate": 0}, headers=headers
+    ).json()["id"]
+    task_id = client.post(
+        "/tasks/", json={"title": "T", "project_id": project_id}, headers=headers
+    ).json()["id"]
+    # Ставка изменена в обход ORM, как другим процессом: запись кэша не сброшена
+    with SessionLocal() as db:
+        db.execute(
+            update(models.User)
+            .where(models.User.id == user_id)
+            .values(default_hourly_rate=3600)
+        )
+        db.commit()
+    assert user_cache.get(_token(headers)) is not None
+
+    assert (
+        client.get("/users/me", headers=headers).json()["default_hourly_rate"] == 3600
+    )
+    client.post(f"/timer/start/{task_id}", headers=headers).raise_for_status()
+    time.sleep(0.01)
+    client.post(f"/timer/pause/{task_id}", headers=headers).raise_for_status()
+    with SessionLocal() as db:
+        seconds, earnings = (
+            db.query(models.TimeRollup.seconds, models.TimeRollup.earnings)
+            .filter(models.TimeRollup.user_id == user_id)
+            .one()
+        )
+    assert seconds > 0
+    assert earnings == pytest.approx(seconds)
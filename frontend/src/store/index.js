@@ -15,6 +15,9 @@ export default createStore({
         subTasks: {},
         subTaskComments: {},
         dailySession: null,
+        dailySessionReceivedAt: 0,
+        now: Date.now(),
+        timerStream: null,
         dailyStats: null,
         earningsSummary: null
     },
@@ -126,6 +129,24 @@ export default createStore({
         },
         SET_DAILY_SESSION(state, session) {
             state.dailySession = session
+            state.dailySessionReceivedAt = Date.now()
+        },
+        SET_RUNNING_TASKS(state, runningTasks) {
+            const running = new Map(runningTasks.map(t => [t.id, t]))
+            state.tasks.forEach((task, index) => {
+                const runningTask = running.get(task.id)
+                if (runningTask) {
+                    state.tasks.splice(index, 1, { ...task, ...runningTask, is_timer_running: true })
+                } else if (task.is_timer_running) {
+                    state.tasks.splice(index, 1, { ...task, is_timer_running: false, last_start_time: null })
+                }
+            })
+        },
+        SET_TIMER_STREAM(state, stream) {
+            state.timerStream = stream
+        },
+        TICK(state) {
+            state.now = Date.now()
         },
         SET_DAILY_STATS(state, stats) {
             state.dailyStats = stats
@@ -156,7 +177,8 @@ export default createStore({
                 throw error
             }
         },
-        async logout({ commit }) {
+        async logout({ commit, dispatch }) {
+            dispatch('closeTimerStream')
             commit('CLEAR_TOKEN')
             commit('SET_USER', null)
             commit('SET_DAILY_SESSION', null)
@@ -244,6 +266,38 @@ export default createStore({
                 throw error
             }
         },
+        async applyTimerBatch({ commit, dispatch }, operations) {
+            try {
+                const response = await axios.post(`${API_BASE_URL}/timer/batch`, { operations })
+                await dispatch('fetchTasks')
+                if (response.data.daily_session) {
+                    commit('SET_DAILY_SESSION', response.data.daily_session)
+                }
+                await dispatch('fetchDailyStats', 30)
+                return response.data
+            } catch (error) {
+                console.error('Error applying timer batch:', error)
+                throw error
+            }
+        },
+        pauseTimers({ dispatch }, taskIds) {
+            return dispatch('applyTimerBatch', [{ action: 'pause', task_ids: taskIds }])
+        },
+        async downloadReport(_, { format = 'csv', projectId = null, start, end = null }) {
+            try {
+                const params = { start, format }
+                if (end) params.end = end
+                if (projectId) params.project_id = projectId
+                const response = await axios.get(`${API_BASE_URL}/reports/export`, {
+                    params,
+                    responseType: 'blob'
+                })
+                return response.data
+            } catch (error) {
+                console.error('Ошибка выгрузки отчета:', error)
+                throw error
+            }
+        },
         async deleteProject({ commit }, projectId) {
             try {
                 await axios.delete(`${API_BASE_URL}/projects/${projectId}`)
@@ -396,6 +450,32 @@ export default createStore({
                 console.error('Ошибка загрузки daily сессии:', error)
             }
         },
+        openTimerStream({ state, commit, dispatch }) {
+            if (state.timerStream || !state.token) return
+            const url = `${API_BASE_URL}/daily/stream?token=${encodeURIComponent(state.token)}`
+            const stream = new EventSource(url)
+            // Сервер присылает состояние только при старте/паузе таймеров,
+            // прошедшее время досчитывается локально
+            stream.onmessage = (event) => {
+                const data = JSON.parse(event.data)
+                commit('SET_DAILY_SESSION', data.daily_session)
+                commit('SET_RUNNING_TASKS', data.running_tasks)
+            }
+            stream.onerror = () => {
+                // EventSource переподключается сам; закрытый стрим пересоздаём
+                if (stream.readyState === EventSource.CLOSED) {
+                    commit('SET_TIMER_STREAM', null)
+                    setTimeout(() => dispatch('openTimerStream'), 5000)
+                }
+            }
+            commit('SET_TIMER_STREAM', stream)
+        },
+        closeTimerStream({ state, commit }) {
+            if (state.timerStream) {
+                state.timerStream.close()
+                commit('SET_TIMER_STREAM', null)
+            }
+        },
         async fetchDailyStats({ commit }, days = 30) {
             try {
                 const response = await axios.get(`${API_BASE_URL}/daily/stats?days=${days}`)
@@ -439,7 +519,13 @@ export default createStore({
             return state.subTaskComments[subTaskId] || []
         },
         currentDailySeconds: (state) => {
-            return state.dailySession?.total_time || 0
+            const session = state.dailySession
+            if (!session) return 0
+            let total = session.total_time || 0
+            if (session.is_timer_running) {
+                total += Math.max(0, (state.now - state.dailySessionReceivedAt) / 1000)
+            }
+            return total
         },
         isDailyTimerRunning: (state) => {
             return state.dailySession?.is_timer_running || false